@@ -1,18 +1,71 @@
-from fastapi import FastAPI
-from .tests import test_db_routes
-from .routes import chat
+import os
+from contextlib import asynccontextmanager
+from .utils.env import load_env
+
+load_env() # before the imports below read their settings
+
+from fastapi import FastAPI, Response
+from .routes import chat, metrics, admin, analytics, export
+from .services import reminder_service, usage_tracker, retention_service, warmup, webhook_dispatcher, turn_profiler
+from .utils import db_utils
+
+# The /test database routes are for manual testing only and are not mounted unless asked for.
+ENABLE_TEST_ROUTES = os.getenv("ENABLE_TEST_ROUTES", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.warmup.start()
+    reminder_service.scheduler.start()
+    usage_tracker.tracker.start()
+    retention_service.retention_job.start()
+    webhook_dispatcher.dispatcher.start()
+    yield
+    await webhook_dispatcher.dispatcher.stop()
+    await warmup.warmup.stop()
+    await reminder_service.scheduler.stop()
+    await retention_service.retention_job.stop()
+    await usage_tracker.tracker.stop()
+    db_utils.writer.stop()
+
 
 app = FastAPI(
     title='AI Receptionist Assistant API',
     description='API for speedchain assignment',
+    lifespan=lifespan,
 )
 
+# Opt-in sampling profiles of chat turns (X-Profile: 1 or PROFILE_SAMPLE_PERCENT), listed under /admin/profiles
+app.add_middleware(turn_profiler.ProfilingMiddleware, paths=('/chat_turn',), admin_token=admin.ADMIN_API_TOKEN)
+
 # Include the main chat router (for the app)
 app.include_router(chat.router, tags=["Chat"])
 
+# Operational metrics
+app.include_router(metrics.router)
+
+# Usage and cost reporting
+app.include_router(admin.router)
+
+# Booking and utilization dashboards, served from the rollup tables
+app.include_router(analytics.router)
+
+# Streaming iCalendar and CSV exports of the schedule
+app.include_router(export.router)
+
 # Include the test routes
-app.include_router(test_db_routes.router, prefix="/test", tags=["_TEST_Database"])
+if ENABLE_TEST_ROUTES:
+    from .tests import test_db_routes
+    app.include_router(test_db_routes.router, prefix="/test", tags=["_TEST_Database"])
 
 @app.get('/')
 def read_root():
-    return {'message': 'AI Receptionist Backend is running!'}
\ No newline at end of file
+    return {'message': 'AI Receptionist Backend is running!'}
+
+@app.get('/ready')
+def readiness(response: Response):
+    """Readiness probe: 200 once the startup warmup has finished, 503 before that or if the database could not be opened."""
+    status = warmup.warmup.status()
+    if not status['ready']:
+        response.status_code = 503
+    return status
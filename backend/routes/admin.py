@@ -0,0 +1,119 @@
+import os
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..utils import db_utils
+from ..services import usage_tracker, turn_profiler
+
+# /admin, /analytics and /export requests must send it in the X-Admin-Token header. Unset, those routes are disabled.
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+
+def require_admin_token(x_admin_token: str | None = Header(default=None)):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API disabled: ADMIN_API_TOKEN is not set.")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_API_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token.")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+def parse_day(value: str | None, default: datetime) -> str:
+    if value is None:
+        return default.strftime('%Y-%m-%d')
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+@router.get("/usage/sessions/{session_id}")
+async def session_usage(session_id: str, calls: int = 20):
+    """Token and cost totals for one session, its budget state and its most recent LLM calls."""
+    await usage_tracker.tracker.flush()
+    totals = await asyncio.to_thread(db_utils.get_session_usage, session_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail=f"No usage recorded for session '{session_id}'.")
+    return {
+        **totals,
+        "over_budget": usage_tracker.tracker.over_budget(session_id),
+        "recent_calls": await asyncio.to_thread(db_utils.get_session_usage_calls, session_id, limit=max(1, min(calls, 500))),
+    }
+
+
+@router.get("/usage/daily")
+async def daily_usage(start: str | None = None, end: str | None = None):
+    """Calls, tokens and cost per day and model between start and end (YYYY-MM-DD, default: the last 7 days)."""
+    await usage_tracker.tracker.flush()
+    today = datetime.now()
+    start_day = parse_day(start, today - timedelta(days=6))
+    end_day = parse_day(end, today)
+    rows = await asyncio.to_thread(db_utils.get_daily_usage, start_day, end_day)
+    return {
+        "start": start_day,
+        "end": end_day,
+        "days": rows,
+        "total_cost_usd": round(sum(row['cost_usd'] for row in rows), 6),
+        "total_tokens": sum(row['prompt_tokens'] + row['completion_tokens'] for row in rows),
+    }
+
+
+@router.get("/usage/top_sessions")
+async def top_sessions(hours: int = 24, limit: int = 20):
+    """The most expensive sessions active in the last `hours` hours."""
+    await usage_tracker.tracker.flush()
+    since = (datetime.now() - timedelta(hours=max(1, hours))).strftime('%Y-%m-%d %H:%M:%S')
+    return await asyncio.to_thread(db_utils.get_top_sessions_by_cost, since, limit=max(1, min(limit, 200)))
+
+
+@router.get("/conversations/search")
+async def search_conversations(q: str, session_id: str | None = None, role: str | None = None,
+                               before: int | None = None, limit: int = 20):
+    """
+    Finds messages by email, appointment ID or phrase, newest first. Every word must match; wrap the query
+    in double quotes for an exact phrase. Pass `next_before` from a response as `before` for the next page.
+    """
+    limit = max(1, min(limit, 100))
+    # A broad match filtered by session or role can visit many rows; keep it off the event loop.
+    results = await asyncio.to_thread(db_utils.search_conversations, q, session_id=session_id, role=role,
+                                      before_message_id=before, limit=limit + 1)
+    if results is None:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one letter or digit.")
+    has_more = len(results) > limit
+    results = results[:limit]
+    return {
+        "query": q,
+        "results": results,
+        "next_before": results[-1]['message_id'] if has_more else None,
+    }
+
+
+@router.get("/conversations/{session_id}")
+async def conversation_transcript(session_id: str, limit: int = 200):
+    """The last `limit` messages of one session, oldest first."""
+    history = await asyncio.to_thread(db_utils.get_conversation_history, session_id, limit=max(1, min(limit, 1000)))
+    if not history:
+        raise HTTPException(status_code=404, detail=f"No conversation found for session '{session_id}'.")
+    return {"session_id": session_id, "messages": [dict(row) for row in history]}
+
+
+@router.get("/profiles")
+def list_profiles(limit: int = 50):
+    """Stored chat turn profiles, newest first, with the profiler's counters."""
+    return {**turn_profiler.profiler.stats(), "profiles": turn_profiler.profiler.list_profiles(limit=max(1, min(limit, 500)))}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def download_profile(profile_id: str):
+    """One profile as folded stacks ('frame;frame;... count' per line), for flamegraph.pl, speedscope or inferno."""
+    folded = turn_profiler.profiler.read_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail=f"No profile '{profile_id}'.")
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'})
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException
+from .admin import require_admin_token, parse_day
+
+# Longest range one request may cover.
+MAX_RANGE_DAYS = 400
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+def _analytics():
+    """The NumPy-backed analytics service, imported on first use (or by the startup warmup) to keep NumPy out of the app's import."""
+    from ..services import analytics
+    return analytics
+
+
+def _day_range(start: str | None, end: str | None, default_days: int = 30):
+    today = datetime.now()
+    start_day = parse_day(start, today - timedelta(days=default_days - 1))
+    end_day = parse_day(end, today)
+    span = (datetime.strptime(end_day, '%Y-%m-%d') - datetime.strptime(start_day, '%Y-%m-%d')).days
+    if span < 0:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    if span >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days.")
+    return start_day, end_day
+
+
+# These only read the rollup tables, never appointments, so they stay cheap while bookings are being written.
+
+@router.get("/bookings")
+def booking_stats(start: str | None = None, end: str | None = None):
+    """Bookings, cancellations, reschedules and modifications per day and service, with per-service rates."""
+    return _analytics().booking_rates(*_day_range(start, end))
+
+
+@router.get("/utilization")
+def consultant_utilization(start: str | None = None, end: str | None = None, service_id: int | None = None):
+    """Booked vs available hourly slots per consultant for appointments between start and end (default: next 30 days)."""
+    today = datetime.now()
+    start_day, end_day = _day_range(start or today.strftime('%Y-%m-%d'), end or (today + timedelta(days=29)).strftime('%Y-%m-%d'))
+    return {"start": start_day, "end": end_day, "consultants": _analytics().consultant_utilization(start_day, end_day, service_id)}
+
+
+@router.get("/heatmap")
+def utilization_heatmap(start: str | None = None, end: str | None = None, service_id: int | None = None):
+    """Utilization per weekday and hour for appointments between start and end (default: the last 30 days)."""
+    return _analytics().utilization_heatmap(*_day_range(start, end), service_id=service_id)
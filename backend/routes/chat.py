@@ -1,8 +1,10 @@
+import math
 import uuid
+import asyncio
 from pydantic import BaseModel
-from fastapi import APIRouter
-from ..utils import db_utils
-from ..services import llm_service
+from fastapi import APIRouter, Header, HTTPException
+from ..utils import db_utils, idempotency
+from ..services import llm_service, rate_limiter, admission, turn_profiler
 from typing import List, Dict
 
 router = APIRouter(
@@ -13,8 +15,71 @@ class ChatTurnInput(BaseModel):
     session_id: str | None = None
     messages: List[Dict[str, str]]
 
+# Completed responses by idempotency key, and turns still being processed so concurrent retries can wait on them.
+chat_dedup_store = idempotency.TTLDedupStore()
+_inflight_turns: dict[str, asyncio.Future] = {}
+
+
+def _chat_idempotency_key(payload: ChatTurnInput, idempotency_key: str | None):
+    """
+    Uses the client's Idempotency-Key header when given, otherwise derives one from the session and the full message list.
+    Requests without either a header or a session id are never deduplicated, since they start a new session.
+    """
+    if idempotency_key:
+        return idempotency.make_idempotency_key(payload.session_id or "", "chat_turn_header", idempotency_key)
+    if payload.session_id:
+        return idempotency.make_idempotency_key(payload.session_id, "chat_turn", payload.messages)
+    return None
+
+
+async def _admitted_chat_turn(payload: ChatTurnInput):
+    """Runs the turn once it holds its session's lock and a global slot; sheds it with 503/429 + Retry-After otherwise."""
+    try:
+        async with admission.admit_turn(payload.session_id):
+            return await _process_chat_turn(payload)
+    except admission.TurnRejected as e:
+        print(f"Shedding chat turn (Session {payload.session_id}): {e.reason}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail="The assistant is handling a lot of conversations right now. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+
+
 @router.post("/chat_turn")
-async def chat_turn_endpoint(payload: ChatTurnInput):
+async def chat_turn_endpoint(payload: ChatTurnInput, idempotency_key: str | None = Header(default=None)):
+    dedup_key = _chat_idempotency_key(payload, idempotency_key)
+    if dedup_key is None:
+        return await _admitted_chat_turn(payload)
+
+    recorded = chat_dedup_store.get(dedup_key)
+    if recorded is not None:
+        print(f"Replaying recorded response for retried turn (Session {payload.session_id}).")
+        return recorded
+
+    inflight = _inflight_turns.get(dedup_key)
+    if inflight is not None:
+        print(f"Waiting on in-flight duplicate turn (Session {payload.session_id}).")
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_turns[dedup_key] = future
+    try:
+        result = await _admitted_chat_turn(payload)
+        chat_dedup_store.put(dedup_key, result, scope=result["session_id"] or "")
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception() # mark as retrieved; waiting duplicates still receive the error
+        raise
+    finally:
+        _inflight_turns.pop(dedup_key, None)
+        if not future.done():
+            future.cancel()
+
+
+async def _process_chat_turn(payload: ChatTurnInput):
     session_id = payload.session_id
     messages_history = payload.messages
 
@@ -29,27 +94,39 @@ async def chat_turn_endpoint(payload: ChatTurnInput):
     if not session_id:
         session_id = f"http_session_{uuid.uuid4()}"
         print(f"New chat session started: {session_id}")
+    turn_profiler.profiler.tag(session_id=session_id, messages=len(messages_history))
 
-    db_utils.add_conversation_message(session_id, "user", user_message)
+    # Writes wait for the writer's commit, so they run in a worker thread: the loop keeps serving other turns
+    # and their writes can share the same commit.
+    await asyncio.to_thread(db_utils.add_conversation_message, session_id, "user", user_message)
     print(f"Received from (Session {session_id}): {user_message}")
 
-    ai_response = await llm_service.get_llm_response_with_history(
-        session_id=session_id,
-        messages_history=messages_history
-    )
+    try:
+        ai_response = await llm_service.get_llm_response_with_history(
+            session_id=session_id,
+            messages_history=messages_history
+        )
+    except rate_limiter.RateLimitQueueTimeout as e:
+        # The turn already waited its share in the LLM queue; tell the client when to come back instead of failing.
+        print(f"Rate limit backpressure for Session {session_id}: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is handling a lot of conversations right now. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
 
     if ai_response and ai_response == llm_service.END_CHAT_SIGNAL:
         ai_response = "Thank you for using the service. Goodbye!"
         print(f"Session {session_id} ended by user.")
-        db_utils.add_conversation_message(session_id, "ai", ai_response)
+        await asyncio.to_thread(db_utils.add_conversation_message, session_id, "ai", ai_response)
 
     elif ai_response is None:
         ai_response = "Sorry, I encountered an error during processing."
         print(f"Error occurred in LLM service for Session {session_id}.")
-        db_utils.add_conversation_message(session_id, "ai", ai_response)
+        await asyncio.to_thread(db_utils.add_conversation_message, session_id, "ai", ai_response)
 
     else:
         print(f"Sending (Session {session_id}): AI: {ai_response}")
-        db_utils.add_conversation_message(session_id, "ai", ai_response)
+        await asyncio.to_thread(db_utils.add_conversation_message, session_id, "ai", ai_response)
 
     return {"session_id": session_id, "response": ai_response}
\ No newline at end of file
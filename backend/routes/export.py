@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from .admin import require_admin_token, parse_day
+from ..services import schedule_export
+from ..utils import db_utils
+
+# Default range when start/end are not given, relative to today.
+DEFAULT_PAST_DAYS = 30
+DEFAULT_FUTURE_DAYS = 365
+STATUSES = {'booked': 'booked', 'cancelled': 'cancelled', 'all': None}
+
+
+def require_export_token(token: str | None = None, x_admin_token: str | None = Header(default=None)):
+    # Calendar apps subscribe to a plain URL and cannot send headers, so the token may also come as ?token=.
+    require_admin_token(x_admin_token if x_admin_token is not None else token)
+
+
+router = APIRouter(
+    prefix="/export",
+    tags=["Export"],
+    dependencies=[Depends(require_export_token)],
+)
+
+
+def _export_params(start: str | None, end: str | None, consultant_id: int | None, service_id: int | None, status: str):
+    today = datetime.now()
+    start_day = parse_day(start, today - timedelta(days=DEFAULT_PAST_DAYS))
+    end_day = parse_day(end, today + timedelta(days=DEFAULT_FUTURE_DAYS))
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    if status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status '{status}', expected one of: {', '.join(STATUSES)}.")
+    reference = db_utils.get_reference_data()
+    if consultant_id is not None and consultant_id not in reference.consultants:
+        raise HTTPException(status_code=404, detail=f"Consultant {consultant_id} not found.")
+    if service_id is not None and reference.service_name(service_id) is None:
+        raise HTTPException(status_code=404, detail=f"Service {service_id} not found.")
+    return {'start': start_day, 'end': end_day, 'consultant_id': consultant_id, 'service_id': service_id, 'status': status}
+
+
+def _export_response(kind: str, params: dict, moving_window: bool, if_none_match: str | None,
+                     if_modified_since: str | None, chunks, media_type: str, filename: str):
+    """304 if the client's copy is current, otherwise the export streamed chunk by chunk with its validators."""
+    window_since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) if moving_window else None
+    etag, last_modified = schedule_export.export_validators(kind, params, window_since)
+    headers = {'Cache-Control': 'private, no-cache'}
+    if etag:
+        headers['ETag'] = etag
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+    if schedule_export.is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    batches = schedule_export.export_batches(params['start'], params['end'], params['consultant_id'],
+                                             params['service_id'], STATUSES[params['status']])
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return StreamingResponse(chunks(batches), media_type=media_type, headers=headers)
+
+
+def _filename(params: dict, extension: str):
+    consultant = f"-consultant-{params['consultant_id']}" if params['consultant_id'] is not None else ''
+    return f"appointments{consultant}-{params['start']}-to-{params['end']}.{extension}"
+
+
+@router.get("/appointments.ics")
+def export_ics(start: str | None = None, end: str | None = None, consultant_id: int | None = None,
+               service_id: int | None = None, status: str = 'booked',
+               if_none_match: str | None = Header(default=None), if_modified_since: str | None = Header(default=None)):
+    """
+    Appointments between start and end (YYYY-MM-DD, default: 30 days ago to a year ahead) as an iCalendar feed,
+    for one consultant or everyone. Calendar apps can subscribe to this URL with ?token=<admin token>.
+    """
+    params = _export_params(start, end, consultant_id, service_id, status)
+    calendar_name = 'Appointments'
+    if consultant_id is not None:
+        calendar_name += f" - {db_utils.get_reference_data().consultants[consultant_id]['name']}"
+    return _export_response(
+        'ics', params, start is None or end is None, if_none_match, if_modified_since,
+        lambda batches: schedule_export.ics_chunks(batches, calendar_name),
+        'text/calendar; charset=utf-8', _filename(params, 'ics'),
+    )
+
+
+@router.get("/appointments.csv")
+def export_csv(start: str | None = None, end: str | None = None, consultant_id: int | None = None,
+               service_id: int | None = None, status: str = 'booked',
+               if_none_match: str | None = Header(default=None), if_modified_since: str | None = Header(default=None)):
+    """Appointments between start and end (YYYY-MM-DD, default: 30 days ago to a year ahead) as CSV, one row each."""
+    params = _export_params(start, end, consultant_id, service_id, status)
+    return _export_response(
+        'csv', params, start is None or end is None, if_none_match, if_modified_since,
+        schedule_export.csv_chunks, 'text/csv; charset=utf-8', _filename(params, 'csv'),
+    )
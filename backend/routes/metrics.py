@@ -0,0 +1,73 @@
+from fastapi import APIRouter
+from ..utils import db_utils
+from ..services import llm_service, reminder_service, model_routing, rate_limiter, admission, prefetch, usage_tracker, retention_service, webhook_dispatcher
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"]
+)
+
+
+@router.get("/llm")
+def llm_metrics():
+    """Latency percentiles, failure/retry/hedge counters and breaker state for each LLM provider route."""
+    return llm_service.get_provider().metrics()
+
+
+@router.get("/llm/routing")
+def llm_routing_metrics():
+    """Calls, tokens and estimated cost per model under the current routing policy, plus promotions by reason."""
+    return model_routing.stats.snapshot()
+
+
+@router.get("/rate_limits")
+def rate_limit_metrics():
+    """Queue depth, waiting sessions, queue wait percentiles and estimated vs actual tokens for each model's quota."""
+    return rate_limiter.stats()
+
+
+@router.get("/admission")
+def admission_metrics():
+    """Running and queued chat turns, shed counts, queue wait percentiles and per-session serialization."""
+    return admission.stats()
+
+
+@router.get("/prefetch")
+def prefetch_metrics():
+    """Speculative lookups started, hits, misses, hit rate and the lookup time saved on hits."""
+    return prefetch.stats.snapshot()
+
+
+@router.get("/usage")
+def usage_metrics():
+    """Usage records waiting to be written, records written, failed flushes, records dropped and sessions with cached totals."""
+    return usage_tracker.tracker.stats()
+
+
+@router.get("/db")
+def db_metrics():
+    """Write batches committed by the single SQLite writer, average and largest batch, failures and queue depth."""
+    return db_utils.writer.stats()
+
+
+@router.get("/retention")
+def retention_metrics():
+    """Retention runs, sessions and messages archived, and pages handed back by incremental vacuum."""
+    return retention_service.retention_job.stats()
+
+
+@router.get("/webhooks")
+def webhook_metrics():
+    """Outbox position, and per webhook its backlog, events delivered, failures and when the next retry is due."""
+    return webhook_dispatcher.dispatcher.stats()
+
+
+@router.get("/reminders")
+def reminder_metrics():
+    return reminder_service.scheduler.stats()
+
+
+@router.get("/reference_data")
+def reference_data_metrics():
+    """Version and size of the in-memory services / consultants / availability snapshot, and how often it was reloaded."""
+    return db_utils.reference_data_stats()
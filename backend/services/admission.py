@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# Chat turns running the agent loop at once, turns allowed to wait for a slot, and how long they may wait.
+CHAT_MAX_CONCURRENT_TURNS = int(os.getenv("CHAT_MAX_CONCURRENT_TURNS", "32"))
+CHAT_MAX_QUEUED_TURNS = int(os.getenv("CHAT_MAX_QUEUED_TURNS", "64"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "10"))
+# Turns for one session beyond this many (running + waiting) are rejected, e.g. a client stuck re-submitting.
+CHAT_MAX_PENDING_PER_SESSION = int(os.getenv("CHAT_MAX_PENDING_PER_SESSION", "4"))
+
+
+class TurnRejected(Exception):
+    """A turn was shed. status_code is 503 for global overload and 429 for a flooded session."""
+
+    def __init__(self, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class SessionSerializer:
+    """
+    One asyncio.Lock per active session, so turns for the same session run one at a time in arrival order
+    (asyncio.Lock wakes waiters FIFO). Entries are dropped once no turn holds or waits on them.
+    """
+
+    def __init__(self, max_pending: int = CHAT_MAX_PENDING_PER_SESSION):
+        self.max_pending = max_pending
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._pending: dict[str, int] = {}
+        self.serialized = 0
+
+    @asynccontextmanager
+    async def hold(self, session_id: str | None):
+        if not session_id:
+            yield # a new session cannot overlap with anything yet
+            return
+
+        pending = self._pending.get(session_id, 0)
+        if pending >= self.max_pending:
+            raise TurnRejected(f"too many turns in flight for session {session_id}", retry_after=1, status_code=429)
+
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._pending[session_id] = pending + 1
+        if lock.locked():
+            self.serialized += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+                del self._locks[session_id]
+
+    def stats(self):
+        return {"active_sessions": len(self._locks), "serialized_turns": self.serialized}
+
+
+class AdmissionController:
+    """
+    Global concurrency limit with a bounded FIFO wait queue. A turn is shed straight away when the queue is full,
+    or after queue_timeout if no slot frees up. Shed turns get a Retry-After based on recent turn durations.
+    """
+
+    def __init__(self, max_concurrent: int = CHAT_MAX_CONCURRENT_TURNS, max_queued: int = CHAT_MAX_QUEUED_TURNS,
+                 queue_timeout: float = CHAT_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._turn_seconds = deque(maxlen=200)
+        self._wait_times_ms = deque(maxlen=500)
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    def _retry_after(self) -> float:
+        """Roughly how long until the current backlog has drained through the slots."""
+        average_turn = sum(self._turn_seconds) / len(self._turn_seconds) if self._turn_seconds else 1.0
+        return max(1.0, average_turn * (len(self._waiters) + 1) / self.max_concurrent)
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None) # the slot passes straight to the waiter; active stays the same
+                return
+        self.active -= 1
+
+    async def _acquire(self):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            self.shed_queue_full += 1
+            raise TurnRejected("chat queue is full", self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_timeout += 1
+            raise TurnRejected("timed out waiting for a chat slot", self._retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release() # the slot was handed over just as the client went away
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    @asynccontextmanager
+    async def slot(self):
+        queued_at = time.monotonic()
+        await self._acquire()
+        started = time.monotonic()
+        self.admitted += 1
+        self._wait_times_ms.append((started - queued_at) * 1000)
+        try:
+            yield
+        finally:
+            self._turn_seconds.append(time.monotonic() - started)
+            self._release()
+
+    def stats(self):
+        waits = sorted(self._wait_times_ms)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))], 1) if waits else None
+
+        return {
+            "max_concurrent": self.max_concurrent, "max_queued": self.max_queued,
+            "active": self.active, "queued": len(self._waiters),
+            "admitted": self.admitted, "shed_queue_full": self.shed_queue_full, "shed_timeout": self.shed_timeout,
+            "queue_wait_ms": {"p50": percentile(50), "p99": percentile(99)},
+        }
+
+
+session_serializer = SessionSerializer()
+admission_controller = AdmissionController()
+
+
+@asynccontextmanager
+async def admit_turn(session_id: str | None):
+    """Serializes turns per session first, then takes a global slot, so a queued duplicate never holds a slot."""
+    async with session_serializer.hold(session_id):
+        async with admission_controller.slot():
+            yield
+
+
+def stats():
+    return {**admission_controller.stats(), **session_serializer.stats()}
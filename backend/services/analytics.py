@@ -0,0 +1,123 @@
+import numpy as np
+from ..utils import db_utils
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+HOUR_STARTS = np.arange(24) * 60 # minute of day at which each hourly slot starts
+
+
+def _weekdays(days: np.ndarray) -> np.ndarray:
+    """Weekday (0=Monday) of each datetime64[D] value. 1970-01-01 was a Thursday."""
+    return (days.astype('int64') + 3) % 7
+
+
+def weekday_counts(start_day: str, end_day: str) -> np.ndarray:
+    """How many Mondays, Tuesdays, ... fall between two 'YYYY-MM-DD' days (inclusive)."""
+    days = np.arange(np.datetime64(start_day), np.datetime64(end_day) + 1, dtype='datetime64[D]')
+    return np.bincount(_weekdays(days), minlength=7)
+
+
+def _minutes(times: list[str]) -> np.ndarray:
+    """'HH:MM' strings -> minutes after midnight."""
+    parts = np.array([t.split(':') for t in times], dtype='int64').reshape(-1, 2)
+    return parts[:, 0] * 60 + parts[:, 1]
+
+
+def _covered_hours(windows: list[dict]) -> np.ndarray:
+    """(windows, 24) mask of the hourly slots that fit entirely inside each availability window."""
+    start = _minutes([w['start_time'] for w in windows])
+    end = _minutes([w['end_time'] for w in windows])
+    return (start[:, None] <= HOUR_STARTS) & (HOUR_STARTS + 60 <= end[:, None])
+
+
+def hourly_capacity(windows: list[dict]) -> np.ndarray:
+    """(7, 24) number of consultants able to take an hourly slot, per weekday and hour."""
+    capacity = np.zeros((7, 24), dtype='int64')
+    if windows:
+        np.add.at(capacity, np.array([w['day_of_week'] for w in windows]), _covered_hours(windows))
+    return capacity
+
+
+def utilization_heatmap(start_day: str, end_day: str, service_id: int | None = None):
+    """
+    Booked slots against bookable slots per weekday and hour over a day range, from service_hourly_load and
+    consultant_availability. Rows are weekdays, columns the hours in which anything was bookable or booked.
+    """
+    rows = db_utils.get_service_hourly_load(start_day, end_day, service_id)
+    booked = np.zeros((7, 24), dtype='int64')
+    if rows:
+        days = np.array([row['day'] for row in rows], dtype='datetime64[D]')
+        hours = np.array([row['hour'] for row in rows])
+        np.add.at(booked, (_weekdays(days), hours), np.array([row['booked_slots'] for row in rows]))
+
+    capacity = hourly_capacity(db_utils.get_availability_windows(service_id)) * weekday_counts(start_day, end_day)[:, None]
+    utilization = np.divide(booked, capacity, out=np.zeros((7, 24)), where=capacity > 0)
+
+    active = np.flatnonzero((capacity + booked).any(axis=0))
+    hours = np.arange(active[0], active[-1] + 1) if active.size else np.arange(0)
+    return {
+        'start': start_day,
+        'end': end_day,
+        'service_id': service_id,
+        'weekdays': WEEKDAYS,
+        'hours': hours.tolist(),
+        'booked': booked[:, hours].tolist(),
+        'capacity': capacity[:, hours].tolist(),
+        'utilization': np.round(utilization[:, hours], 4).tolist(),
+        'overall_utilization': round(float(booked.sum() / capacity.sum()), 4) if capacity.sum() else None,
+    }
+
+
+def consultant_utilization(start_day: str, end_day: str, service_id: int | None = None):
+    """Booked slots against available slots per consultant over a day range, busiest first."""
+    windows = db_utils.get_availability_windows(service_id)
+    load = db_utils.get_consultant_daily_load(start_day, end_day)
+    names = {w['consultant_id']: (w['name'], w['service_id']) for w in windows}
+    if service_id is not None:
+        load = [row for row in load if row['consultant_id'] in names]
+
+    consultant_ids = np.unique(np.array([w['consultant_id'] for w in windows] + [row['consultant_id'] for row in load], dtype='int64'))
+    if not consultant_ids.size:
+        return []
+
+    available = np.zeros(consultant_ids.size, dtype='int64')
+    if windows:
+        # Available slots per window over the range = slots in one window x how often its weekday occurs.
+        per_window = _covered_hours(windows).sum(axis=1) * weekday_counts(start_day, end_day)[[w['day_of_week'] for w in windows]]
+        window_index = np.searchsorted(consultant_ids, [w['consultant_id'] for w in windows])
+        available = np.bincount(window_index, weights=per_window, minlength=consultant_ids.size).astype('int64')
+    booked = np.zeros(consultant_ids.size, dtype='int64')
+    if load:
+        load_index = np.searchsorted(consultant_ids, [row['consultant_id'] for row in load])
+        booked = np.bincount(load_index, weights=[row['booked_slots'] for row in load], minlength=consultant_ids.size).astype('int64')
+    utilization = np.divide(booked, available, out=np.zeros(consultant_ids.size), where=available > 0)
+
+    order = np.lexsort((consultant_ids, -utilization))
+    return [
+        {
+            'consultant_id': int(consultant_ids[i]),
+            'name': names.get(int(consultant_ids[i]), (None, None))[0],
+            'service_id': names.get(int(consultant_ids[i]), (None, None))[1],
+            'booked_slots': int(booked[i]),
+            'available_slots': int(available[i]),
+            'utilization': round(float(utilization[i]), 4),
+        }
+        for i in order
+    ]
+
+
+def booking_rates(start_day: str, end_day: str):
+    """Daily booking changes plus per-service totals and cancel / reschedule / modify rates (relative to bookings)."""
+    days = db_utils.get_booking_daily_stats(start_day, end_day)
+    services: dict[int, dict] = {}
+    for row in days:
+        totals = services.setdefault(row['service_id'], {
+            'service_id': row['service_id'], 'service_name': row['service_name'],
+            'booked': 0, 'cancelled': 0, 'rescheduled': 0, 'modified': 0,
+        })
+        for event in db_utils.BOOKING_EVENTS:
+            totals[event] += row[event]
+    for totals in services.values():
+        for event in ('cancelled', 'rescheduled', 'modified'):
+            totals[f"{event}_rate"] = round(totals[event] / totals['booked'], 4) if totals['booked'] else None
+    return {'start': start_day, 'end': end_day, 'days': days, 'services': list(services.values())}
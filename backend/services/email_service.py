@@ -1,10 +1,11 @@
 import os
 import smtplib
 from email.message import EmailMessage
-from dotenv import load_dotenv
 from ..utils import db_utils
+from ..utils.env import load_env
+from .email_templates import render_email
 
-load_dotenv()
+load_env()
 
 EMAIL_ADDRESS = os.environ.get("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD")
@@ -12,119 +13,145 @@ SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
 
 
-def send_appointment_email(appointment_id: int, action: str)->bool:
-    
-    """
-    Sends an email notification for an appointment session.
-    - action: 'booked', 'rescheduled', 'modified', 'cancelled'
-    Returns True on success, False on failure.
-    """
-
-    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-        print("Email Error: Sender email address not configured.")
-        return False
-    
-    booking_details = db_utils.get_booking_details(appointment_id, ignore_status=True)
-
-    if not booking_details:
-        print(f"Email error: Could not fetch details for appointment ID {appointment_id}.")
-        return False
+def _build_message(appointment_id: int, action: str, booking_details: dict):
+    """Renders the multipart (text + HTML) message for one notification. Returns None if it cannot be built."""
     user_email = booking_details.get("user_email")
 
     if not user_email:
         print(f"Email error: User email missing for appointment ID: {appointment_id}.")
-        return False
-    
-
-    subject = ""
-    body = ""
-    user_name = booking_details.get("user_name", "Client")
-
-    if action == "booked":
-        subject = f"Appointment Confirmed: {booking_details.get('service_name')} Consultation."
-        body = f"""
-Dear {user_name},
-This email confirms your new appointment:
-
-Service: {booking_details.get('service_name')}
-Consultant: {booking_details.get('consultant_name')}
-Date and Time: {booking_details.get('appointment_datetime')}
-Appointment ID: {appointment_id}
-
-We look forward to speaking with you. If you have any further questions or feedback, kindly email us at {EMAIL_ADDRESS}
-Sincerely,
-The Consulting Firm AI Assistant
-"""
-    elif action == "rescheduled":
-        subject = f"Appointment Rescheduled: {booking_details.get('service_name')} Consultation."
-        body = f"""
-Dear {user_name},
-This email confirms your appointment has been rescheduled.
-
-New Details:
-Service: {booking_details.get("service_name")}
-Consultant: {booking_details.get("consultant_name")}
-Date and Time: {booking_details.get("appointment_datetime")}
-Appointment ID: {appointment_id}
-
-We look forward to speaking with you. If you have any further questions or feedback, kindly email us at {EMAIL_ADDRESS}
-Sincerely,
-The Consulting Firm AI Assistant
-"""
-    elif action == "modified":
-        subject = f"Appointment Modified: {booking_details.get('service_name')} Consultation."
-        body = f"""
-Dear {user_name},
-This email confirms the modification of your appointment.
-
-Updated Details:
-Service: {booking_details.get("service_name")}
-Consultant: {booking_details.get("consultant_name")}
-Date and Time: {booking_details.get("appointment_datetime")}
-Appointment ID: {appointment_id}
-
-We look forward to speaking with you. If you have any further questions or feedback, kindly email us at {EMAIL_ADDRESS}
-Sincerely,
-The Consulting Firm AI Assistant
-"""
-    elif action == 'cancelled':
-        subject = f"Appointment Cancelled"
-        body = f"""
-Dear {user_name},
-
-This email confirms that your appointment (ID: {appointment_id}) has been cancelled as requested.
-
-If this was a mistake, or if you wish to book a new appointment, please contact us again.
-
-Sincerely,
-The Consulting Firm AI Assistant
-"""
-    else:
+        return None
+
+    rendered = render_email(action, booking_details, appointment_id, EMAIL_ADDRESS) #type: ignore
+    if rendered is None:
         print(f"Email error: Unknown action '{action}'.")
-        return False
-    
+        return None
+    subject, text_body, html_body = rendered
+
     print(f"--- Preparing Email ({action.upper()}) ---")
     print(f"To: {user_email}")
     print(f"Subject: {subject}")
 
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = EMAIL_ADDRESS
+    msg['To'] = user_email
+
+    msg.set_content(text_body)
+    msg.add_alternative(html_body, subtype='html')
+    return msg
+
+
+def _open_smtp():
+    smtp = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+    smtp.starttls()
+    smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD) #type: ignore
+    return smtp
+
+
+def send_appointment_email(appointment_id: int, action: str, booking_details: dict | None = None)->bool:
+
+    """
+    Sends an email notification for an appointment session.
+    - action: 'booked', 'rescheduled', 'modified', 'cancelled', 'reminder_24h', 'reminder_1h', 'waitlist_booked', 'consultant_unavailable'
+    - booking_details: optional, skips the database lookup when the caller already has the details.
+    Returns True on success, False on failure.
+    """
+
+    results = send_appointment_emails_batch([
+        {'appointment_id': appointment_id, 'action': action, 'booking_details': booking_details}
+    ])
+    return results.get(appointment_id, False)
+
+
+def send_appointment_emails_batch(notifications: list[dict]) -> dict:
+    """
+    Renders and sends many notifications over a single SMTP session.
+    Each notification is a dict with 'appointment_id', 'action' and optionally 'booking_details'.
+    Details that are not supplied are fetched with one query for the whole batch.
+    Returns {appointment_id: True/False}.
+    """
+
+    results = {n['appointment_id']: False for n in notifications}
+    if not notifications:
+        return results
+
+    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+        print("Email Error: Sender email address not configured.")
+        return results
+
+    missing_ids = [n['appointment_id'] for n in notifications if not n.get('booking_details')]
+    fetched = db_utils.get_booking_details_many(missing_ids) if missing_ids else {}
+
+    messages = []
+    for notification in notifications:
+        appointment_id = notification['appointment_id']
+        booking_details = notification.get('booking_details') or fetched.get(appointment_id)
+        if not booking_details:
+            print(f"Email error: Could not fetch details for appointment ID {appointment_id}.")
+            continue
+        msg = _build_message(appointment_id, notification['action'], booking_details)
+        if msg is not None:
+            messages.append((appointment_id, notification['action'], msg))
+
+    if not messages:
+        return results
+
+    smtp = None
     try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = user_email
-        
-        msg.set_content(body)
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            smtp.send_message(msg)
-
-        print(f"Email ({action}) sent successfully to {user_email}!")
-        return True
+        smtp = _open_smtp()
+        for appointment_id, action, msg in messages:
+            try:
+                smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server may drop long sessions; reconnect once and retry this message.
+                smtp = _open_smtp()
+                smtp.send_message(msg)
+            except smtplib.SMTPRecipientsRefused as e:
+                print(f"Email Error: Failed to send {action} email - {e}")
+                continue
+            results[appointment_id] = True
+            print(f"Email ({action}) sent successfully to {msg['To']}!")
     except Exception as e:
-        print(f"Email Error: Failed to send {action} email - {e}")
-        return False
+        print(f"Email Error: Failed to send batch of {len(messages)} email(s) - {e}")
+    finally:
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+
+    return results
 
 
-        
+def notify_consultant_unavailable(consultant_id: int, start_datetime_str: str, end_datetime_str: str) -> dict:
+    """
+    Emails every user with a booked appointment with the consultant in [start, end), e.g. when they are out sick.
+    Uses the details from one range query and a single SMTP session. Returns {appointment_id: True/False}.
+    """
+    bookings = db_utils.get_consultant_bookings(consultant_id, start_datetime_str, end_datetime_str)
+    print(f"Notifying {len(bookings)} user(s) that consultant {consultant_id} is unavailable.")
+    return send_appointment_emails_batch([
+        {'appointment_id': booking['appointment_id'], 'action': 'consultant_unavailable', 'booking_details': booking}
+        for booking in bookings
+    ])
+
+
+def send_waitlist_notifications() -> int:
+    """
+    Emails users whose waitlist entry was auto-booked when a slot freed up, in one SMTP session.
+    The waitlist table is the queue: entries stay unnotified until their email succeeds. Returns the number sent.
+    """
+    pending = db_utils.get_unnotified_waitlist_bookings()
+    if not pending:
+        return 0
+
+    results = send_appointment_emails_batch([
+        {'appointment_id': row['appointment_id'], 'action': 'waitlist_booked', 'booking_details': row}
+        for row in pending
+    ])
+    notified_ids = [row['waitlist_id'] for row in pending if results.get(row['appointment_id'])]
+    for row in pending:
+        if results.get(row['appointment_id']):
+            db_utils.mark_confirmation_sent(row['appointment_id'])
+    db_utils.mark_waitlist_notified(notified_ids)
+    return len(notified_ids)
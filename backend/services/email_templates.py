@@ -0,0 +1,91 @@
+import html
+from string import Template
+
+
+SIGNATURE_TEXT = "Sincerely,\nThe Consulting Firm AI Assistant"
+SIGNATURE_HTML = "<p>Sincerely,<br>The Consulting Firm AI Assistant</p>"
+
+CONTACT_TEXT = "We look forward to speaking with you. If you have any further questions or feedback, kindly email us at $firm_email"
+CONTACT_HTML = "<p>We look forward to speaking with you. If you have any further questions or feedback, kindly email us at $firm_email</p>"
+
+DETAILS_TEXT = """Service: $service_name
+Consultant: $consultant_name
+Date and Time: $appointment_datetime
+Appointment ID: $appointment_id"""
+
+DETAILS_HTML = """<table>
+<tr><td><b>Service</b></td><td>$service_name</td></tr>
+<tr><td><b>Consultant</b></td><td>$consultant_name</td></tr>
+<tr><td><b>Date and Time</b></td><td>$appointment_datetime</td></tr>
+<tr><td><b>Appointment ID</b></td><td>$appointment_id</td></tr>
+</table>"""
+
+# action: (subject, intro line, heading above the details or None, whether the details/contact blocks are shown)
+_ACTIONS = {
+    'booked': ("Appointment Confirmed: $service_name Consultation.", "This email confirms your new appointment:", None, True),
+    'rescheduled': ("Appointment Rescheduled: $service_name Consultation.", "This email confirms your appointment has been rescheduled.", "New Details:", True),
+    'modified': ("Appointment Modified: $service_name Consultation.", "This email confirms the modification of your appointment.", "Updated Details:", True),
+    'cancelled': ("Appointment Cancelled", "This email confirms that your appointment (ID: $appointment_id) has been cancelled as requested.", None, False),
+    'reminder_24h': ("Reminder: Your $service_name Consultation Tomorrow", "This is a friendly reminder of your appointment in 24 hours:", None, True),
+    'reminder_1h': ("Reminder: Your $service_name Consultation Starts in 1 Hour", "This is a friendly reminder that your appointment starts in one hour:", None, True),
+    'waitlist_booked': ("Good News: Your $service_name Consultation Is Booked", "A slot you were waiting for has opened up, and we have booked it for you:", None, True),
+    'consultant_unavailable': (
+        "Important: Your $service_name Consultation on $appointment_datetime",
+        "Unfortunately your consultant $consultant_name is unavailable for your appointment (ID: $appointment_id) on $appointment_datetime.",
+        None,
+        False,
+    ),
+}
+
+_CLOSING_TEXT = {
+    'cancelled': "If this was a mistake, or if you wish to book a new appointment, please contact us again.",
+    'consultant_unavailable': "Please reply to this email or chat with us to choose a new time. We apologise for the inconvenience.",
+}
+
+
+def _compile(action: str):
+    """Assembles the subject, text and HTML templates for one action from the shared fragments."""
+    subject, intro, heading, show_details = _ACTIONS[action]
+
+    text_parts = ["Dear $user_name,", intro, ""]
+    html_parts = ["<p>Dear $user_name,</p>", f"<p>{intro}</p>"]
+    if show_details:
+        if heading:
+            text_parts.append(heading)
+            html_parts.append(f"<p><b>{heading}</b></p>")
+        text_parts += [DETAILS_TEXT, "", CONTACT_TEXT]
+        html_parts += [DETAILS_HTML, CONTACT_HTML]
+    else:
+        text_parts.append(_CLOSING_TEXT[action])
+        html_parts.append(f"<p>{_CLOSING_TEXT[action]}</p>")
+    text_parts += ["", SIGNATURE_TEXT]
+    html_parts.append(SIGNATURE_HTML)
+
+    return Template(subject), Template("\n".join(text_parts) + "\n"), Template("<html><body>" + "\n".join(html_parts) + "</body></html>")
+
+
+# Compiled once at import; rendering is a single substitute() per part.
+TEMPLATES = {action: _compile(action) for action in _ACTIONS}
+
+
+def render_email(action: str, booking_details: dict, appointment_id: int, firm_email: str):
+    """
+    Renders (subject, text_body, html_body) for an action from booking details.
+    Returns None for unknown actions. Values are HTML-escaped for the HTML part only.
+    """
+    templates = TEMPLATES.get(action)
+    if templates is None:
+        return None
+
+    values = {
+        'user_name': booking_details.get('user_name') or 'Client',
+        'service_name': booking_details.get('service_name'),
+        'consultant_name': booking_details.get('consultant_name'),
+        'appointment_datetime': booking_details.get('appointment_datetime'),
+        'appointment_id': appointment_id,
+        'firm_email': firm_email,
+    }
+    html_values = {key: html.escape(str(value)) for key, value in values.items()}
+
+    subject_template, text_template, html_template = templates
+    return subject_template.substitute(values), text_template.substitute(values), html_template.substitute(html_values)
@@ -0,0 +1,273 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_TOTAL_DEADLINE_SECONDS = float(os.getenv("LLM_TOTAL_DEADLINE_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+# Launch a duplicate request if the first has not answered after this many seconds (0 disables hedging).
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectionError"}
+
+
+class LLMUnavailableError(Exception):
+    """Raised when every configured route failed or is short-circuited by its breaker."""
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _retry_after_seconds(error: Exception):
+    """Reads a Retry-After header from provider errors that carry an HTTP response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_seconds`.
+    Then it lets a single trial call through (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Frees the half-open trial slot when the trial call was cancelled rather than completed."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RouteMetrics:
+    """Counters and a rolling latency window for one provider route."""
+
+    def __init__(self, window: int = 500):
+        self.latencies_ms = deque(maxlen=window)
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.client_errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuits = 0
+
+    def snapshot(self):
+        ordered = sorted(self.latencies_ms)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+        return {
+            "calls": self.calls, "successes": self.successes, "failures": self.failures,
+            "client_errors": self.client_errors, "timeouts": self.timeouts,
+            "retries": self.retries, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+            "short_circuits": self.short_circuits,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)},
+        }
+
+
+class ProviderRoute:
+    """A client plus the model to use on it. model=None keeps the model requested by the caller."""
+
+    def __init__(self, name: str, client, model: str | None = None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.breaker = CircuitBreaker()
+        self.metrics = RouteMetrics()
+
+
+class ResilientChatProvider:
+    """
+    Wraps chat.completions.create with per-attempt timeouts, jittered exponential retry within an overall deadline,
+    optional hedged duplicate requests, and a circuit breaker per route that fails over to the next route
+    (e.g. a secondary model or provider).
+    """
+
+    def __init__(self, routes: list[ProviderRoute], timeout: float = LLM_TIMEOUT_SECONDS,
+                 total_deadline: float = LLM_TOTAL_DEADLINE_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base_delay: float = LLM_RETRY_BASE_DELAY, hedge_after: float = LLM_HEDGE_AFTER_SECONDS):
+        self.routes = routes
+        self.timeout = timeout
+        self.total_deadline = total_deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.hedge_after = hedge_after
+
+    async def _attempt(self, route: ProviderRoute, kwargs: dict, timeout: float):
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(route.client.chat.completions.create(**kwargs), timeout=timeout)
+        except asyncio.TimeoutError:
+            route.metrics.timeouts += 1
+            raise
+        finally:
+            route.metrics.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    async def _hedged_attempt(self, route: ProviderRoute, kwargs: dict, timeout: float):
+        """Sends one request, and a duplicate if the first is slower than hedge_after. The first success wins."""
+        if self.hedge_after <= 0 or self.hedge_after >= timeout:
+            return await self._attempt(route, kwargs, timeout)
+
+        primary = asyncio.create_task(self._attempt(route, kwargs, timeout))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        route.metrics.hedges += 1
+        hedge = asyncio.create_task(self._attempt(route, kwargs, timeout - self.hedge_after))
+        pending = {primary, hedge}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            route.metrics.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error #type: ignore
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call_route(self, route: ProviderRoute, kwargs: dict, deadline: float):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("LLM deadline exceeded")
+            try:
+                return await self._hedged_attempt(route, kwargs, min(self.timeout, remaining))
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                attempt += 1
+                route.metrics.retries += 1
+                # Full jitter, but never sooner than the provider's Retry-After.
+                delay = random.uniform(0, self.retry_base_delay * (2 ** attempt))
+                delay = max(delay, _retry_after_seconds(e) or 0)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                print(f"LLM: {route.name} attempt {attempt} failed ({type(e).__name__}); retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+
+    async def create(self, **kwargs):
+        """
+        Drop-in for client.chat.completions.create(**kwargs). Raises LLMUnavailableError if every route fails,
+        or the provider's own error if it rejected the request as invalid (non-retryable).
+        """
+        deadline = time.monotonic() + self.total_deadline
+        last_error = None
+        for route in self.routes:
+            if not route.breaker.allow():
+                route.metrics.short_circuits += 1
+                continue
+
+            route.metrics.calls += 1
+            route_kwargs = dict(kwargs, model=route.model or kwargs.get("model"))
+            try:
+                result = await self._call_route(route, route_kwargs, deadline)
+            except asyncio.CancelledError:
+                route.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    # A client error (bad request, auth, ...) says nothing about the route's health and would fail
+                    # the same way on the next route, so it neither counts against the breaker nor fails over.
+                    route.metrics.client_errors += 1
+                    route.breaker.release_trial()
+                    raise
+                route.metrics.failures += 1
+                route.breaker.record_failure()
+                last_error = e
+                print(f"LLM: route '{route.name}' failed: {type(e).__name__}: {e}")
+                continue
+
+            route.metrics.successes += 1
+            route.breaker.record_success()
+            return result
+
+        raise LLMUnavailableError(f"All LLM routes failed or are open. Last error: {last_error}")
+
+    async def warm_up(self, timeout: float):
+        """
+        Opens the HTTP connection of each distinct client with one cheap request (listing models), so the first
+        completion does not pay for DNS, TCP and TLS. An error response still leaves the connection pooled, so
+        failures are only reported. Returns {route name: milliseconds or error}.
+        """
+        results, seen = {}, set()
+        for route in self.routes:
+            if id(route.client) in seen:
+                continue
+            seen.add(id(route.client))
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(route.client.models.list(), timeout=timeout)
+                results[route.name] = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                results[route.name] = f"{type(e).__name__} after {(time.perf_counter() - started) * 1000:.0f} ms"
+        return results
+
+    def metrics(self):
+        return {
+            route.name: {"model": route.model, "breaker": route.breaker.state, **route.metrics.snapshot()}
+            for route in self.routes
+        }
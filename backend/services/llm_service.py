@@ -1,25 +1,58 @@
 import os
+import copy
+import time
+import asyncio
 import json
 import sqlite3
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from ..utils import db_utils
-from ..services import email_service
+from ..utils import db_utils, idempotency
+from ..utils.env import load_env
+from ..services import email_service, reminder_service, session_facts, llm_provider, model_routing, rate_limiter, prefetch, tool_results, usage_tracker
 
-load_dotenv()
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) #type: ignore
+load_env()
+PRIMARY_MODEL = os.getenv("LLM_PRIMARY_MODEL", "gpt-4o")
+FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gpt-4o-mini")
+FALLBACK_BASE_URL = os.getenv("LLM_FALLBACK_BASE_URL")
 
+# Built by get_provider on first use (normally during startup warmup). Tests may assign their own.
+provider: llm_provider.ResilientChatProvider | None = None
+
+
+def _build_provider():
+    # openai (and httpx under it) is the slowest import in the app, so it is kept out of the import of this module.
+    from openai import AsyncOpenAI
+
+    # Retries and timeouts are owned by the provider wrapper, so the SDK's own are turned off.
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=llm_provider.LLM_TIMEOUT_SECONDS) #type: ignore
+    fallback_client = AsyncOpenAI(
+        api_key=os.getenv("LLM_FALLBACK_API_KEY") or os.getenv("OPENAI_API_KEY"), base_url=FALLBACK_BASE_URL,
+        max_retries=0, timeout=llm_provider.LLM_TIMEOUT_SECONDS,
+    ) if FALLBACK_BASE_URL else client #type: ignore
+
+    provider_routes = [llm_provider.ProviderRoute("primary", client)]
+    if FALLBACK_MODEL:
+        provider_routes.append(llm_provider.ProviderRoute("fallback", fallback_client, model=FALLBACK_MODEL))
+    return llm_provider.ResilientChatProvider(provider_routes)
+
+
+def get_provider() -> llm_provider.ResilientChatProvider:
+    global provider
+    if provider is None:
+        provider = _build_provider()
+    return provider
+
+
+# Template for the tools sent to the model. Service arguments are completed from the reference data by build_tools_schema.
 tools_schema = [
     {
         "type": "function",
         "function": {
             "name": "check_availability",
-            "description": "Check if any consultants are available for a given service and start time. Use this before booking.",
+            "description": "Check if any consultants are available for a given service and start time. Use this before booking. The first available consultant is held for a few minutes and comes back with a hold_token.",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "service_name": {"type": "string", "description": "The name of the service, e.g., 'Technology', 'Sales', 'Financial', 'Legal'."},
+                    "service_name": {"type": "string", "description": "The name of the service: {service_names}."},
                     "requested_datetime_str": {"type": "string", "description": "The requested date and time in 'YYYY-MM-DD HH:MM:SS' format."}
                 },
                  "required": ["service_name", "requested_datetime_str"],
@@ -37,12 +70,30 @@ tools_schema = [
                     "user_name": {"type": "string", "description": "The user's full name."},
                     "user_email": {"type": "string", "description": "The user's email address."},
                     "appt_datetime": {"type": "string", "description": "The requested date and time in 'YYYY-MM-DD HH:MM:SS' format."},
-                    "service_id": {"type": "integer", "description": "The ID of the service to book (1=Technology, 2=Sales, 3=Financial, 4=Legal)."},
+                    "service_id": {"type": "integer", "description": "The ID of the service to book ({services})."},
+                    "hold_token": {"type": "string", "description": "The hold_token returned by check_availability for this exact slot, if any."},
                  },
                  "required": ["user_name", "user_email", "appt_datetime", "service_id"],
              }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "join_waitlist",
+            "description": "Adds the user to the waitlist for a specific slot that is unavailable. If that slot frees up, it is booked for them automatically and they are emailed.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "user_name": {"type": "string", "description": "The user's full name."},
+                    "user_email": {"type": "string", "description": "The user's email address."},
+                    "service_id": {"type": "integer", "description": "The ID of the service ({services})."},
+                    "requested_datetime": {"type": "string", "description": "The unavailable date and time the user wants, in 'YYYY-MM-DD HH:MM:SS' format."},
+                },
+                "required": ["user_name", "user_email", "service_id", "requested_datetime"],
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -51,7 +102,7 @@ tools_schema = [
             "parameters": {
                 "type": "object",
                  "properties": {
-                    "service_name": {"type": "string", "description": "The name of the service, e.g., 'Technology'"},
+                    "service_name": {"type": "string", "description": "The name of the service: {service_names}."},
                     "start_datetime_str": {"type": "string", "description": "The user's *original* requested date and time in 'YYYY-MM-DD HH:MM:SS' format."},
                  },
                  "required": ["service_name", "start_datetime_str"],
@@ -98,6 +149,7 @@ tools_schema = [
                      "appointment_id": {"type": "integer", "description": "The ID of the appointment to reschedule."},
                     "user_email": {"type": "string", "description": "The user's email, for verification."},
                     "new_appt_datetime": {"type": "string", "description": "The *new* desired date and time in 'YYYY-MM-DD HH:MM:SS' format."},
+                    "hold_token": {"type": "string", "description": "The hold_token returned by check_availability for this exact slot, if any."},
                  },
                  "required": ["appointment_id", "user_email", "new_appt_datetime"],
              }
@@ -113,7 +165,8 @@ tools_schema = [
                  "properties": {
                      "appointment_id": {"type": "integer", "description": "The ID of the appointment to modify."},
                     "user_email": {"type": "string", "description": "The user's email, for verification."},
-                     "new_service_id": {"type": "integer", "description": "The ID of the *new* service (1=Technology, 2=Sales, 3=Financial, 4=Legal)."},
+                     "new_service_id": {"type": "integer", "description": "The ID of the *new* service ({services})."},
+                     "hold_token": {"type": "string", "description": "The hold_token returned by check_availability for this exact slot, if any."},
                  },
                  "required": ["appointment_id", "user_email", "new_service_id"],
             }
@@ -121,10 +174,30 @@ tools_schema = [
     }
 ]
 
-SYSTEM_PROMPT = f"""
+SERVICE_ID_ARGS = ('service_id', 'new_service_id')
+
+
+def build_tools_schema(reference) -> list[dict]:
+    """tools_schema with the service arguments restricted to the services in the reference data, and named in their descriptions."""
+    tools = copy.deepcopy(tools_schema)
+    names = {'services': reference.services_summary(), 'service_names': ", ".join(f"'{name}'" for name in reference.service_ids)}
+    for tool in tools:
+        for arg_name, spec in tool["function"]["parameters"]["properties"].items():
+            if arg_name in SERVICE_ID_ARGS:
+                spec["enum"] = list(reference.services)
+            elif arg_name == "service_name":
+                spec["enum"] = list(reference.service_ids)
+            else:
+                continue
+            spec["description"] = spec["description"].format(**names)
+    return tools
+
+
+def build_system_prompt(reference) -> str:
+    return f"""
 You are an expert AI receptionist for a high-end consulting firm.
 The current date is: {datetime.now().strftime('%Y-%m-%d %A')}.
-The available services are: 1=Technology, 2=Sales, 3=Financial, 4=Legal.
+The available services are: {reference.services_summary()}.
 
 Your job is to orchestrate a conversation to help a user book, cancel, reschedule, or modify appointments.
 
@@ -137,11 +210,13 @@ Your job is to orchestrate a conversation to help a user book, cancel, reschedul
     * If `check_availability` returns an *empty list* (slot is unavailable), you MUST follow the failure rules in Step 6.
     * If `check_availability` returns *available consultants*, you MUST then repeat the full details (Service, Date, Time, User Name, Email) and ask for explicit confirmation ("Shall I proceed...?").
     * **CRITICAL:** When the user responds affirmatively (e.g., "Yes", "Confirm", "Book it"), your *next and only action* MUST be to call the correct tool (`book_appointment`, etc.).
+    * If `check_availability` returned a `hold_token` for that slot, pass it unchanged to the write tool.
     * **DO NOT** generate a final confirmation text *until* the tool has been called and has returned a successful result.
 5.  If a tool is called, use its result for your final response.
 6.  **Failure Handling:**
     * If a tool call returns an error string (e.g., "Booking failed: No consultants available..."), you MUST politely report this error to the user.
     * If `check_availability` fails (returns empty list) during a *booking* or *rescheduling* request, you MUST then call `find_next_available_slot` to be helpful. Propose the new time to the user.
+    * If the user only wants that exact time, offer to add them to the waitlist with `join_waitlist` (name and email required). Tell them they will be booked and emailed automatically if the slot frees up.
 7.  **Past Date Rules:**
     * The user can **never** book or reschedule an appointment to a date/time in the past (before {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}). Politely refuse this.
     * A user **cannot** reschedule or cancel an appointment *after* its original start time has already passed.
@@ -153,13 +228,184 @@ Your job is to orchestrate a conversation to help a user book, cancel, reschedul
 -   Do NOT ask for information you already have from the conversation history.
 """
 
+
+_prompt_cache: dict[tuple, tuple[list[dict], str]] = {}
+
+
+def tools_and_prompt():
+    """
+    The tool schema and system prompt for the current reference data, built once per reference data version
+    (and per day, for the date in the prompt) so the text sent to the model is stable between changes.
+    """
+    reference = db_utils.get_reference_data()
+    key = (reference.version, datetime.now().strftime('%Y-%m-%d'))
+    built = _prompt_cache.get(key)
+    if built is None:
+        built = (build_tools_schema(reference), build_system_prompt(reference))
+        _prompt_cache.clear()
+        _prompt_cache[key] = built
+    return built
+
 TERMINATION_PHRASES = [
     "thank you that's all", "thanks that's all", "no more help needed",
     "no more assistance needed", "that's it", "goodbye", "bye"
 ]
 END_CHAT_SIGNAL = "__END_CHAT__"
 
-async def get_llm_response_with_history(session_id: str, messages_history: list[dict]) -> str:
+# Successful write tool results, replayed when the model repeats the same call within the TTL.
+tool_dedup_store = idempotency.TTLDedupStore()
+
+
+def _run_tool(session_id: str, function_name: str, function_args: dict, prefetched_value=prefetch.MISS):
+    """
+    Runs the db_utils function behind a tool call, or uses prefetched_value for a read-only tool that was prefetched.
+    Returns (tool_result_value, email_action, appointment_id_for_email, wrote), where wrote is True when a write
+    tool succeeded.
+    """
+    email_action = None
+    appointment_id_for_email = None
+    wrote = False
+
+    if function_name in prefetch.PREFETCHABLE_TOOLS and prefetched_value is not prefetch.MISS:
+        tool_result_value = prefetched_value
+    elif function_name == "check_availability":
+        # Checked and held in one write: a hold must never be placed from an earlier (or speculative) read.
+        tool_result_value = db_utils.check_availability_and_hold(session_id, **function_args)
+    elif function_name == "book_appointment":
+         tool_result_value = db_utils.book_appointment(**function_args, session_id=session_id)
+         if isinstance(tool_result_value, int):
+             email_action = 'booked'; appointment_id_for_email = tool_result_value
+    elif function_name == "find_next_available_slot":
+        tool_result_value = db_utils.find_next_available_slot(**function_args, session_id=session_id)
+    elif function_name == "get_user_appointments":
+        tool_result_value = db_utils.get_user_appointments(**function_args)
+    elif function_name == "join_waitlist":
+        tool_result_value = db_utils.join_waitlist(**function_args)
+        if isinstance(tool_result_value, int):
+            wrote = True
+            tool_result_value = f"Added to the waitlist (waitlist ID: {tool_result_value})."
+    elif function_name == "cancel_appointment":
+        appointment_id_for_email = function_args.get("appointment_id")
+        tool_result_value = db_utils.cancel_appointment(**function_args)
+        if tool_result_value is True: email_action = 'cancelled'
+    elif function_name == "reschedule_appointment":
+        appointment_id_for_email = function_args.get("appointment_id")
+        tool_result_value = db_utils.reschedule_appointment(**function_args, session_id=session_id)
+        if tool_result_value is True: email_action = 'rescheduled'
+    elif function_name == "modify_appointment_service":
+         appointment_id_for_email = function_args.get("appointment_id")
+         tool_result_value = db_utils.modify_appointment_service(**function_args, session_id=session_id)
+         if tool_result_value is True: email_action = 'modified'
+    else:
+         tool_result_value = f"Error: Unknown tool '{function_name}'."
+
+    return tool_result_value, email_action, appointment_id_for_email, wrote or email_action is not None
+
+
+def _format_tool_result(function_name: str, tool_result_value) -> str:
+    """Turns a raw tool result into the text sent back to the model. Structured results use the compact encoders."""
+    if isinstance(tool_result_value, (list, dict, tuple)):
+         return tool_results.encode_tool_result(function_name, tool_result_value)
+    elif isinstance(tool_result_value, str) or tool_result_value is None:
+         return str(tool_result_value)
+    elif isinstance(tool_result_value, int) and function_name == "book_appointment":
+         return f"Booking successful. New appointment ID: {tool_result_value}"
+    elif tool_result_value is True:
+         return f"{function_name.replace('_', ' ').capitalize()} successful."
+    else:
+         return f"Tool executed with result: {tool_result_value}"
+
+
+def _send_action_email(function_args: dict, email_action: str, appointment_id_for_email: int) -> str:
+    """Sends the confirmation email for a successful write. Returns the note to append to the tool result."""
+    print(f"LLM: Attempting to send '{email_action}' email...")
+    try:
+        user_email_for_message = function_args.get("user_email")
+        if not user_email_for_message:
+            details = db_utils.get_booking_details(appointment_id_for_email, ignore_status=True)
+            if details: user_email_for_message = details.get('user_email')
+
+        if user_email_for_message:
+            email_sent = email_service.send_appointment_email(
+                appointment_id=appointment_id_for_email, action=email_action,
+                booking_details=db_utils.pop_recent_booking_details(appointment_id_for_email)
+            )
+            if email_sent:
+                db_utils.mark_confirmation_sent(appointment_id_for_email)
+                return f" Confirmation email sent to {user_email_for_message}."
+            else:
+                return " (Note: Email sending failed.)"
+        else:
+             print("LLM: Could not find email address for confirmation.")
+
+    except Exception as e_email:
+         print(f"LLM: Email Error: {e_email}")
+    return ""
+
+
+def execute_tool_call(session_id: str, function_name: str, function_args: dict, prefetched_value=prefetch.MISS) -> str:
+    """
+    Executes one tool call and returns the content for the 'tool' message.
+    prefetched_value is the result of a matching speculative lookup for read-only tools, if there was one.
+    Successful write tools are recorded under an idempotency key derived from the session, tool and
+    normalized args, so a repeated identical call replays the result instead of writing and emailing again.
+    Blocks on database writes and email; the agent loop runs it in a worker thread.
+    """
+    dedup_key = None
+    if function_name in idempotency.WRITE_TOOLS:
+        dedup_key = idempotency.make_idempotency_key(session_id, function_name, function_args)
+        replayed = tool_dedup_store.get(dedup_key)
+        if replayed is not None:
+            print(f"LLM: Replaying recorded result for duplicate {function_name} call.")
+            return replayed
+
+    print(f"LLM: EXECUTING function: {function_name} with args: {function_args}")
+    tool_result_value, email_action, appointment_id_for_email, wrote = _run_tool(session_id, function_name, function_args, prefetched_value)
+    tool_result_content_for_llm = _format_tool_result(function_name, tool_result_value)
+    print(f"LLM: Tool result: {tool_result_content_for_llm}")
+    session_facts.record_tool_call(session_id, function_name, function_args, tool_result_value)
+
+    if email_action and appointment_id_for_email:
+        tool_result_content_for_llm += _send_action_email(function_args, email_action, appointment_id_for_email)
+        # The write re-planned this appointment's reminders; make the scheduler pick them up now.
+        reminder_service.scheduler.wake()
+        if email_action in ('cancelled', 'rescheduled'):
+            # The freed slot may have been handed to a waitlisted user in the same transaction; the scheduler emails them.
+            reminder_service.scheduler.notify_waitlist()
+
+    if dedup_key and wrote:
+        # A new successful write supersedes earlier ones, e.g. book -> cancel -> book the same slot again.
+        tool_dedup_store.forget_scope(session_id)
+        tool_dedup_store.put(dedup_key, tool_result_content_for_llm, scope=session_id)
+
+    return tool_result_content_for_llm
+
+
+async def _create_completion(session_id: str, model: str, messages_for_llm: list[dict], iteration: int, tools: list[dict]):
+    """
+    Waits for room in the model's RPM/TPM quota (queued fairly across sessions), calls the provider and records
+    the call's token usage for the session. Raises rate_limiter.RateLimitQueueTimeout when the queue does not
+    drain within the max wait.
+    """
+    scheduler = rate_limiter.get_scheduler(model)
+    estimated_tokens = rate_limiter.estimate_tokens(messages_for_llm, tools)
+    await scheduler.acquire(session_id, estimated_tokens)
+    completion = await get_provider().create(
+        model=model,
+        messages=messages_for_llm, # type: ignore
+        tools=tools, # type: ignore
+        tool_choice="auto"
+    )
+    scheduler.settle(estimated_tokens, getattr(completion, "usage", None))
+    usage_tracker.tracker.record(session_id, getattr(completion, "model", None) or model, iteration, getattr(completion, "usage", None))
+    return completion
+
+
+async def get_llm_response_with_history(session_id: str, messages_history: list[dict], routing_policy: str | None = None) -> str:
+    """
+    Runs the agent loop for one user turn. routing_policy (default LLM_ROUTING_POLICY) chooses which model
+    handles each iteration; see model_routing.
+    """
     if messages_history:
         last_user_message = messages_history[-1].get("content", "")
         normalized_message = last_user_message.lower().strip().replace('.', '').replace('!', '')
@@ -169,23 +415,59 @@ async def get_llm_response_with_history(session_id: str, messages_history: list[
     else:
         return "It seems we just started. How can I help?"
 
-    messages_for_llm = [{"role": "system", "content": SYSTEM_PROMPT}] + messages_history
+    # A session over its token/cost budget runs on the budget model and/or a summarized context.
+    budget_action = usage_tracker.SESSION_BUDGET_ACTION if usage_tracker.tracker.over_budget(session_id) else None
+    if budget_action:
+        print(f"LLM: Session {session_id} is over budget; applying '{budget_action}'.")
+    summarize = budget_action in ('summarize', 'both')
+    premium_model = usage_tracker.BUDGET_MODEL if budget_action in ('cheaper_model', 'both') else PRIMARY_MODEL
+
+    tools, system_prompt = tools_and_prompt()
+    messages_for_llm = [{"role": "system", "content": system_prompt}]
+    facts = session_facts.get_facts(session_id)
+    if facts:
+        # Known facts replace the older transcript, so only the recent window is sent.
+        messages_for_llm.append({"role": "system", "content": session_facts.build_facts_block(facts)})
+    if facts or summarize:
+        window = usage_tracker.BUDGET_HISTORY_WINDOW if summarize else session_facts.SESSION_HISTORY_WINDOW
+        messages_for_llm += session_facts.trim_history(messages_history, window)
+    else:
+        messages_for_llm += messages_history
+
+    # Likely read-only lookups run in worker threads while the first completion is in flight.
+    prefetched = prefetch.TurnPrefetch.start(session_id, last_user_message)
+    try:
+        return await _run_agent_loop(session_id, messages_for_llm, tools, routing_policy, prefetched, premium_model)
+    finally:
+        prefetched.finish()
 
+
+async def _run_agent_loop(session_id: str, messages_for_llm: list[dict], tools: list[dict], routing_policy: str | None,
+                          prefetched: prefetch.TurnPrefetch, premium_model: str = PRIMARY_MODEL) -> str:
     MAX_TOOL_CALLS = 5
     loop_count = 0
     final_response_content = None
+    router = model_routing.TurnRouter(routing_policy or model_routing.LLM_ROUTING_POLICY, premium_model)
+    model_routing.stats.record_turn()
 
     while loop_count < MAX_TOOL_CALLS:
         loop_count += 1
         print(f"\nLLM: Thinking... (Loop iteration {loop_count})")
 
         try:
-            completion = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages_for_llm, # type: ignore
-                tools=tools_schema, # type: ignore
-                tool_choice="auto"
-            )
+            model = router.model
+            started = time.perf_counter()
+            completion = await _create_completion(session_id, model, messages_for_llm, loop_count, tools)
+            router.record(model, completion, (time.perf_counter() - started) * 1000)
+            promotion_reason = router.promotion_reason(completion.choices[0].message, model, tools)
+            if promotion_reason:
+                # The small model's reply is discarded and the same step is redone on the premium model.
+                print(f"LLM: Promoting to {router.premium_model}: {promotion_reason}.")
+                started = time.perf_counter()
+                completion = await _create_completion(session_id, router.premium_model, messages_for_llm, loop_count, tools)
+                router.record(router.premium_model, completion, (time.perf_counter() - started) * 1000)
+        except rate_limiter.RateLimitQueueTimeout:
+            raise # the chat route turns this into 503 + Retry-After
         except Exception as e:
             print(f"Error in LLM Call: {e}")
             return "I'm sorry, I'm having trouble connecting to my brain right now."
@@ -206,70 +488,12 @@ async def get_llm_response_with_history(session_id: str, messages_history: list[
                     function_name = tool_call.function.name
                     try:
                         function_args = json.loads(tool_call.function.arguments)
-                        print(f"LLM: EXECUTING function: {function_name} with args: {function_args}")
-                        tool_result_value = None
-                        email_action = None
-                        appointment_id_for_email = None
-
-                        if function_name == "check_availability":
-                            tool_result_value = db_utils.check_availability(**function_args)
-                        elif function_name == "book_appointment":
-                             tool_result_value = db_utils.book_appointment(**function_args)
-                             if isinstance(tool_result_value, int):
-                                 email_action = 'booked'; appointment_id_for_email = tool_result_value
-                        elif function_name == "find_next_available_slot":
-                            tool_result_value = db_utils.find_next_available_slot(**function_args)
-                        elif function_name == "get_user_appointments":
-                            tool_result_value = db_utils.get_user_appointments(**function_args)
-                        elif function_name == "cancel_appointment":
-                            appointment_id_for_email = function_args.get("appointment_id")
-                            tool_result_value = db_utils.cancel_appointment(**function_args)
-                            if tool_result_value is True: email_action = 'cancelled'
-                        elif function_name == "reschedule_appointment":
-                            appointment_id_for_email = function_args.get("appointment_id")
-                            tool_result_value = db_utils.reschedule_appointment(**function_args)
-                            if tool_result_value is True: email_action = 'rescheduled'
-                        elif function_name == "modify_appointment_service":
-                             appointment_id_for_email = function_args.get("appointment_id")
-                             tool_result_value = db_utils.modify_appointment_service(**function_args)
-                             if tool_result_value is True: email_action = 'modified'
-                        else:
-                             tool_result_value = f"Error: Unknown tool '{function_name}'."
-
-                        if isinstance(tool_result_value, (str, list, dict, tuple)) or tool_result_value is None:
-                             tool_result_content_for_llm = str(tool_result_value)
-                        elif isinstance(tool_result_value, int) and function_name == "book_appointment":
-                             tool_result_content_for_llm = f"Booking successful. New appointment ID: {tool_result_value}"
-                        elif tool_result_value is True:
-                             tool_result_content_for_llm = f"{function_name.replace('_', ' ').capitalize()} successful."
-                        else:
-                             tool_result_content_for_llm = f"Tool executed with result: {tool_result_value}"
-
-                        print(f"LLM: Tool result: {tool_result_content_for_llm}")
-
-                        if email_action and appointment_id_for_email:
-                            print(f"LLM: Attempting to send '{email_action}' email...")
-                            try:
-                                user_email_for_message = function_args.get("user_email")
-                                if not user_email_for_message:
-                                    details = db_utils.get_booking_details(appointment_id_for_email, ignore_status=True)
-                                    if details: user_email_for_message = details.get('user_email')
-
-                                if user_email_for_message:
-                                    email_sent = email_service.send_appointment_email(
-                                        appointment_id=appointment_id_for_email, action=email_action
-                                    )
-                                    if email_sent:
-                                        db_utils.mark_confirmation_sent(appointment_id_for_email)
-                                        tool_result_content_for_llm += f" Confirmation email sent to {user_email_for_message}."
-                                    else:
-                                        tool_result_content_for_llm += " (Note: Email sending failed.)"
-                                else:
-                                     print("LLM: Could not find email address for confirmation.")
-
-                            except Exception as e_email:
-                                 print(f"LLM: Email Error: {e_email}")
-
+                        prefetched_value = await prefetched.take(function_name, function_args)
+                        # Tools write through db_utils.run_write and may send email, both of which block until done.
+                        tool_result_content_for_llm = await asyncio.to_thread(
+                            execute_tool_call, session_id, function_name, function_args, prefetched_value)
+                        if function_name in idempotency.WRITE_TOOLS:
+                            prefetched.invalidate()
                     except Exception as e:
                         print(f"Error executing tool '{function_name}': {e}")
                         tool_result_content_for_llm = f"An internal error occurred: {e}"
@@ -285,6 +509,7 @@ async def get_llm_response_with_history(session_id: str, messages_history: list[
                 })
 
             messages_for_llm.extend(tool_results_for_next_turn)
+            router.record_tool_results([result["name"] for result in tool_results_for_next_turn])
             continue
 
         else:
@@ -293,6 +518,7 @@ async def get_llm_response_with_history(session_id: str, messages_history: list[
                  final_response_content = "I seem unable to respond now. Please try again."
             break
 
+    print(f"LLM: Turn used {router.models_used} (est. ${router.cost_usd:.5f}).")
     if final_response_content:
          return final_response_content
     elif loop_count >= MAX_TOOL_CALLS:
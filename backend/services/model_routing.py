@@ -0,0 +1,220 @@
+import os
+import json
+import threading
+from datetime import datetime
+from collections import Counter
+from ..utils import idempotency
+
+
+# premium: every iteration on the premium model (the original behaviour)
+# small:   every iteration on the small model, promoted only when its tool args are invalid
+# tiered:  the small model plans tool calls and answers turns that need no tools; a reply that reports tool
+#          results is written by the premium model. The step after a booking change is almost always that reply,
+#          so it goes straight to the premium model.
+ROUTING_POLICIES = ("premium", "small", "tiered")
+LLM_ROUTING_POLICY = os.getenv("LLM_ROUTING_POLICY", "tiered")
+SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")
+
+# USD per 1M tokens as (input, output). Longest matching prefix wins, so dated snapshots share a price.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+_TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+}
+
+
+def model_price(model: str):
+    """Returns (input, output) USD per 1M tokens for a model, or None when it is not in MODEL_PRICES."""
+    matches = [name for name in MODEL_PRICES if (model or "").startswith(name)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: str, usage) -> float:
+    """Estimated USD cost of one completion from its usage block. Unknown models or missing usage count as 0."""
+    price = model_price(model)
+    if price is None or usage is None:
+        return 0.0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def invalid_tool_call_reason(tool_calls, tools_schema: list[dict]):
+    """
+    Checks tool calls against the tool schema: known name, JSON object args, required fields present,
+    no unknown fields, string/integer types, enum values and 'YYYY-MM-DD HH:MM:SS' datetimes.
+    Returns a short reason for the first problem found, or None if every call is valid.
+    """
+    parameters_by_name = {tool["function"]["name"]: tool["function"]["parameters"] for tool in tools_schema}
+    for tool_call in tool_calls:
+        if tool_call.type != "function":
+            return "unrecognized tool call type"
+        name = tool_call.function.name
+        parameters = parameters_by_name.get(name)
+        if parameters is None:
+            return f"unknown tool '{name}'"
+        try:
+            args = json.loads(tool_call.function.arguments or "{}")
+        except ValueError:
+            return f"{name}: arguments are not valid JSON"
+        if not isinstance(args, dict):
+            return f"{name}: arguments are not an object"
+
+        properties = parameters.get("properties", {})
+        missing = [field for field in parameters.get("required", []) if args.get(field) in (None, "")]
+        if missing:
+            return f"{name}: missing {', '.join(missing)}"
+        unknown = [field for field in args if field not in properties]
+        if unknown:
+            return f"{name}: unknown argument(s) {', '.join(unknown)}"
+
+        for field, value in args.items():
+            if value is None:
+                continue
+            check = _TYPE_CHECKS.get(properties[field].get("type"))
+            if check and not check(value):
+                return f"{name}: {field} should be {properties[field]['type']}"
+            if "enum" in properties[field] and value not in properties[field]["enum"]:
+                return f"{name}: {field} is not one of {properties[field]['enum']}"
+            if "datetime" in field:
+                try:
+                    datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    return f"{name}: {field} is not 'YYYY-MM-DD HH:MM:SS'"
+    return None
+
+
+class RoutingStats:
+    """
+    Process-wide counters: calls, tokens and estimated cost per model, promotions by reason, and the calls
+    (with their cost and latency) whose reply was discarded by a promotion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.turns = 0
+            self.calls = Counter()
+            self.prompt_tokens = Counter()
+            self.completion_tokens = Counter()
+            self.cost_usd = Counter()
+            self.promotions = Counter()
+            self.discarded_calls = Counter()
+            self.discarded_cost_usd = Counter()
+            self.discarded_latency_ms = Counter()
+
+    def record_call(self, model: str, usage, cost: float):
+        with self._lock:
+            self.calls[model] += 1
+            self.prompt_tokens[model] += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens[model] += getattr(usage, "completion_tokens", 0) or 0
+            self.cost_usd[model] += cost
+
+    def record_promotion(self, reason: str):
+        with self._lock:
+            self.promotions[reason] += 1
+
+    def record_discarded(self, model: str, cost: float, latency_ms: float):
+        with self._lock:
+            self.discarded_calls[model] += 1
+            self.discarded_cost_usd[model] += cost
+            self.discarded_latency_ms[model] += latency_ms
+
+    def record_turn(self):
+        with self._lock:
+            self.turns += 1
+
+    def snapshot(self):
+        with self._lock:
+            total_cost = sum(self.cost_usd.values())
+            return {
+                "policy": LLM_ROUTING_POLICY,
+                "turns": self.turns,
+                "calls": dict(self.calls),
+                "prompt_tokens": dict(self.prompt_tokens),
+                "completion_tokens": dict(self.completion_tokens),
+                "cost_usd": {model: round(cost, 6) for model, cost in self.cost_usd.items()},
+                "cost_per_turn_usd": round(total_cost / self.turns, 6) if self.turns else None,
+                "promotions": dict(self.promotions),
+                "discarded_calls": dict(self.discarded_calls),
+                "discarded_cost_usd": {model: round(cost, 6) for model, cost in self.discarded_cost_usd.items()},
+                "discarded_latency_ms": {model: round(ms, 1) for model, ms in self.discarded_latency_ms.items()},
+            }
+
+
+stats = RoutingStats()
+
+
+class TurnRouter:
+    """
+    Picks the model for each iteration of one agent-loop turn and decides when a small-model reply must be
+    redone by the premium model. A promotion for invalid tool args sticks for the rest of the turn.
+    Under 'tiered', a small-model text reply stands when no tool ran in the turn; once tools ran it is redone on the
+    premium model. The step after a write tool (book, cancel, reschedule, ...) runs on the premium model directly
+    instead of having the small model write a reply that would be discarded.
+    """
+
+    def __init__(self, policy: str, premium_model: str, small_model: str = SMALL_MODEL):
+        if policy not in ROUTING_POLICIES:
+            print(f"LLM: Unknown routing policy '{policy}', using 'premium'.")
+            policy = "premium"
+        self.policy = policy
+        self.premium_model = premium_model
+        self.small_model = small_model
+        self.promoted = policy == "premium" or small_model == premium_model
+        self.reply_expected = False
+        self.tools_ran = False
+        self.cost_usd = 0.0
+        self._last_cost = 0.0
+        self._last_latency_ms = 0.0
+        self.models_used: list[str] = []
+
+    @property
+    def model(self) -> str:
+        if self.promoted or (self.policy == "tiered" and self.reply_expected):
+            return self.premium_model
+        return self.small_model
+
+    def record_tool_results(self, function_names: list[str]):
+        """Called once a step's tool results were added to the conversation; picks the model for the next step."""
+        self.tools_ran = self.tools_ran or bool(function_names)
+        self.reply_expected = any(name in idempotency.WRITE_TOOLS for name in function_names)
+
+    def promotion_reason(self, message, model: str, tools_schema: list[dict]):
+        """Returns why `message` from `model` should be regenerated on the premium model, or None to accept it."""
+        if model == self.premium_model:
+            return None
+        if message.tool_calls:
+            reason = invalid_tool_call_reason(message.tool_calls, tools_schema)
+            if reason:
+                self.promoted = True
+                stats.record_promotion("invalid_tool_args")
+                stats.record_discarded(model, self._last_cost, self._last_latency_ms)
+                return f"invalid tool args ({reason})"
+            return None
+        if self.policy == "tiered" and self.tools_ran:
+            stats.record_promotion("reply_after_tools")
+            stats.record_discarded(model, self._last_cost, self._last_latency_ms)
+            return "reply after tool results"
+        return None
+
+    def record(self, requested_model: str, completion, latency_ms: float = 0.0):
+        """Accounts one completion. The provider may have failed over, so the model it reports is preferred."""
+        model = getattr(completion, "model", None) or requested_model
+        usage = getattr(completion, "usage", None)
+        cost = estimate_cost(model, usage)
+        self.cost_usd += cost
+        self._last_cost = cost
+        self._last_latency_ms = latency_ms
+        self.models_used.append(model)
+        stats.record_call(model, usage, cost)
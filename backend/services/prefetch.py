@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from ..utils import db_utils, idempotency
+
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+MISS = object() # returned by TurnPrefetch.take when the tool call has to run normally
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def _lookup_user_appointments(session_id: str, args: dict):
+    return db_utils.get_user_appointments(**args)
+
+
+# Tools that may be run speculatively. Each must be a pure read: its prefetched result is returned to the model as is.
+# check_availability is not one, since it places a hold, which has to be decided on the writer.
+PREFETCHABLE_TOOLS = {
+    "get_user_appointments": _lookup_user_appointments,
+}
+
+
+def predict_tool_calls(message: str) -> list[tuple[str, dict]]:
+    """Guesses the read-only tool calls the model is about to make for this user message: an email -> get_user_appointments."""
+    predictions = []
+    email = EMAIL_PATTERN.search(message)
+    if email:
+        predictions.append(("get_user_appointments", {"user_email": email.group(0)}))
+    return predictions
+
+
+class PrefetchStats:
+    """Process-wide counters. hit_rate is hits per prefetch started; saved_ms is lookup time the tool call did not wait for."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.saved_ms = 0.0
+
+    def record(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": PREFETCH_ENABLED,
+                "started": self.started, "hits": self.hits, "misses": self.misses, "invalidated": self.invalidated,
+                "hit_rate": round(self.hits / self.started, 3) if self.started else None,
+                "saved_ms_total": round(self.saved_ms, 1),
+                "saved_ms_per_hit": round(self.saved_ms / self.hits, 1) if self.hits else None,
+            }
+
+
+stats = PrefetchStats()
+
+
+class TurnPrefetch:
+    """
+    Speculative lookups for one chat turn, started in worker threads while the first completion is in flight.
+    A tool call is served from a lookup only when its normalized args match exactly. A write in the same turn
+    discards whatever is left, since it may have changed the answer.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._tasks: dict[str, tuple[dict, asyncio.Task]] = {}
+
+    @classmethod
+    def start(cls, session_id: str, message: str):
+        prefetch = cls(session_id)
+        if not PREFETCH_ENABLED or not message:
+            return prefetch
+        for function_name, args in predict_tool_calls(message):
+            prefetch._tasks[function_name] = (idempotency.normalize_args(args), asyncio.create_task(prefetch._run(function_name, args)))
+            stats.record(started=1)
+        return prefetch
+
+    async def _run(self, function_name: str, args: dict):
+        started = time.perf_counter()
+        value = await asyncio.to_thread(PREFETCHABLE_TOOLS[function_name], self.session_id, args)
+        return value, (time.perf_counter() - started) * 1000
+
+    async def take(self, function_name: str, function_args: dict):
+        """Returns the prefetched result when this call can be served from a lookup, else MISS."""
+        entry = self._tasks.get(function_name)
+        if entry is None or entry[0] != idempotency.normalize_args(function_args):
+            return MISS
+
+        del self._tasks[function_name]
+        waited_from = time.perf_counter()
+        try:
+            value, lookup_ms = await entry[1]
+        except Exception as e:
+            print(f"Prefetch of {function_name} failed: {e}")
+            stats.record(misses=1)
+            return MISS
+        waited_ms = (time.perf_counter() - waited_from) * 1000
+        stats.record(hits=1, saved_ms=max(0.0, lookup_ms - waited_ms))
+        print(f"LLM: Served {function_name} from prefetch (saved {max(0.0, lookup_ms - waited_ms):.1f} ms).")
+        return value
+
+    def invalidate(self):
+        """Drops the remaining lookups, e.g. after a write tool ran in this turn."""
+        stats.record(invalidated=len(self._tasks))
+        self._discard()
+
+    def finish(self):
+        """Counts unused lookups as misses and lets go of them at the end of the turn."""
+        stats.record(misses=len(self._tasks))
+        self._discard()
+
+    def _discard(self):
+        for _, task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception() # retrieve it so a failed lookup is not reported as an unhandled task error
+        self._tasks.clear()
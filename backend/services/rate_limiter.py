@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+
+# Per-model quotas; 0 disables that limit. Overrides per model: LLM_RATE_LIMITS="gpt-4o=500:30000,gpt-4o-mini=500:200000".
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "30000"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+# How long a chat turn may wait in the queue for one completion before the route answers 503 + Retry-After.
+LLM_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+# Completion tokens reserved per request on top of the prompt estimate; settled against the real usage afterwards.
+LLM_COMPLETION_TOKEN_RESERVE = int(os.getenv("LLM_COMPLETION_TOKEN_RESERVE", "300"))
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+
+class RateLimitQueueTimeout(Exception):
+    """Raised when a request could not be admitted within the max wait. retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM rate limit queue is full; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages: list[dict], tools: list[dict] | None = None) -> int:
+    """Cheap prompt-token estimate (about 4 characters per token) plus the completion reserve."""
+    chars = 0
+    for message in messages:
+        chars += len(str(message.get("content") or ""))
+        if message.get("tool_calls"):
+            chars += len(json.dumps(message["tool_calls"]))
+    if tools:
+        chars += len(json.dumps(tools))
+    return chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages) + LLM_COMPLETION_TOKEN_RESERVE
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to `per_minute` units. per_minute <= 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.capacity <= 0
+
+    def refill(self, now: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount: float) -> float:
+        """Caps a single request at the bucket size so oversized requests are still admitted eventually."""
+        return min(amount, self.capacity)
+
+    def seconds_until(self, amount: float) -> float:
+        if self.unlimited or self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.level -= amount
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, tokens: int):
+        self.future = future
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class RateLimitScheduler:
+    """
+    Admits LLM requests against request-per-minute and token-per-minute buckets.
+
+    Waiters are queued per session and served round-robin across sessions, so one chatty session cannot starve
+    the others. The head of the rotation is served strictly in order, which keeps large requests from starving too.
+    When the buckets are short, a single timer is armed for the moment the head request fits.
+    """
+
+    def __init__(self, rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT, max_wait: float = LLM_RATE_LIMIT_MAX_WAIT_SECONDS):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._timer: asyncio.TimerHandle | None = None
+        self._wait_times_ms = deque(maxlen=500)
+        self.admitted = 0
+        self.queued = 0
+        self.timed_out = 0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+
+    @property
+    def queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            while queue and queue[0].future.done(): # timed out or cancelled while queued
+                queue.popleft()
+            if not queue:
+                del self._queues[session_id]
+                continue
+
+            waiter = queue[0]
+            token_cost = self.tokens.cost(waiter.tokens)
+            delay = max(self.requests.seconds_until(1), self.tokens.seconds_until(token_cost))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            queue.popleft()
+            self.requests.take(1)
+            self.tokens.take(token_cost)
+            self._admit(waiter, now)
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+
+    def _admit(self, waiter: _Waiter, now: float):
+        self.admitted += 1
+        self.estimated_tokens += waiter.tokens
+        self._wait_times_ms.append((now - waiter.enqueued_at) * 1000)
+        waiter.future.set_result(None)
+
+    def _retry_after(self) -> float:
+        """How long the current backlog needs to drain at the configured rates."""
+        queued_tokens = sum(waiter.tokens for queue in self._queues.values() for waiter in queue)
+        drain = 0.0
+        if not self.requests.unlimited:
+            drain = max(drain, self.queue_depth / self.requests.rate)
+        if not self.tokens.unlimited:
+            drain = max(drain, queued_tokens / self.tokens.rate)
+        return max(1.0, drain)
+
+    async def acquire(self, session_id: str, estimated_tokens: int):
+        """Waits until the request fits the quotas. Raises RateLimitQueueTimeout after max_wait."""
+        if self.requests.unlimited and self.tokens.unlimited:
+            self.admitted += 1
+            self.estimated_tokens += estimated_tokens
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), estimated_tokens)
+        self._queues.setdefault(session_id, deque()).append(waiter)
+        if self._timer is None:
+            self._dispatch()
+        if waiter.future.done():
+            return
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self._redispatch()
+            raise RateLimitQueueTimeout(self._retry_after())
+        except asyncio.CancelledError:
+            self._redispatch()
+            raise
+
+    def _redispatch(self):
+        """A waiter left the queue; if it was the one the timer was armed for, the next may fit sooner."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    def settle(self, estimated_tokens: int, usage):
+        """Corrects the token bucket once the real usage is known: refunds an over-estimate, charges an under-estimate."""
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        self.actual_tokens += actual
+        if not self.tokens.unlimited:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual)
+
+    def stats(self):
+        waits = sorted(self._wait_times_ms)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))], 1) if waits else None
+
+        return {
+            "rpm_limit": int(self.requests.capacity), "tpm_limit": int(self.tokens.capacity),
+            "queue_depth": self.queue_depth, "waiting_sessions": len(self._queues),
+            "admitted": self.admitted, "queued": self.queued, "timed_out": self.timed_out,
+            "wait_ms": {"p50": percentile(50), "p95": percentile(95), "max": round(waits[-1], 1) if waits else None},
+            "tokens_available": None if self.tokens.unlimited else int(self.tokens.level),
+            "estimated_tokens": self.estimated_tokens, "actual_tokens": self.actual_tokens,
+        }
+
+
+def _parse_overrides(spec: str) -> dict[str, tuple[int, int]]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, limits = item.split("=")
+            rpm, tpm = limits.split(":")
+            overrides[model.strip()] = (int(rpm), int(tpm))
+        except ValueError:
+            print(f"Ignoring malformed LLM_RATE_LIMITS entry: '{item}'")
+    return overrides
+
+
+_overrides = _parse_overrides(LLM_RATE_LIMITS)
+_schedulers: dict[str, RateLimitScheduler] = {}
+
+
+def get_scheduler(model: str) -> RateLimitScheduler:
+    """Quotas are per model on the provider side, so each model gets its own scheduler."""
+    scheduler = _schedulers.get(model)
+    if scheduler is None:
+        rpm, tpm = _overrides.get(model, (LLM_RPM_LIMIT, LLM_TPM_LIMIT))
+        scheduler = _schedulers[model] = RateLimitScheduler(rpm, tpm)
+    return scheduler
+
+
+def stats():
+    return {model: scheduler.stats() for model, scheduler in _schedulers.items()}
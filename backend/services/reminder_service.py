@@ -0,0 +1,177 @@
+import os
+import heapq
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from ..utils import db_utils
+from . import email_service
+
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1") == "1"
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+# The heap only holds reminders due within this window; it is refilled from the indexed table as time moves on.
+REMINDER_LOOKAHEAD = timedelta(minutes=int(os.getenv("REMINDER_LOOKAHEAD_MINUTES", "60")))
+REMINDER_REFILL_INTERVAL = timedelta(minutes=5)
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ReminderScheduler:
+    """
+    Fires 24h/1h appointment reminders from an in-memory min-heap of (due_at, reminder_id).
+
+    The `reminders` table is the source of truth: db_utils writes and cancels rows in the same transaction
+    as the booking change. The heap is only an index of what is due soon. Cancelled or rescheduled reminders
+    left in the heap are discarded when claimed, because claim_reminders only returns rows that are still pending.
+
+    It also drains the waitlist queue (auto-booked entries not yet emailed) when asked to and on every refill,
+    so entries whose email failed are retried.
+    """
+
+    def __init__(self, batch_size: int = REMINDER_BATCH_SIZE, lookahead: timedelta = REMINDER_LOOKAHEAD):
+        self.batch_size = batch_size
+        self.lookahead = lookahead
+        self._heap: list[tuple[str, int]] = []
+        self._queued: set[int] = set()
+        self._loaded_until: datetime | None = None
+        self._next_refill = datetime.min
+        self._waitlist_due = True # entries left unnotified by a previous run
+        self._wake_event: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self.sent_count = 0
+        self.failed_count = 0
+        self.waitlist_sent_count = 0
+
+    def _refill(self, now: datetime):
+        """Loads pending reminders due within the lookahead window that are not already queued."""
+        until = now + self.lookahead
+        for row in db_utils.get_pending_reminders(_fmt(until)):
+            if row['reminder_id'] not in self._queued:
+                heapq.heappush(self._heap, (row['due_at'], row['reminder_id']))
+                self._queued.add(row['reminder_id'])
+        self._loaded_until = until
+        self._next_refill = now + REMINDER_REFILL_INTERVAL
+
+    def _pop_due(self, now: datetime):
+        """Pops up to batch_size reminders whose due time has passed."""
+        now_str = _fmt(now)
+        due = []
+        while self._heap and self._heap[0][0] <= now_str and len(due) < self.batch_size:
+            _, reminder_id = heapq.heappop(self._heap)
+            self._queued.discard(reminder_id)
+            due.append(reminder_id)
+        return due
+
+    def _fire(self, reminder_ids: list[int]):
+        """Claims a batch, sends it over one SMTP session and records the outcome. Runs in a worker thread."""
+        claimed = db_utils.claim_reminders(reminder_ids)
+        if not claimed:
+            return
+        results = email_service.send_appointment_emails_batch([
+            {'appointment_id': row['appointment_id'], 'action': f"reminder_{row['reminder_type']}", 'booking_details': row}
+            for row in claimed
+        ])
+        sent_ids = [row['reminder_id'] for row in claimed if results.get(row['appointment_id'])]
+        failed_ids = [row['reminder_id'] for row in claimed if not results.get(row['appointment_id'])]
+        db_utils.complete_reminders(sent_ids, failed_ids)
+        self.sent_count += len(sent_ids)
+        self.failed_count += len(failed_ids)
+        print(f"Reminders: sent {len(sent_ids)}, failed {len(failed_ids)}.")
+
+    def _send_waitlist(self):
+        """Emails auto-booked waitlist entries. Runs in a worker thread."""
+        sent = email_service.send_waitlist_notifications()
+        if sent:
+            self.waitlist_sent_count += sent
+            print(f"Reminders: notified {sent} waitlisted user(s) of their new booking.")
+
+    def _seconds_until_next_event(self, now: datetime):
+        next_time = self._next_refill
+        if self._heap:
+            next_time = min(next_time, datetime.fromisoformat(self._heap[0][0]))
+        return max(0.0, (next_time - now).total_seconds())
+
+    async def _run(self):
+        await asyncio.to_thread(db_utils.release_unfinished_reminders)
+        while True:
+            try:
+                now = datetime.now()
+                if now >= self._next_refill:
+                    await asyncio.to_thread(self._refill, now)
+                    self._waitlist_due = True
+                if self._waitlist_due:
+                    self._waitlist_due = False
+                    await asyncio.to_thread(self._send_waitlist)
+
+                due = self._pop_due(now)
+                if due:
+                    await asyncio.to_thread(self._fire, due)
+                    continue # more may be due; drain before sleeping
+
+                self._wake_event.clear() #type: ignore
+                if self._waitlist_due:
+                    continue # asked for while the last batch was being sent
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=self._seconds_until_next_event(now)) #type: ignore
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Reminder scheduler error: {e}")
+                await asyncio.sleep(5)
+
+    def wake(self):
+        """
+        Asks the scheduler to reload from the reminders table now, e.g. right after a booking change
+        created a reminder due sooner than the next refill. Safe to call from any thread.
+        """
+        self._next_refill = datetime.min
+        if self._loop is not None and self._wake_event is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def notify_waitlist(self):
+        """
+        Asks for the waitlist queue to be emailed soon, e.g. after a cancellation handed the freed slot to a
+        waitlisted user. Never sends on the caller's thread. Safe to call from any thread.
+        """
+        if self._loop is None or self._wake_event is None:
+            # Scheduler disabled or not started: send from a short-lived thread instead.
+            threading.Thread(target=self._send_waitlist, daemon=True).start()
+            return
+        self._waitlist_due = True
+        self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def start(self):
+        if not REMINDERS_ENABLED or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print("Reminder scheduler started.")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        print("Reminder scheduler stopped.")
+
+    def stats(self):
+        return {
+            'queued': len(self._heap),
+            'loaded_until': _fmt(self._loaded_until) if self._loaded_until else None,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'waitlist_sent': self.waitlist_sent_count,
+        }
+
+
+scheduler = ReminderScheduler()
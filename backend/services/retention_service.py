@@ -0,0 +1,201 @@
+import os
+import io
+import gzip
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from ..utils import db_utils
+
+try:
+    import zstandard
+except ImportError: # optional; archives fall back to gzip
+    zstandard = None
+
+
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "1") == "1"
+# Sessions with no message or state change for this many days are archived and removed from the database.
+SESSION_RETENTION_DAYS = int(os.getenv("SESSION_RETENTION_DAYS", "30"))
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SESSIONS = int(os.getenv("RETENTION_BATCH_SESSIONS", "200"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join('data', 'archive'))
+
+# Incremental vacuum: pages freed per slice, pause between slices, and a cap on vacuum time per run.
+VACUUM_SLICE_PAGES = int(os.getenv("VACUUM_SLICE_PAGES", "256"))
+VACUUM_SLICE_PAUSE_SECONDS = float(os.getenv("VACUUM_SLICE_PAUSE_SECONDS", "0.05"))
+VACUUM_MAX_SECONDS = float(os.getenv("VACUUM_MAX_SECONDS", "10"))
+
+ARCHIVE_EXTENSION = '.jsonl.zst' if zstandard is not None else '.jsonl.gz'
+
+
+def _compress(data: bytes) -> bytes:
+    """One self-contained zstd frame (or gzip member). Appending these to a file keeps it readable as a whole."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def archive_path(month: str, archive_dir: str | None = None) -> str:
+    return os.path.join(archive_dir or ARCHIVE_DIR, f"conversations-{month}{ARCHIVE_EXTENSION}")
+
+
+def append_to_archive(sessions: list[dict], archive_dir: str | None = None):
+    """
+    Appends sessions as JSON lines to monthly partitions (by last activity), one compressed frame per file per call.
+    The files are fsynced before returning, so the rows can be deleted safely afterwards.
+    Returns {path: sessions written}.
+    """
+    by_month: dict[str, list[dict]] = {}
+    for session in sessions:
+        month = (session.get('last_activity') or datetime.now(timezone.utc).strftime('%Y-%m'))[:7]
+        by_month.setdefault(month, []).append(session)
+
+    written = {}
+    os.makedirs(archive_dir or ARCHIVE_DIR, exist_ok=True)
+    for month, month_sessions in sorted(by_month.items()):
+        path = archive_path(month, archive_dir)
+        lines = ''.join(json.dumps(session, ensure_ascii=False, default=str) + '\n' for session in month_sessions)
+        with open(path, 'ab') as f:
+            f.write(_compress(lines.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+        written[path] = len(month_sessions)
+    return written
+
+
+def read_archive(path: str):
+    """Yields the archived sessions in one partition file. A session archived twice (see run_once) appears twice."""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the 'zstandard' package.")
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            for line in io.TextIOWrapper(reader, encoding='utf-8'):
+                yield json.loads(line)
+    else:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+class RetentionJob:
+    """
+    Periodically moves inactive sessions out of conversation_history and session_state into compressed monthly
+    archive files, then hands the freed pages back with incremental vacuum in short slices.
+
+    Archiving is at-least-once: a batch is written and fsynced before its rows are deleted, so a crash in between
+    (or a session that becomes active again mid-batch) can leave a session in an archive file more than once.
+    Deletes and vacuum slices go through the single writer, so live writes are never held up by more than one slice.
+    """
+
+    def __init__(self, retention_days: int = SESSION_RETENTION_DAYS, batch_size: int = RETENTION_BATCH_SESSIONS,
+                 archive_dir: str | None = None):
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.archived_sessions = 0
+        self.archived_messages = 0
+        self.vacuumed_pages = 0
+        self.last_run_at: str | None = None
+        self.last_run_seconds = 0.0
+
+    def cutoff(self, now: datetime | None = None) -> str:
+        # Timestamps in these tables come from CURRENT_TIMESTAMP, which is UTC.
+        now = now or datetime.now(timezone.utc)
+        return (now - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def archive_expired(self, cutoff: str):
+        """Archives and deletes every session inactive since before cutoff, one batch at a time. Runs in a worker thread."""
+        after = ''
+        archived = 0
+        while True:
+            session_ids = db_utils.get_expired_sessions(cutoff, after, self.batch_size)
+            if not session_ids:
+                break
+            after = session_ids[-1]
+            sessions = db_utils.get_sessions_for_archive(session_ids)
+            if not sessions:
+                break
+            append_to_archive(list(sessions.values()), self.archive_dir)
+            deleted = db_utils.delete_expired_sessions(session_ids, cutoff)
+            if deleted is None:
+                break
+            archived += len(deleted)
+            self.archived_sessions += len(deleted)
+            self.archived_messages += sum(len(sessions[session_id]['messages']) for session_id in deleted)
+        return archived
+
+    async def vacuum(self, max_seconds: float = VACUUM_MAX_SECONDS):
+        """Frees pages VACUUM_SLICE_PAGES at a time, pausing between slices, until none are left or max_seconds is used."""
+        free_pages, auto_vacuum = await asyncio.to_thread(db_utils.get_freelist_pages)
+        if auto_vacuum != 2:
+            if free_pages:
+                print("Retention: auto_vacuum is not INCREMENTAL; re-run init_db to convert the database.")
+            return 0
+        freed = 0
+        deadline = time.monotonic() + max_seconds
+        while free_pages and time.monotonic() < deadline:
+            left = await asyncio.to_thread(db_utils.incremental_vacuum, min(free_pages, VACUUM_SLICE_PAGES))
+            if left is None or left >= free_pages:
+                break
+            freed += free_pages - left
+            free_pages = left
+            await asyncio.sleep(VACUUM_SLICE_PAUSE_SECONDS)
+        self.vacuumed_pages += freed
+        return freed
+
+    async def run_once(self):
+        started = time.monotonic()
+        archived = await asyncio.to_thread(self.archive_expired, self.cutoff())
+        freed = await self.vacuum()
+        self.runs += 1
+        self.last_run_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.last_run_seconds = time.monotonic() - started
+        if archived or freed:
+            print(f"Retention: archived {archived} sessions, freed {freed} pages in {self.last_run_seconds:.1f}s.")
+        return archived, freed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Retention job error: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+    def start(self):
+        if not RETENTION_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        print("Retention job started.")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        print("Retention job stopped.")
+
+    def stats(self):
+        return {
+            'enabled': RETENTION_ENABLED,
+            'retention_days': self.retention_days,
+            'compression': 'zstd' if zstandard is not None else 'gzip',
+            'runs': self.runs,
+            'last_run_at': self.last_run_at,
+            'last_run_seconds': round(self.last_run_seconds, 2),
+            'archived_sessions': self.archived_sessions,
+            'archived_messages': self.archived_messages,
+            'vacuumed_pages': self.vacuumed_pages,
+        }
+
+
+retention_job = RetentionJob()
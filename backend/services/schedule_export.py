@@ -0,0 +1,149 @@
+import io
+import os
+import csv
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from ..utils import db_utils
+
+
+# Appointments read from the database per chunk of an export. Memory per export is bounded by this, not the range.
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+APPOINTMENT_MINUTES = 60
+CSV_COLUMNS = (
+    'appointment_id', 'start', 'end', 'status', 'service_id', 'service_name',
+    'consultant_id', 'consultant_name', 'user_name', 'user_email', 'created_at',
+)
+ICS_STATUS = {'booked': 'CONFIRMED', 'cancelled': 'CANCELLED'}
+
+
+def _end(appointment_datetime: str) -> str:
+    start = datetime.strptime(appointment_datetime, '%Y-%m-%d %H:%M:%S')
+    return (start + timedelta(minutes=APPOINTMENT_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _csv_cell(value):
+    # Spreadsheets run cells starting with these as formulas; user names are free text.
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+def csv_chunks(batches):
+    """Yields the CSV export as text chunks: the header, then one chunk per batch of appointments."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for appointment in batch:
+            writer.writerow([
+                appointment['appointment_id'], appointment['appointment_datetime'], _end(appointment['appointment_datetime']),
+                appointment['status'], appointment['service_id'], _csv_cell(appointment['service_name']),
+                appointment['consultant_id'], _csv_cell(appointment['consultant_name']),
+                _csv_cell(appointment['user_name']), _csv_cell(appointment['user_email']), appointment['created_at'],
+            ])
+        yield buffer.getvalue()
+
+
+def _ics_text(value) -> str:
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_time(value: str) -> str:
+    """'YYYY-MM-DD HH:MM:SS' -> 'YYYYMMDDTHHMMSS'."""
+    return value.replace('-', '').replace(':', '').replace(' ', 'T')
+
+
+def _fold(line: str) -> str:
+    """Folds a content line at 75 octets (RFC 5545 3.1) without splitting a UTF-8 character."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start, limit = end, 74 # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _vevent(appointment: dict, stamp: str) -> str:
+    description = f"Appointment #{appointment['appointment_id']}, {appointment['consultant_name']}, {appointment['user_email']}"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:appointment-{appointment['appointment_id']}@ai-receptionist",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_ics_time(appointment['appointment_datetime'])}",
+        f"DTEND:{_ics_time(_end(appointment['appointment_datetime']))}",
+        f"SUMMARY:{_ics_text(appointment['service_name'])} with {_ics_text(appointment['user_name'])}",
+        f"DESCRIPTION:{_ics_text(description)}",
+        f"STATUS:{ICS_STATUS.get(appointment['status'], 'TENTATIVE')}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+
+def ics_chunks(batches, calendar_name: str):
+    """
+    Yields an iCalendar export as text chunks: the calendar header, one chunk of VEVENTs per batch, the footer.
+    Times are floating (no time zone), the same local time the appointments are booked in.
+    """
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//AI Receptionist//Schedule Export//EN',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', f"X-WR-CALNAME:{_ics_text(calendar_name)}",
+    ))
+    for batch in batches:
+        yield ''.join(_vevent(appointment, stamp) for appointment in batch)
+    yield _fold('END:VCALENDAR')
+
+
+def export_batches(start_day: str, end_day: str, consultant_id: int | None = None, service_id: int | None = None,
+                   status: str | None = 'booked'):
+    """Appointments between start_day and end_day (YYYY-MM-DD, both inclusive) in batches of EXPORT_BATCH_ROWS."""
+    end_exclusive = (datetime.strptime(end_day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return db_utils.iter_appointments(f"{start_day} 00:00:00", f"{end_exclusive} 00:00:00", consultant_id=consultant_id,
+                                      service_id=service_id, status=status, batch_size=EXPORT_BATCH_ROWS)
+
+
+def export_validators(kind: str, params: dict, window_since: datetime | None = None):
+    """
+    (etag, last_modified) for an export. The ETag covers the parameters, the appointments version and the reference
+    data version, so it changes whenever the export could. last_modified is an HTTP date or None. window_since is
+    when a default (moving) date range last moved; Last-Modified is never older than it.
+    """
+    version = db_utils.get_appointments_version()
+    if version is None:
+        return None, None
+    sequence, last_changed_at = version
+    reference_version = db_utils.get_reference_data().version
+    key = f"{kind}|{sorted(params.items())}|{sequence}|{reference_version}"
+    etag = '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+    last_modified = None
+    if last_changed_at:
+        changed = datetime.strptime(last_changed_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if window_since is not None:
+            changed = max(changed, window_since.astimezone(timezone.utc))
+        last_modified = format_datetime(changed, usegmt=True)
+    return etag, last_modified
+
+
+def is_not_modified(etag: str | None, last_modified: str | None, if_none_match: str | None, if_modified_since: str | None) -> bool:
+    """RFC 9110 conditional GET: If-None-Match wins; If-Modified-Since is only looked at without it."""
+    if etag is None:
+        return False
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
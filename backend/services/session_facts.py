@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+from ..utils import db_utils
+
+
+SESSION_FACTS_CACHE_SIZE = int(os.getenv("SESSION_FACTS_CACHE_SIZE", "1000"))
+# Once facts are known, only this many trailing transcript messages are sent to the model (0 keeps everything).
+SESSION_HISTORY_WINDOW = int(os.getenv("SESSION_HISTORY_WINDOW", "8"))
+
+FACT_FIELDS = ('user_name', 'user_email', 'requested_service_id', 'requested_consultant_id', 'requested_datetime')
+
+# Tool argument names that carry each fact.
+_NAME_ARGS = ('user_name',)
+_EMAIL_ARGS = ('user_email',)
+_SERVICE_ID_ARGS = ('new_service_id', 'service_id')
+_DATETIME_ARGS = ('new_appt_datetime', 'appt_datetime', 'requested_datetime_str', 'start_datetime_str')
+
+
+class SessionFactsCache:
+    """Thread-safe LRU of session_id -> facts dict, backed by the session_state table."""
+
+    def __init__(self, max_entries: int = SESSION_FACTS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            facts = self._entries.get(session_id)
+            if facts is not None:
+                self._entries.move_to_end(session_id)
+            return facts
+
+    def put(self, session_id: str, facts: dict):
+        with self._lock:
+            self._entries[session_id] = facts
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+facts_cache = SessionFactsCache()
+
+
+def service_names():
+    """Service id -> name, from the reference data snapshot."""
+    return {service_id: service['service_name'] for service_id, service in db_utils.get_reference_data().services.items()}
+
+
+def get_facts(session_id: str) -> dict:
+    """Returns the known facts for a session from the hot cache, loading session_state on a miss."""
+    facts = facts_cache.get(session_id)
+    if facts is None:
+        row = db_utils.get_session_state(session_id)
+        facts = {field: row[field] for field in FACT_FIELDS if row and row[field] is not None}
+        facts_cache.put(session_id, facts)
+    return facts
+
+
+def extract_facts(function_name: str, function_args: dict, tool_result_value) -> dict:
+    """Pulls user and request facts out of one tool call's arguments and result."""
+    facts = {}
+    for field, arg_names in (('user_name', _NAME_ARGS), ('user_email', _EMAIL_ARGS),
+                             ('requested_service_id', _SERVICE_ID_ARGS), ('requested_datetime', _DATETIME_ARGS)):
+        for arg in arg_names:
+            if function_args.get(arg):
+                facts[field] = function_args[arg]
+                break
+
+    if 'requested_service_id' not in facts and function_args.get('service_name'):
+        ids_by_name = {name.lower(): service_id for service_id, name in service_names().items()}
+        service_id = ids_by_name.get(str(function_args['service_name']).strip().lower())
+        if service_id:
+            facts['requested_service_id'] = service_id
+
+    if function_name == "check_availability" and isinstance(tool_result_value, list) and tool_result_value:
+        facts['requested_consultant_id'] = tool_result_value[0].get('consultant_id')
+    elif function_name == "find_next_available_slot" and isinstance(tool_result_value, tuple) and tool_result_value[0]:
+        facts['requested_datetime'] = tool_result_value[0]
+        facts['requested_consultant_id'] = tool_result_value[1].get('consultant_id')
+
+    if 'user_email' in facts:
+        facts['user_email'] = str(facts['user_email']).strip()
+    return {field: value for field, value in facts.items() if value is not None}
+
+
+def record_tool_call(session_id: str, function_name: str, function_args: dict, tool_result_value):
+    """Updates the cached facts and session_state with whatever changed in this tool call."""
+    try:
+        new_facts = extract_facts(function_name, function_args, tool_result_value)
+        current = get_facts(session_id)
+        changes = {field: value for field, value in new_facts.items() if current.get(field) != value}
+        if not changes:
+            return
+
+        facts_cache.put(session_id, {**current, **changes})
+        db_utils.create_session_if_not_exists(session_id)
+        db_utils.update_session_state(session_id, changes)
+    except Exception as e:
+        print(f"Error recording session facts: {e}")
+
+
+def build_facts_block(facts: dict) -> str:
+    """Renders facts as one compact system message."""
+    parts = []
+    if facts.get('user_name'):
+        parts.append(f"name={facts['user_name']}")
+    if facts.get('user_email'):
+        parts.append(f"email={facts['user_email']}")
+    if facts.get('requested_service_id'):
+        service_name = service_names().get(facts['requested_service_id'], '?')
+        parts.append(f"service={service_name} (id {facts['requested_service_id']})")
+    if facts.get('requested_datetime'):
+        parts.append(f"datetime={facts['requested_datetime']}")
+    if facts.get('requested_consultant_id'):
+        parts.append(f"consultant_id={facts['requested_consultant_id']}")
+    return "Known session facts (from earlier in this conversation, do not ask again): " + "; ".join(parts)
+
+
+def trim_history(messages_history: list[dict], window: int = SESSION_HISTORY_WINDOW) -> list[dict]:
+    """Keeps the last `window` messages, starting at a user message so the model never sees a dangling reply."""
+    if window <= 0 or len(messages_history) <= window:
+        return messages_history
+    trimmed = messages_history[-window:]
+    for index, message in enumerate(trimmed):
+        if message.get("role") == "user":
+            return trimmed[index:]
+    return messages_history[-1:]
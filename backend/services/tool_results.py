@@ -0,0 +1,83 @@
+import os
+import json
+
+
+# Caps on what one tool result may put into the prompt. Rows past the cap are summarised, not sent.
+TOOL_RESULT_MAX_ROWS = int(os.getenv("TOOL_RESULT_MAX_ROWS", "20"))
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "2000"))
+
+HOLD_FIELDS = ('hold_token', 'hold_expires_at')
+
+
+def dumps(value) -> str:
+    """JSON without the spaces json.dumps adds by default. Datetimes and other objects fall back to str()."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def encode_table(rows: list[dict], extra: dict | None = None,
+                 max_rows: int = TOOL_RESULT_MAX_ROWS, max_chars: int = TOOL_RESULT_MAX_CHARS) -> str:
+    """
+    Encodes rows as {"cols":[...],"rows":[[...],...]} so keys are sent once instead of once per row.
+    At most max_rows rows are kept, fewer if the text would exceed max_chars; a "truncated" note then says
+    how many were left out.
+    """
+    columns = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    values = [[row.get(column) for column in columns] for row in rows]
+
+    shown = min(len(values), max_rows)
+    while True:
+        payload = {**(extra or {}), "cols": columns, "rows": values[:shown]}
+        if shown < len(values):
+            payload["truncated"] = f"showing {shown} of {len(values)}; ask the user to narrow the request to see the rest"
+        text = dumps(payload)
+        if len(text) <= max_chars or shown <= 1:
+            return text
+        shown //= 2
+
+
+def _encode_availability(available):
+    if not available:
+        return "No consultants available."
+    # check_availability puts the hold on the first consultant only; it is sent once, outside the table.
+    hold = {field: available[0][field] for field in HOLD_FIELDS if available[0].get(field)}
+    rows = [{key: value for key, value in consultant.items() if key not in HOLD_FIELDS} for consultant in available]
+    return encode_table(rows, extra=hold)
+
+
+def _encode_next_slot(result):
+    found_datetime, consultant = result if isinstance(result, tuple) and len(result) == 2 else (None, None)
+    if not found_datetime:
+        return "No open slot in the next 7 days."
+    return dumps({"slot": found_datetime, **(consultant or {})})
+
+
+def _encode_user_appointments(appointments):
+    if not appointments:
+        return "No active appointments."
+    return encode_table(appointments)
+
+
+# Per-tool encoders for structured results. Anything else goes through encode_value.
+ENCODERS = {
+    "check_availability": _encode_availability,
+    "find_next_available_slot": _encode_next_slot,
+    "get_user_appointments": _encode_user_appointments,
+}
+
+
+def encode_value(value) -> str:
+    """Generic compact form: lists of dicts as a table, everything else as compact JSON."""
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return encode_table(value)
+    text = dumps(value)
+    if len(text) > TOOL_RESULT_MAX_CHARS:
+        return text[:TOOL_RESULT_MAX_CHARS] + f"... [truncated, {len(text) - TOOL_RESULT_MAX_CHARS} more characters]"
+    return text
+
+
+def encode_tool_result(function_name: str, value) -> str:
+    """Compact text for a structured (list, dict or tuple) tool result."""
+    encoder = ENCODERS.get(function_name, encode_value)
+    return encoder(value)
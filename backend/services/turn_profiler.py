@@ -0,0 +1,340 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import secrets
+import weakref
+import functools
+import threading
+import contextvars
+from collections import Counter
+from datetime import datetime
+
+
+# Percentage of chat turns profiled without being asked (0 disables sampling; X-Profile: 1 still works).
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join('data', 'profiles'))
+# Oldest profiles are deleted beyond this many.
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+# Turns profiled at the same time; further requests run unprofiled.
+MAX_CONCURRENT_PROFILES = 4
+PROFILE_ID_PATTERN = re.compile(r'\d{8}T\d{12}-[0-9a-f]{8}')
+
+_current_profile: contextvars.ContextVar['TurnProfile | None'] = contextvars.ContextVar('turn_profile', default=None)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@functools.lru_cache(maxsize=8192)
+def _label(code) -> str:
+    """'function (path.py:line)' for a code object; ';' is the folded format's separator, so it never appears."""
+    path = code.co_filename
+    if path.startswith(_PROJECT_ROOT):
+        path = os.path.relpath(path, _PROJECT_ROOT)
+    elif 'site-packages' in path:
+        path = path.split('site-packages' + os.sep, 1)[-1]
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(';', ':')
+
+
+def _task_stack(frame) -> list[str]:
+    """The event loop thread's stack without the loop machinery below the running task."""
+    frames = []
+    while frame is not None:
+        if frame.f_code.co_name == '_run' and frame.f_code.co_filename.endswith(os.path.join('asyncio', 'events.py')):
+            break
+        frames.append(frame)
+        frame = frame.f_back
+    return [_label(f.f_code) for f in reversed(frames)]
+
+
+def _await_stack(task: asyncio.Task, tasks) -> list[str]:
+    """Where a suspended task is waiting: its coroutine chain, followed into child tasks of the same turn."""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        if isinstance(awaitable, asyncio.Task):
+            if awaitable not in tasks:
+                labels.append('<await other task>')
+                break
+            awaitable = awaitable.get_coro()
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+        if frame is None:
+            if isinstance(awaitable, asyncio.Future):
+                labels.append('<await future>')
+            break
+        labels.append(_label(frame.f_code))
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+    return labels
+
+
+def _worker_call(frame):
+    """
+    (profile, stack) of a thread pool worker: asyncio.to_thread runs its call inside the caller's context, which
+    says whose call it is. The stack starts at the called function. (None, None) for anything else.
+    """
+    frames = []
+    while frame is not None:
+        if frame.f_code.co_name == 'run' and frame.f_code.co_filename.endswith(os.path.join('concurrent', 'futures', 'thread.py')):
+            fn = getattr(frame.f_locals.get('self'), 'fn', None)
+            context = getattr(getattr(fn, 'func', None), '__self__', None)
+            if isinstance(context, contextvars.Context):
+                return context.get(_current_profile), [_label(f.f_code) for f in reversed(frames)]
+            return None, None
+        frames.append(frame)
+        frame = frame.f_back
+    return None, None
+
+
+class TurnProfile:
+    """Samples collected for one request, as folded stacks: 'frame;frame;frame' -> count."""
+
+    def __init__(self, label: str, task: asyncio.Task, loop: asyncio.AbstractEventLoop, reason: str):
+        self.profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}" # sorts by start time
+        self.label = label
+        self.reason = reason
+        self.root_task = task
+        self.tasks = weakref.WeakSet([task]) # the request's task and every task created under it
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.started = time.perf_counter()
+        self.meta: dict = {}
+
+    def add(self, kind: str, labels: list[str]):
+        self.stacks[';'.join([self.label, kind, *labels])] += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class TurnProfiler:
+    """
+    Opt-in sampling profiler for single requests. While at least one request is profiled, a daemon thread
+    samples every interval_ms and files each sample under the request it belongs to:
+
+    - cpu: the request's task (or a task it created, e.g. a prefetch or a hedged LLM call) is running on the loop;
+    - thread: a thread pool worker is running an asyncio.to_thread call the request made;
+    - waiting: neither, so the request is suspended; the sample is the coroutine chain it is awaiting in.
+
+    Profiles are written as folded stacks (flamegraph.pl, speedscope, inferno) to profile_dir, with a JSON
+    sidecar holding the request's metadata. Other requests running at the same time are not attributed.
+    The sampler needs the GIL, so while Python code is busy it samples at most every sys.getswitchinterval().
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, profile_dir: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.interval = interval_ms / 1000
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+        self._active: list[TurnProfile] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._factory_loops = weakref.WeakSet()
+        self.profiles_written = 0
+        self.skipped = 0
+
+    def _install_task_factory(self, loop: asyncio.AbstractEventLoop):
+        """Makes tasks created inside a profiled request part of its profile. Installed once per loop, chaining any previous factory."""
+        if loop in self._factory_loops:
+            return
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, context=None):
+            if previous is not None:
+                task = previous(loop, coro) if context is None else previous(loop, coro, context=context)
+            else:
+                task = asyncio.Task(coro, loop=loop, context=context)
+            profile = _current_profile.get() if context is None else context.get(_current_profile)
+            if profile is not None:
+                profile.tasks.add(task)
+            return task
+
+        loop.set_task_factory(factory)
+        self._factory_loops.add(loop)
+
+    def _sample(self, profile: TurnProfile, frames: dict):
+        sampled = False
+        running = asyncio.current_task(profile.loop)
+        loop_frame = frames.get(profile.loop_thread_id)
+        if running is not None and running in profile.tasks and loop_frame is not None:
+            profile.add('cpu', _task_stack(loop_frame))
+            sampled = True
+        for thread_id, frame in frames.items():
+            if thread_id == profile.loop_thread_id:
+                continue
+            owner, stack = _worker_call(frame)
+            if owner is profile:
+                profile.add('thread', stack)
+                sampled = True
+        if not sampled:
+            profile.add('waiting', _await_stack(profile.root_task, profile.tasks))
+
+    def _run_sampler(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                profiles = list(self._active)
+            frames = sys._current_frames()
+            frames.pop(own_id, None)
+            for profile in profiles:
+                try:
+                    self._sample(profile, frames)
+                except Exception as e: # a frame went away under us; skip this sample
+                    print(f"Profiler: sample failed: {e}")
+            del frames
+            time.sleep(self.interval)
+
+    def start(self, label: str, reason: str):
+        """Starts profiling the current task. Returns (profile, contextvar token), or None if too many are running."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._active) >= MAX_CONCURRENT_PROFILES:
+                self.skipped += 1
+                return None
+            profile = TurnProfile(label, asyncio.current_task(), loop, reason)
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_sampler, name='turn-profiler', daemon=True)
+                self._thread.start()
+        self._install_task_factory(loop)
+        return profile, _current_profile.set(profile)
+
+    def finish(self, profile: TurnProfile, token):
+        """Stops sampling the profile. Returns it; write() stores it."""
+        _current_profile.reset(token)
+        with self._lock:
+            self._active.remove(profile)
+        profile.meta['duration_ms'] = round((time.perf_counter() - profile.started) * 1000, 1)
+        return profile
+
+    def tag(self, **meta):
+        """Adds metadata (e.g. the session id) to the profile of the current request, if it is being profiled."""
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.meta.update(meta)
+
+    def write(self, profile: TurnProfile):
+        """Writes <id>.folded and <id>.json and deletes the oldest profiles beyond max_files. Blocking; runs in a worker thread."""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, profile.profile_id)
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            f.write(profile.folded())
+        meta = {
+            'profile_id': profile.profile_id,
+            'label': profile.label,
+            'reason': profile.reason,
+            'started_at': profile.started_at,
+            'samples': sum(profile.stacks.values()),
+            'interval_ms': self.interval * 1000,
+            **profile.meta,
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        self.profiles_written += 1
+
+        profile_ids = sorted(name[:-len('.json')] for name in os.listdir(self.profile_dir) if name.endswith('.json'))
+        for old_id in profile_ids[:max(0, len(profile_ids) - self.max_files)]:
+            for extension in ('.folded', '.json'):
+                try:
+                    os.remove(os.path.join(self.profile_dir, old_id + extension))
+                except FileNotFoundError:
+                    pass
+        return meta
+
+    def list_profiles(self, limit: int = 50):
+        """Metadata of the newest stored profiles, newest first."""
+        try:
+            names = sorted((name for name in os.listdir(self.profile_dir) if name.endswith('.json')), reverse=True)
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.profile_dir, name), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError): # pruned or half-written meanwhile
+                continue
+        return profiles
+
+    def read_profile(self, profile_id: str):
+        """The folded stacks of one profile, or None if it does not exist."""
+        if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.profile_dir, profile_id + '.folded'), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def stats(self):
+        return {
+            'active': len(self._active),
+            'written': self.profiles_written,
+            'skipped_busy': self.skipped,
+            'sample_percent': PROFILE_SAMPLE_PERCENT,
+            'interval_ms': self.interval * 1000,
+        }
+
+
+profiler = TurnProfiler()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling selected requests end to end: body parsing and validation, the endpoint and response
+    serialization. A request is profiled when it sends X-Profile: 1 with a valid X-Admin-Token (never while no
+    admin_token is configured) or is picked by PROFILE_SAMPLE_PERCENT. Its response then carries X-Profile-Id.
+    """
+
+    def __init__(self, app, paths: tuple[str, ...] = ('/chat_turn',), admin_token: str | None = None,
+                 sample_percent: float | None = None):
+        self.app = app
+        self.paths = paths
+        self.admin_token = admin_token
+        self.sample_percent = PROFILE_SAMPLE_PERCENT if sample_percent is None else sample_percent
+
+    def _reason(self, scope):
+        headers = dict(scope.get('headers') or [])
+        if headers.get(b'x-profile') == b'1':
+            token = headers.get(b'x-admin-token', b'').decode('latin-1')
+            if self.admin_token and secrets.compare_digest(token, self.admin_token):
+                return 'header'
+        if self.sample_percent > 0 and random.random() * 100 < self.sample_percent:
+            return 'sampled'
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        started = profiler.start(f"{scope['method']} {scope['path']}", reason) if reason else None
+        if started is None:
+            return await self.app(scope, receive, send)
+
+        profile, token = started
+        status = {}
+
+        async def send_with_profile_id(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                message = {**message, 'headers': [*message.get('headers', []), (b'x-profile-id', profile.profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.finish(profile, token)
+            profile.meta['status_code'] = status.get('code')
+            try:
+                await asyncio.to_thread(profiler.write, profile)
+            except Exception as e:
+                print(f"Profiler: could not write profile {profile.profile_id}: {e}")
@@ -0,0 +1,160 @@
+import os
+import asyncio
+from datetime import datetime
+from collections import OrderedDict
+from ..utils import db_utils
+from . import model_routing
+
+
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+USAGE_FLUSH_BATCH_SIZE = int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "200"))
+USAGE_CACHE_SIZE = int(os.getenv("USAGE_CACHE_SIZE", "10000"))
+# Most buffered calls kept while flushes keep failing; beyond that the oldest are dropped.
+USAGE_MAX_PENDING = int(os.getenv("USAGE_MAX_PENDING", "20000"))
+
+# Per-session budgets (0 disables). Once a session is over either one, its turns run in budget mode.
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
+SESSION_COST_BUDGET_USD = float(os.getenv("SESSION_COST_BUDGET_USD", "0"))
+# Budget mode: 'cheaper_model', 'summarize' (facts block plus a short transcript window) or 'both'.
+SESSION_BUDGET_ACTION = os.getenv("SESSION_BUDGET_ACTION", "both")
+BUDGET_MODEL = os.getenv("LLM_BUDGET_MODEL", model_routing.SMALL_MODEL)
+BUDGET_HISTORY_WINDOW = int(os.getenv("BUDGET_HISTORY_WINDOW", "2"))
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class UsageTracker:
+    """
+    Records token usage for every LLM call. Calls are buffered in memory and written in batches (every
+    flush_interval seconds or batch_size calls) by a background task, so the chat path never waits on SQLite.
+    Running per-session totals are kept in an LRU for budget checks and loaded from llm_usage_sessions on a miss.
+    If the database stays unavailable, the buffer is capped at max_pending calls by dropping the oldest.
+    """
+
+    def __init__(self, flush_interval: float = USAGE_FLUSH_INTERVAL_SECONDS, batch_size: int = USAGE_FLUSH_BATCH_SIZE,
+                 cache_size: int = USAGE_CACHE_SIZE, max_pending: int = USAGE_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.max_pending = max(batch_size, max_pending)
+        self._pending: list[dict] = []
+        self._totals: OrderedDict[str, dict] = OrderedDict()
+        self._flush_lock: asyncio.Lock | None = None
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushed_calls = 0
+        self.failed_flushes = 0
+        self.dropped_calls = 0
+
+    def _trim_pending(self):
+        """Drops the oldest buffered calls beyond max_pending. Session totals in the cache keep counting them."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped_calls += excess
+            print(f"Usage tracker: dropped {excess} unflushed call(s) ({self.dropped_calls} in total).")
+
+    def session_totals(self, session_id: str) -> dict:
+        totals = self._totals.get(session_id)
+        if totals is None:
+            row = db_utils.get_session_usage(session_id) or {}
+            totals = {'tokens': row.get('prompt_tokens', 0) + row.get('completion_tokens', 0), 'cost_usd': row.get('cost_usd', 0.0)}
+            # Calls recorded but not yet flushed are not in the row.
+            for call in self._pending:
+                if call['session_id'] == session_id:
+                    totals['tokens'] += call['prompt_tokens'] + call['completion_tokens']
+                    totals['cost_usd'] += call['cost_usd']
+            self._totals[session_id] = totals
+        self._totals.move_to_end(session_id)
+        while len(self._totals) > self.cache_size:
+            self._totals.popitem(last=False)
+        return totals
+
+    def record(self, session_id: str, model: str, iteration: int, usage):
+        """Buffers one call. Cheap: no I/O unless the session's totals are not cached yet."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = model_routing.estimate_cost(model, usage)
+
+        totals = self.session_totals(session_id)
+        totals['tokens'] += prompt_tokens + completion_tokens
+        totals['cost_usd'] += cost
+        self._pending.append({
+            'session_id': session_id, 'model': model, 'iteration': iteration, 'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens, 'cost_usd': cost, 'created_at': _now(),
+        })
+        if len(self._pending) >= self.batch_size:
+            if self._full is not None:
+                self._full.set()
+            elif db_utils.record_llm_usage(self._pending):
+                # No flush task (scripts and tests that skip the app lifespan): write the batch inline.
+                self.flushed_calls += len(self._pending)
+                self._pending = []
+            else:
+                self._trim_pending()
+
+    def over_budget(self, session_id: str) -> bool:
+        if not SESSION_TOKEN_BUDGET and not SESSION_COST_BUDGET_USD:
+            return False
+        totals = self.session_totals(session_id)
+        return bool((SESSION_TOKEN_BUDGET and totals['tokens'] >= SESSION_TOKEN_BUDGET)
+                    or (SESSION_COST_BUDGET_USD and totals['cost_usd'] >= SESSION_COST_BUDGET_USD))
+
+    async def flush(self):
+        """
+        Writes everything buffered so far in one transaction. On failure the batch is put back for the next flush,
+        within max_pending.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            if await asyncio.to_thread(db_utils.record_llm_usage, batch):
+                self.flushed_calls += len(batch)
+            else:
+                self.failed_flushes += 1
+                self._pending[:0] = batch
+                self._trim_pending()
+
+    async def _run(self):
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval) #type: ignore
+                except asyncio.TimeoutError:
+                    pass
+                self._full.clear() #type: ignore
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Usage tracker flush error: {e}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._full = None
+        await self.flush()
+
+    def stats(self):
+        return {'pending_calls': len(self._pending), 'flushed_calls': self.flushed_calls,
+                'failed_flushes': self.failed_flushes, 'dropped_calls': self.dropped_calls,
+                'cached_sessions': len(self._totals)}
+
+
+tracker = UsageTracker()
@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import importlib
+from datetime import datetime
+from ..utils import db_utils
+
+
+# Open the LLM provider's HTTP connection during startup instead of on the first chat turn.
+WARMUP_PROVIDER_CONNECTION = os.getenv("WARMUP_PROVIDER_CONNECTION", "1") == "1"
+# Upper bound on the background part of the warmup; the app reports ready after this even if a step hangs.
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+
+# Subsystems kept out of the app's import path and imported in the background once the app is up.
+LAZY_MODULES = ('openai', '.analytics')
+
+
+class Warmup:
+    """
+    Startup warmup run by the app's lifespan. The database and the prompt are prepared before the app accepts
+    requests; the slower, network-bound part (importing the lazy subsystems, opening the provider connection) runs
+    in the background, and the readiness probe reports ready once it finished or timed out.
+    """
+
+    def __init__(self):
+        self.started_at = None
+        self.ready_at = None
+        self.steps = {}
+        self.errors = {}
+        self.database_ok = False
+        self._started = 0.0
+        self._task = None
+
+    def _step(self, name: str, action):
+        started = time.perf_counter()
+        try:
+            result = action()
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+            print(f"Warmup: {name} failed: {e}")
+            return None
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def start(self):
+        """Prepares the database and prompt, then starts the background warmup. Must run inside the event loop."""
+        if self._task is not None:
+            return
+        from . import llm_service # the chat route already imports it; kept local so this module stays light
+
+        self._started = time.perf_counter()
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        database = self._step('database', db_utils.warm_up)
+        self.database_ok = database is not None
+        if database is None:
+            self.errors.setdefault('database', "database warmup failed, see log")
+        self._step('prompt', llm_service.tools_and_prompt)
+        self._task = asyncio.create_task(self._run_background(llm_service))
+
+    async def _run_background(self, llm_service):
+        try:
+            await asyncio.wait_for(self._background(llm_service), timeout=WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.errors['background'] = f"timed out after {WARMUP_TIMEOUT_SECONDS}s"
+        self.ready_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.steps['total'] = round((time.perf_counter() - self._started) * 1000, 1)
+        print(f"Warmup finished in {self.steps['total']} ms{' with errors: ' + str(self.errors) if self.errors else ''}.")
+
+    async def _background(self, llm_service):
+        for module in LAZY_MODULES:
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(importlib.import_module, module, __package__)
+                self.steps[f"import {module}"] = round((time.perf_counter() - started) * 1000, 1)
+            except ImportError as e:
+                self.errors[f"import {module}"] = str(e)
+
+        provider = self._step('provider', llm_service.get_provider)
+        if provider is not None and WARMUP_PROVIDER_CONNECTION:
+            started = time.perf_counter()
+            self.steps['provider_connection'] = await provider.warm_up(timeout=WARMUP_TIMEOUT_SECONDS)
+            self.steps['provider_connection_total'] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def is_ready(self) -> bool:
+        return self.database_ok and self._task is not None and self._task.done()
+
+    def status(self):
+        return {
+            'ready': self.is_ready(),
+            'started_at': self.started_at,
+            'ready_at': self.ready_at,
+            'steps_ms': self.steps,
+            'errors': self.errors,
+        }
+
+
+warmup = Warmup()
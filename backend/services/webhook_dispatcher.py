@@ -0,0 +1,243 @@
+import os
+import hmac
+import json
+import time
+import random
+import asyncio
+import hashlib
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from ..utils import db_utils
+
+
+# Comma-separated endpoints that receive appointment events (CRM, calendar sync, ...). Empty disables delivery.
+WEBHOOK_URLS = [url.strip() for url in os.getenv("WEBHOOK_URLS", "").split(",") if url.strip()]
+# When set, every request carries X-Webhook-Signature: sha256=<HMAC-SHA256 of the body with this secret>.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_POLL_INTERVAL_SECONDS", "1"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "1"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "300"))
+# Delivered events are kept this long in the outbox (for inspection and replays), then pruned.
+WEBHOOK_EVENT_RETENTION_HOURS = float(os.getenv("WEBHOOK_EVENT_RETENTION_HOURS", "168"))
+PRUNE_INTERVAL_SECONDS = 600
+
+
+class DeliveryFailed(Exception):
+    """A batch was not acknowledged. retry_after is the receiver's Retry-After in seconds, if it sent one."""
+
+    def __init__(self, reason: str, retry_after: float | None = None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def build_body(events: list[dict]) -> bytes:
+    """{"events": [{"event_id", "type", "appointment_id", "occurred_at", "data"}, ...]}, oldest first."""
+    return json.dumps({'events': [
+        {
+            'event_id': event['event_id'],
+            'type': event['event_type'],
+            'appointment_id': event['appointment_id'],
+            'occurred_at': event['created_at'].replace(' ', 'T') + 'Z',
+            'data': json.loads(event['payload']),
+        }
+        for event in events
+    ]}).encode('utf-8')
+
+
+def sign(body: bytes, secret: str) -> str:
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def _retry_after(value: str | None):
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError: # an HTTP date; fall back to our own backoff
+        return None
+
+
+def post_batch(url: str, body: bytes, headers: dict, timeout: float):
+    """POSTs one batch. Any 2xx acknowledges it; anything else raises DeliveryFailed. Blocking; runs in a worker thread."""
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        raise DeliveryFailed(f"HTTP {e.code}", _retry_after(e.headers.get('Retry-After')))
+    except (urllib.error.URLError, OSError) as e:
+        raise DeliveryFailed(f"{type(e).__name__}: {e}")
+
+
+class WebhookTarget:
+    """Delivery state of one webhook URL. cursor is the last event it acknowledged (persisted in webhook_cursors)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.cursor: int | None = None
+        self.delivered = 0
+        self.batches = 0
+        self.failures = 0 # consecutive, drives the backoff
+        self.total_failures = 0
+        self.last_error: str | None = None
+        self.last_delivery_at: str | None = None
+        self.next_attempt_at = 0.0 # time.monotonic()
+
+    def backoff(self, error: DeliveryFailed):
+        self.failures += 1
+        self.total_failures += 1
+        self.last_error = str(error)
+        delay = min(WEBHOOK_RETRY_MAX_SECONDS, WEBHOOK_RETRY_BASE_SECONDS * 2 ** (self.failures - 1))
+        delay = random.uniform(delay / 2, delay)
+        if error.retry_after is not None:
+            delay = min(WEBHOOK_RETRY_MAX_SECONDS, max(delay, error.retry_after))
+        self.next_attempt_at = time.monotonic() + delay
+        return delay
+
+
+class WebhookDispatcher:
+    """
+    Delivers the appointment_events outbox to each configured webhook in batches, in event_id order.
+
+    Every webhook has its own cursor and loop, so a slow or failing receiver only holds up itself. Each loop has at
+    most one batch in flight. After a failure it retries the same batch with jittered exponential backoff, and
+    honours the receiver's Retry-After, so events for an appointment never arrive out of order. Delivery is
+    at-least-once: a batch that was processed but not acknowledged is sent again, so receivers should de-duplicate
+    on event_id.
+    """
+
+    def __init__(self, urls: list[str] | None = None, secret: str = WEBHOOK_SECRET, batch_size: int = WEBHOOK_BATCH_SIZE,
+                 poll_interval: float = WEBHOOK_POLL_INTERVAL_SECONDS, timeout: float = WEBHOOK_TIMEOUT_SECONDS):
+        self.targets = [WebhookTarget(url) for url in (WEBHOOK_URLS if urls is None else urls)]
+        self.secret = secret
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pruned = 0
+        self._tasks: list[asyncio.Task] = []
+
+    def _headers(self, body: bytes, events: list[dict]):
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'ai-receptionist-webhooks',
+            'X-Webhook-Batch': f"{events[0]['event_id']}-{events[-1]['event_id']}",
+        }
+        if self.secret:
+            headers['X-Webhook-Signature'] = sign(body, self.secret)
+        return headers
+
+    async def _load_cursors(self):
+        cursors = await asyncio.to_thread(db_utils.ensure_webhook_cursors, [target.url for target in self.targets])
+        if cursors is None:
+            return False
+        for target in self.targets:
+            target.cursor = cursors[target.url]['last_event_id']
+            target.delivered = cursors[target.url]['delivered']
+        return True
+
+    async def deliver_once(self, target: WebhookTarget) -> int:
+        """Sends the next batch after the target's cursor and advances it. Returns the number of events delivered."""
+        events = await asyncio.to_thread(db_utils.get_appointment_events, target.cursor, self.batch_size)
+        if not events:
+            return 0
+        body = build_body(events)
+        await asyncio.to_thread(post_batch, target.url, body, self._headers(body, events), self.timeout)
+
+        last_event_id = events[-1]['event_id']
+        if not await asyncio.to_thread(db_utils.advance_webhook_cursor, target.url, last_event_id, len(events)):
+            # Acknowledged but not recorded: after a restart it is sent again, which at-least-once delivery allows.
+            print(f"Webhooks: could not record delivery to {target.url} up to event {last_event_id}.")
+        target.cursor = last_event_id
+        target.delivered += len(events)
+        target.batches += 1
+        target.failures = 0
+        target.last_delivery_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return len(events)
+
+    async def _run_target(self, target: WebhookTarget):
+        while True:
+            delay = target.next_attempt_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                delivered = await self.deliver_once(target)
+            except asyncio.CancelledError:
+                raise
+            except DeliveryFailed as e:
+                delay = target.backoff(e)
+                print(f"Webhooks: delivery to {target.url} failed ({e}); retrying in {delay:.1f}s.")
+                continue
+            except Exception as e:
+                print(f"Webhooks: error delivering to {target.url}: {e}")
+                delivered = 0
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_interval) # caught up; a full batch means more are waiting
+
+    def prune(self):
+        """Deletes delivered events older than WEBHOOK_EVENT_RETENTION_HOURS. Runs in a worker thread."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=WEBHOOK_EVENT_RETENTION_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+        urls = [target.url for target in self.targets]
+        total = 0
+        while True:
+            deleted = db_utils.prune_appointment_events(cutoff, urls)
+            if not deleted:
+                break
+            total += deleted
+        self.pruned += total
+        return total
+
+    async def _run(self):
+        while not await self._load_cursors():
+            await asyncio.sleep(self.poll_interval)
+        self._tasks += [asyncio.create_task(self._run_target(target)) for target in self.targets]
+        while True:
+            try:
+                await asyncio.to_thread(self.prune)
+            except Exception as e:
+                print(f"Webhooks: error pruning delivered events: {e}")
+            await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._run()))
+        print(f"Webhook dispatcher started ({len(self.targets)} webhook(s)).")
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        print("Webhook dispatcher stopped.")
+
+    def stats(self):
+        last_event_id = db_utils.get_last_event_id()
+        return {
+            'last_event_id': last_event_id,
+            'pruned_events': self.pruned,
+            'webhooks': [
+                {
+                    'url': target.url.split('?')[0], # query strings may carry tokens
+                    'cursor': target.cursor,
+                    'backlog': last_event_id - target.cursor if last_event_id is not None and target.cursor is not None else None,
+                    'delivered': target.delivered,
+                    'batches': target.batches,
+                    'consecutive_failures': target.failures,
+                    'total_failures': target.total_failures,
+                    'last_error': target.last_error,
+                    'last_delivery_at': target.last_delivery_at,
+                    'retry_in_seconds': round(max(0.0, target.next_attempt_at - time.monotonic()), 1),
+                }
+                for target in self.targets
+            ],
+        }
+
+
+dispatcher = WebhookDispatcher()
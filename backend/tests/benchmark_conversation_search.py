@@ -0,0 +1,101 @@
+import io
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import contextlib
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.utils.seed_large_db import LARGE_DB_PATH
+
+
+def _timed(func, rounds: int):
+    timings = []
+    result = func()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def like_search(term: str, limit: int = 20):
+    """What finding a conversation took before: a LIKE scan over every message."""
+    conn = db_utils.get_db_connection()
+    try:
+        return conn.execute(
+            """
+            SELECT message_id, session_id, role, timestamp FROM conversation_history
+            WHERE message_text LIKE ? ORDER BY message_id DESC LIMIT ?
+            """,
+            (f"%{term}%", limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def sample_queries():
+    """Realistic lookups drawn from the data: a user's email, an appointment ID, a common phrase and a term with no match."""
+    conn = db_utils.get_db_connection()
+    try:
+        email_row = conn.execute("SELECT message_text FROM conversation_history WHERE message_text LIKE 'My email is %' LIMIT 1 OFFSET 5000").fetchone()
+        appt_row = conn.execute("SELECT message_text FROM conversation_history WHERE message_text LIKE 'Please cancel appointment %' LIMIT 1 OFFSET 5000").fetchone()
+    finally:
+        conn.close()
+    email = re.search(r"[\w.+-]+@[\w.-]+\w", email_row['message_text']).group(0) if email_row else 'user1@example.com'
+    appt_id = re.search(r"\d+", appt_row['message_text']).group(0) if appt_row else '48213'
+    return [
+        ("email", email),
+        ("appointment ID", appt_id),
+        ("common phrase", "nobody is available"),
+        ("no match", "zzyzx"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation search: LIKE scan vs the FTS5 index, on a large database.")
+    parser.add_argument('--db', default=LARGE_DB_PATH, help="Database created by backend.utils.seed_large_db.")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Benchmark database {args.db} not found. Run: python -m backend.utils.seed_large_db --db {args.db}")
+        return 2
+
+    db_utils.DB_PATH = args.db
+    conn = db_utils.get_db_connection()
+    try:
+        has_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'conversation_fts'").fetchone()
+        messages = conn.execute("SELECT MAX(message_id) FROM conversation_history").fetchone()[0] or 0
+    finally:
+        conn.close()
+    if not has_index:
+        print("Building the full-text index (one-off)...")
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            initialize_database(args.db)
+        print(f"Indexed {messages} messages in {time.perf_counter() - started:.1f}s.")
+
+    print(f"--- Conversation search on {args.db} (~{messages} messages, median of {args.rounds}) ---")
+    print(f"{'query':<16} {'term':<28} {'LIKE ms':>9} {'FTS ms':>9} {'page 2 ms':>10} {'hits':>5}")
+    for label, term in sample_queries():
+        like_ms, _ = _timed(lambda: like_search(term), args.rounds)
+        fts_ms, first_page = _timed(lambda: db_utils.search_conversations(term, limit=20), args.rounds)
+        page_two_ms = 0.0
+        if first_page and len(first_page) == 20:
+            page_two_ms, _ = _timed(lambda: db_utils.search_conversations(term, before_message_id=first_page[-1]['message_id'], limit=20), args.rounds)
+        print(f"{label:<16} {term[:28]:<28} {like_ms:>9.2f} {fts_ms:>9.2f} {page_two_ms:>10.2f} {len(first_page or []):>5}")
+
+    # Write-side cost: the trigger keeps the index current on every add_conversation_message.
+    session_id = 'benchmark_search_writes'
+    write_ms, _ = _timed(lambda: db_utils.add_conversation_message(session_id, 'user', "My email is bench@example.com, cancel appointment 123456."), 200)
+    db_utils.run_write(lambda conn: conn.execute("DELETE FROM conversation_history WHERE session_id = ?", (session_id,)))
+    print(f"add_conversation_message with index maintenance: median {write_ms:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
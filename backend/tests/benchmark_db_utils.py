@@ -0,0 +1,203 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import contextlib
+from datetime import date, timedelta
+
+from backend.utils import db_utils
+from backend.utils.seed_large_db import LARGE_DB_PATH
+
+
+BASELINE_PATH = os.path.join('data', 'benchmarks', 'db_utils_baseline.json')
+DEFAULT_TOLERANCE = 0.25 # a function regresses when its median is 25% slower than the saved baseline
+
+
+def _next_weekday(hour: int, days_ahead: int = 7):
+    """Returns a 'YYYY-MM-DD HH:MM:SS' string for a weekday at least `days_ahead` days from today."""
+    day = date.today() + timedelta(days=days_ahead)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return f"{day.isoformat()} {hour:02d}:00:00"
+
+
+def _dataset_fingerprint():
+    """Approximate row counts of the benchmarked tables, stored with the baseline so runs at different scales are flagged."""
+    conn = db_utils.get_db_connection()
+    try:
+        return {
+            table: int(float(f"{conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:.2g}"))
+            for table in ('consultants', 'appointments', 'conversation_history', 'session_state')
+        }
+    finally:
+        conn.close()
+
+
+def _sample_inputs():
+    """Picks realistic arguments (the busiest user, a recent session, an existing appointment) from the benchmark database."""
+    conn = db_utils.get_db_connection()
+    try:
+        busy_user = conn.execute(
+            """
+            SELECT u.email AS user_email FROM appointments a JOIN users u ON u.user_id = a.user_id
+            WHERE a.status = 'booked' GROUP BY a.user_id ORDER BY COUNT(*) DESC LIMIT 1
+            """
+        ).fetchone()
+        busy_session = conn.execute(
+            "SELECT session_id FROM conversation_history ORDER BY message_id DESC LIMIT 1"
+        ).fetchone()
+        any_appointment = conn.execute("SELECT appointment_id FROM appointments ORDER BY appointment_id LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+    return {
+        'user_email': busy_user['user_email'] if busy_user else 'user0@example.com',
+        'session_id': busy_session['session_id'] if busy_session else 'benchmark_session',
+        'appointment_id': any_appointment['appointment_id'] if any_appointment else 1,
+    }
+
+
+def build_cases(inputs: dict):
+    """
+    Returns (name, callable, rounds) for every public db_utils function.
+    Write cases are arranged in self-reversing cycles (book -> reschedule -> modify -> cancel) so repeated runs
+    keep the database in a similar shape.
+    """
+    bench_email = 'benchmark.user@example.com'
+    bench_session = 'benchmark_session_writes'
+    slot_a = _next_weekday(10)
+    slot_b = _next_weekday(11)
+    state = {'appointment_id': None}
+
+    def book():
+        result = db_utils.book_appointment('Benchmark User', bench_email, slot_a, 1)
+        state['appointment_id'] = result if isinstance(result, int) else None
+
+    def reschedule():
+        if state['appointment_id']:
+            db_utils.reschedule_appointment(state['appointment_id'], bench_email, slot_b)
+
+    def modify():
+        if state['appointment_id']:
+            db_utils.modify_appointment_service(state['appointment_id'], bench_email, 2)
+
+    def cancel():
+        if state['appointment_id']:
+            db_utils.cancel_appointment(state['appointment_id'], bench_email)
+
+    def write_cycle():
+        book(); reschedule(); modify(); cancel()
+
+    def connection():
+        db_utils.get_db_connection().close()
+
+    return [
+        ('get_db_connection', connection, 200),
+        ('create_session_if_not_exists', lambda: db_utils.create_session_if_not_exists(bench_session), 100),
+        ('update_session_state', lambda: db_utils.update_session_state(bench_session, {'user_email': bench_email}), 100),
+        ('get_session_state', lambda: db_utils.get_session_state(bench_session), 200),
+        ('add_conversation_message', lambda: db_utils.add_conversation_message(bench_session, 'user', 'benchmark message'), 100),
+        ('get_conversation_history', lambda: db_utils.get_conversation_history(inputs['session_id']), 50),
+        ('check_availability', lambda: db_utils.check_availability('Technology', slot_a), 50),
+        ('find_next_available_slot', lambda: db_utils.find_next_available_slot('Technology', _next_weekday(20)), 10),
+        ('get_user_appointments', lambda: db_utils.get_user_appointments(inputs['user_email']), 50),
+        ('get_booking_details', lambda: db_utils.get_booking_details(inputs['appointment_id'], ignore_status=True), 200),
+        ('mark_confirmation_sent', lambda: db_utils.mark_confirmation_sent(inputs['appointment_id']), 100),
+        ('get_all_services', db_utils.get_all_services, 200),
+        ('get_consultants_by_service', lambda: db_utils.get_consultants_by_service('Technology'), 100),
+        ('book_appointment', lambda: (book(), cancel()), 20),
+        ('reschedule_appointment', lambda: (book(), reschedule(), cancel()), 20),
+        ('modify_appointment_service', lambda: (book(), modify(), cancel()), 20),
+        ('cancel_appointment', write_cycle, 20),
+    ]
+
+
+def run_case(func, rounds: int):
+    """Times `func` over `rounds` calls after one warm-up call. db_utils output is silenced while timing."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'rounds': rounds,
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.fmean(timings), 4),
+        'max_ms': round(max(timings), 4),
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float):
+    """Returns the list of function names whose median regressed beyond the tolerance."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        limit = previous['median_ms'] * (1 + tolerance)
+        change = (result['median_ms'] / previous['median_ms'] - 1) * 100 if previous['median_ms'] else 0.0
+        marker = 'REGRESSION' if result['median_ms'] > limit else 'ok'
+        print(f"  {name:<30} {previous['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms ({change:+.1f}%) {marker}")
+        if result['median_ms'] > limit:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for every db_utils function against a large database.")
+    parser.add_argument('--db', default=LARGE_DB_PATH, help="Database created by backend.utils.seed_large_db.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--only', nargs='*', help="Restrict the run to these function names.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Benchmark database {args.db} not found. Run: python -m backend.utils.seed_large_db --db {args.db}")
+        return 2
+
+    db_utils.DB_PATH = args.db
+    fingerprint = _dataset_fingerprint()
+    print(f"--- db_utils benchmark on {args.db} ---")
+    print(f"Dataset: {fingerprint}")
+
+    results = {}
+    for name, func, rounds in build_cases(_sample_inputs()):
+        if args.only and name not in args.only:
+            continue
+        results[name] = run_case(func, rounds)
+        print(f"  {name:<30} median {results[name]['median_ms']:>10.3f} ms  (min {results[name]['min_ms']:.3f}, max {results[name]['max_ms']:.3f})")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'dataset': fingerprint, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run again with --save-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('dataset') != fingerprint:
+        print(f"Warning: baseline was recorded on a different dataset {baseline.get('dataset')}.")
+
+    print(f"--- Comparison against {args.baseline} (tolerance {args.tolerance:.0%}) ---")
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"FAILED: {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
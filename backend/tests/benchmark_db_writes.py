@@ -0,0 +1,294 @@
+import io
+import sys
+import time
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.db_writer import SQLiteWriter
+from backend.utils.init_db import initialize_database
+
+
+def _percentile(samples: list[float], fraction: float):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Workload:
+    """
+    The chat path's write mix: conversation messages, session-state updates, and book -> cancel pairs
+    (read-then-write, like book_appointment). Each operation is a function of a connection so the same SQL
+    runs under both strategies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slot = 0
+        self.base = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=400)
+
+    def _next_slot(self):
+        with self._lock:
+            self._slot += 1
+            return (self.base + timedelta(minutes=self._slot)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def operations(self, worker: int):
+        session_id = f"bench_writer_{worker}"
+
+        def message(conn):
+            conn.execute(
+                "INSERT INTO conversation_history (session_id, role, message_text) VALUES (?, ?, ?)",
+                (session_id, 'user', 'benchmark message'),
+            )
+
+        def session_state(conn):
+            conn.execute("INSERT OR IGNORE INTO session_state (session_id) VALUES (?)", (session_id,))
+            conn.execute(
+                "UPDATE session_state SET user_email = ?, last_updated = CURRENT_TIMESTAMP WHERE session_id = ?",
+                (f"{session_id}@example.com", session_id),
+            )
+
+        def book_and_cancel(conn):
+            slot = self._next_slot()
+            consultant_id = worker % 8 + 1
+            taken = conn.execute(
+                "SELECT 1 FROM appointments WHERE consultant_id = ? AND appointment_datetime = ? AND status = 'booked'",
+                (consultant_id, slot),
+            ).fetchone()
+            if taken:
+                return
+            user_id = conn.execute(
+                "INSERT INTO users (email, name) VALUES (?, ?) ON CONFLICT (email) DO UPDATE SET name = excluded.name RETURNING user_id",
+                (f"{session_id}@example.com", 'Bench User'),
+            ).fetchone()[0]
+            cursor = conn.execute(
+                "INSERT INTO appointments (user_id, appointment_datetime, consultant_id, service_id) VALUES (?, ?, ?, ?)",
+                (user_id, slot, consultant_id, 1),
+            )
+            conn.execute("UPDATE appointments SET status = 'cancelled' WHERE appointment_id = ?", (cursor.lastrowid,))
+
+        return [message, session_state, message, book_and_cancel]
+
+
+def per_call_connection(db_path: str, timeout: float):
+    """The previous strategy: every write opens its own connection and commits on whatever thread it runs on."""
+    def run(operation):
+        conn = sqlite3.connect(db_path, timeout=timeout)
+        try:
+            operation(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    return run
+
+
+def single_writer(db_path: str, writer: SQLiteWriter):
+    return lambda operation: writer.execute(db_path, operation)
+
+
+def run_strategy(name: str, db_path: str, run_write, workers: int, readers: int, duration: float):
+    workload = Workload()
+    stop_at = time.perf_counter() + duration
+    latencies: list[float] = []
+    read_latencies: list[float] = []
+    counts = {'ok': 0, 'locked': 0, 'other_errors': 0}
+    counts_lock = threading.Lock()
+
+    def write_loop(worker: int):
+        operations = workload.operations(worker)
+        done = 0
+        local_latencies = []
+        local_counts = {'ok': 0, 'locked': 0, 'other_errors': 0}
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                run_write(operations[done % len(operations)])
+                local_counts['ok'] += 1
+            except sqlite3.OperationalError as e:
+                local_counts['locked' if 'locked' in str(e) or 'busy' in str(e) else 'other_errors'] += 1
+            except Exception:
+                local_counts['other_errors'] += 1
+            local_latencies.append(time.perf_counter() - started)
+            done += 1
+        with counts_lock:
+            latencies.extend(local_latencies)
+            for key, value in local_counts.items():
+                counts[key] += value
+
+    def read_loop(worker: int):
+        session_id = f"bench_writer_{worker}"
+        local_latencies = []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn = db_utils.get_db_connection()
+                try:
+                    conn.execute(
+                        "SELECT role, message_text FROM conversation_history WHERE session_id = ? ORDER BY timestamp DESC LIMIT 10",
+                        (session_id,),
+                    ).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                with counts_lock:
+                    counts['locked'] += 1
+            local_latencies.append(time.perf_counter() - started)
+        with counts_lock:
+            read_latencies.extend(local_latencies)
+
+    threads = [threading.Thread(target=write_loop, args=(i,)) for i in range(workers)]
+    threads += [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'strategy': name,
+        'writes_per_second': counts['ok'] / duration,
+        'lock_errors': counts['locked'],
+        'other_errors': counts['other_errors'],
+        'write_p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'write_p99_ms': _percentile(latencies, 0.99) * 1000,
+        'read_p99_ms': _percentile(read_latencies, 0.99) * 1000,
+        'reads': len(read_latencies),
+    }
+
+
+def _fresh_database(journal_mode: str):
+    db_path = f"{tempfile.mkdtemp()}/write_contention.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.close()
+    return db_path
+
+
+def _chat_responder(model: str, messages: list[dict], kwargs: dict):
+    """Every turn makes one write tool call (join_waitlist), then answers in text."""
+    from backend.tests.fake_llm_provider import FakeMessage, FakeToolCall
+    if messages[-1]['role'] == 'tool':
+        return FakeMessage(content="You are on the waitlist.")
+    session = messages[-1]['content']
+    return FakeMessage(tool_calls=[FakeToolCall('join_waitlist', {
+        'user_name': 'Bench User', 'user_email': f"{session}@example.com", 'service_id': 1,
+        'requested_datetime': (datetime.now() + timedelta(days=400)).strftime('%Y-%m-%d 10:00:00'),
+    })])
+
+
+async def run_chat_turns(turns: int, latency: float):
+    """
+    Runs `turns` concurrent /chat_turn handlers on one event loop against a fake LLM. Each turn writes three times
+    (user message, waitlist entry, AI reply). Reports turn latency, the worst event-loop stall and how the writes batched.
+    """
+    from backend.routes import chat
+    from backend.services import llm_service, llm_provider, model_routing, rate_limiter
+    from backend.tests.fake_llm_provider import FakeAsyncClient
+
+    fake = FakeAsyncClient(latency=latency, responder=_chat_responder)
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)], total_deadline=600, timeout=600)
+    model_routing.LLM_ROUTING_POLICY = "premium"
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    stall = {'max': 0.0, 'running': True}
+
+    async def watch_loop():
+        # A blocked loop shows up as a late wake-up of this ticker.
+        while stall['running']:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stall['max'] = max(stall['max'], time.perf_counter() - started - 0.001)
+
+    async def turn(i: int):
+        started = time.perf_counter()
+        payload = chat.ChatTurnInput(session_id=f"bench_chat_{i}", messages=[{'role': 'user', 'content': f"bench_chat_{i}"}])
+        await chat._process_chat_turn(payload)
+        return time.perf_counter() - started
+
+    await turn(turns) # warm-up: first-use imports and caches are not part of the measurement
+    watcher = asyncio.create_task(watch_loop())
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[turn(i) for i in range(turns)])
+    elapsed = time.perf_counter() - started
+    stall['running'] = False
+    await watcher
+    return {
+        'turns_per_second': turns / elapsed,
+        'turn_p50_ms': statistics.median(latencies) * 1000,
+        'turn_p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_loop_stall_ms': stall['max'] * 1000,
+    }
+
+
+def chat_turn_main(args):
+    db_utils.DB_PATH = _fresh_database('WAL')
+    before = db_utils.writer.stats()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_utils.load_reference_data()
+        result = asyncio.run(run_chat_turns(args.chat_turns, args.llm_latency))
+    after = db_utils.writer.stats()
+    db_utils.writer.stop()
+    batches, commands = after['batches'] - before['batches'], after['commands'] - before['commands']
+
+    print(f"--- Chat-path writes: {args.chat_turns} concurrent /chat_turn handlers, fake LLM {args.llm_latency * 1000:.0f} ms ---")
+    print(f"turns/s {result['turns_per_second']:.0f}  turn p50 {result['turn_p50_ms']:.1f} ms  p99 {result['turn_p99_ms']:.1f} ms  "
+          f"worst event-loop stall {result['max_loop_stall_ms']:.1f} ms")
+    print(f"Single writer: {batches} commits for {commands} writes (average batch {commands / batches if batches else 0:.2f}, "
+          f"largest {after['largest_batch']}).")
+    return 0 if commands >= 3 * (args.chat_turns + 1) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustained write throughput and lock errors: per-call connections vs the single writer.")
+    parser.add_argument('--workers', type=int, default=16, help="Threads issuing writes.")
+    parser.add_argument('--readers', type=int, default=4, help="Threads reading conversation history at the same time.")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per strategy.")
+    parser.add_argument('--legacy-timeout', type=float, default=5.0, help="sqlite3.connect timeout of the per-call strategy (Python's default).")
+    parser.add_argument('--chat-turns', type=int, default=0,
+                        help="Instead, run this many concurrent /chat_turn handlers (fake LLM) and report how their writes batch.")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="Fake LLM latency for --chat-turns.")
+    args = parser.parse_args()
+    if args.chat_turns:
+        return chat_turn_main(args)
+
+    results = []
+
+    # Before: rollback journal (the previous default) and one connection per write.
+    db_utils.DB_PATH = _fresh_database('DELETE')
+    results.append(run_strategy("per-call connections", db_utils.DB_PATH, per_call_connection(db_utils.DB_PATH, args.legacy_timeout),
+                                args.workers, args.readers, args.duration))
+
+    # After: WAL, read-only readers and one writer thread batching commits.
+    db_utils.DB_PATH = _fresh_database('WAL')
+    writer = SQLiteWriter()
+    results.append(run_strategy("single writer", db_utils.DB_PATH, single_writer(db_utils.DB_PATH, writer),
+                                args.workers, args.readers, args.duration))
+    writer.stop()
+    batches = writer.stats()
+
+    print(f"--- SQLite write contention: {args.workers} writers, {args.readers} readers, {args.duration:.0f}s each ---")
+    print(f"{'strategy':<22} {'writes/s':>9} {'locked':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'read p99':>9}")
+    for r in results:
+        print(f"{r['strategy']:<22} {r['writes_per_second']:>9.0f} {r['lock_errors']:>7} {r['other_errors']:>7} "
+              f"{r['write_p50_ms']:>8.2f} {r['write_p99_ms']:>8.2f} {r['read_p99_ms']:>9.2f}")
+    print(f"Single writer: {batches['batches']} commits for {batches['commands']} writes (average batch {batches['average_batch']}, largest {batches['largest_batch']}).")
+
+    before, after = results
+    if before['writes_per_second']:
+        print(f"Throughput: {after['writes_per_second'] / before['writes_per_second']:.1f}x")
+    return 0 if after['lock_errors'] == 0 and after['other_errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import io
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import contextlib
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import llm_service, llm_provider, model_routing, rate_limiter
+from backend.tests.fake_llm_provider import FakeAsyncClient, FakeMessage, FakeToolCall
+
+
+SLOT = "2030-01-07 10:00:00"
+NEW_SLOT = "2030-01-08 15:00:00"
+
+# Each scenario is one user turn: the tool calls a correct model makes, in order, before it answers in text.
+SCENARIOS = [
+    ("Is Technology free on Jan 7 2030 at 10am?", [
+        ("check_availability", {"service_name": "Technology", "requested_datetime_str": SLOT}),
+    ]),
+    ("Book it for Jane Doe, jane@example.com.", [
+        ("check_availability", {"service_name": "Technology", "requested_datetime_str": SLOT}),
+        ("book_appointment", {"user_name": "Jane Doe", "user_email": "jane@example.com", "appt_datetime": SLOT, "service_id": 1}),
+    ]),
+    ("Move my appointment to Jan 8 at 3pm. Email jane@example.com.", [
+        ("get_user_appointments", {"user_email": "jane@example.com"}),
+        ("check_availability", {"service_name": "Technology", "requested_datetime_str": NEW_SLOT}),
+        ("reschedule_appointment", {"appointment_id": 1, "user_email": "jane@example.com", "new_appt_datetime": NEW_SLOT}),
+    ]),
+    ("What services do you offer?", []),
+]
+
+
+def _corrupt(args: dict, rng: random.Random) -> dict:
+    """The kinds of mistakes small models make with tool args: wrong types, loose datetimes, dropped fields."""
+    broken = dict(args)
+    field = rng.choice(sorted(broken))
+    if "datetime" in field:
+        broken[field] = "next monday 10am"
+    elif field.endswith("_id"):
+        broken[field] = str(broken[field]) + "?"
+    else:
+        del broken[field]
+    return broken
+
+
+def make_responder(premium_model: str, small_error_rate: float, seed: int):
+    """Replays the scenario plan for the current turn. The small model corrupts args at `small_error_rate`."""
+    rng = random.Random(seed)
+    plans = {message: plan for message, plan in SCENARIOS}
+
+    def responder(model, messages, kwargs):
+        last_user = max(i for i, m in enumerate(messages) if m.get("role") == "user")
+        plan = plans.get(messages[last_user]["content"], [])
+        step = sum(1 for m in messages[last_user:] if m.get("role") == "assistant" and m.get("tool_calls"))
+        if step >= len(plan):
+            return FakeMessage(content=f"[{model}] Here is what I found for you.")
+        name, args = plan[step]
+        if model != premium_model and rng.random() < small_error_rate:
+            args = _corrupt(args, rng)
+        return FakeMessage(tool_calls=[FakeToolCall(name, args)])
+
+    return responder
+
+
+def _fake_tool_result(session_id: str, function_name: str, function_args: dict, prefetched_value=None) -> str:
+    return f"{function_name} ok"
+
+
+async def run_policy(policy: str, turns: int, fake: FakeAsyncClient):
+    """Runs `turns` scenario turns under one policy. Returns per-turn latencies, the stats snapshot and premium reply share."""
+    model_routing.stats.reset()
+    latencies = []
+    premium_replies = 0
+    for i in range(turns):
+        message, _ = SCENARIOS[i % len(SCENARIOS)]
+        history = [{"role": "user", "content": message}]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            reply = await llm_service.get_llm_response_with_history(f"routing_bench_{i}", history, routing_policy=policy)
+        latencies.append((time.perf_counter() - start) * 1000)
+        premium_replies += reply.startswith(f"[{llm_service.PRIMARY_MODEL}]")
+    return latencies, model_routing.stats.snapshot(), premium_replies / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and cost per turn for each model routing policy (fake provider).")
+    parser.add_argument('--turns', type=int, default=40)
+    parser.add_argument('--premium-latency', type=float, default=0.12, help="Simulated seconds per premium-model call.")
+    parser.add_argument('--small-latency', type=float, default=0.04, help="Simulated seconds per small-model call.")
+    parser.add_argument('--small-error-rate', type=float, default=0.1, help="Share of small-model tool calls with invalid args.")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    # Tool execution is replaced by canned results so only model latency and cost are measured;
+    # session facts are read from a throwaway database.
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/routing_bench.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    llm_service.execute_tool_call = _fake_tool_result
+    # Quota waits would dominate the timings; the rate limiter has its own checks.
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    premium, small = llm_service.PRIMARY_MODEL, model_routing.SMALL_MODEL
+    print(f"--- Model routing benchmark: {args.turns} turns per policy, premium={premium}, small={small} ---")
+    print(f"{'policy':<8} {'p50 ms':>8} {'p95 ms':>8} {'+p50 ms':>8} {'calls/turn':>11} {'$/turn':>10} {'$/1k turns':>11} "
+          f"{'premium replies':>16} {'discarded':>10} {'wasted ms/turn':>15}  promotions")
+    # '+p50 ms' is the median turn latency added over the premium policy (which runs first); 'wasted ms/turn' is the
+    # time spent on small-model replies that a promotion threw away.
+    baseline_p50 = None
+    for policy in model_routing.ROUTING_POLICIES:
+        fake = FakeAsyncClient(
+            latency_by_model={premium: args.premium_latency, small: args.small_latency},
+            responder=make_responder(premium, args.small_error_rate, args.seed),
+        )
+        llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)])
+        latencies, snapshot, premium_share = asyncio.run(run_policy(policy, args.turns, fake))
+        cost_per_turn = snapshot['cost_per_turn_usd'] or 0.0
+        p50 = statistics.median(latencies)
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        baseline_p50 = p50 if baseline_p50 is None else baseline_p50
+        wasted_ms = sum(snapshot['discarded_latency_ms'].values()) / args.turns
+        print(f"{policy:<8} {p50:>8.1f} {p95:>8.1f} {p50 - baseline_p50:>+8.1f} {len(fake.calls) / args.turns:>11.2f} "
+              f"{cost_per_turn:>10.5f} {cost_per_turn * 1000:>11.2f} {premium_share:>15.0%} "
+              f"{sum(snapshot['discarded_calls'].values()):>10} {wasted_ms:>15.1f}  {snapshot['promotions']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
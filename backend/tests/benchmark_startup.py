@@ -0,0 +1,175 @@
+import io
+import os
+import sys
+import json
+import argparse
+import tempfile
+import contextlib
+import statistics
+import subprocess
+
+from backend.utils.init_db import initialize_database
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASELINE_PATH = os.path.join('data', 'benchmarks', 'startup_baseline.json')
+DEFAULT_TOLERANCE = 0.25 # a metric regresses when its median is 25% slower than the saved baseline
+METRICS = ('import_ms', 'startup_ms', 'ready_ms', 'first_check_availability_ms')
+# Modules that should only be loaded by the warmup, never by importing the app.
+HEAVY_MODULES = ('openai', 'httpx', 'numpy')
+
+# Runs in a fresh interpreter per round, like a new replica: import the app, run its lifespan until the readiness
+# probe would pass, then time the first availability check. The result is the last line of output.
+CHILD = r'''
+import sys, json, time, asyncio
+started = time.perf_counter()
+from backend import main
+imported = time.perf_counter()
+loaded = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+from backend.utils import db_utils
+from backend.services import warmup
+db_utils.DB_PATH = sys.argv[1]
+
+async def run():
+    async with main.lifespan(main.app):
+        entered = time.perf_counter()
+        while warmup.warmup.status()['ready_at'] is None:
+            await asyncio.sleep(0.002)
+        ready = time.perf_counter()
+        service_name = next(iter(db_utils.get_reference_data().service_ids), '')
+        check_started = time.perf_counter()
+        db_utils.check_availability(service_name, '2030-01-07 10:00:00')
+        first_check = time.perf_counter() - check_started
+        status = warmup.warmup.status()
+    return entered, ready, first_check, status['ready'] or status['errors']
+
+entered, ready, first_check, warm = asyncio.run(run())
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'startup_ms': (entered - imported) * 1000,
+    'ready_ms': (ready - started) * 1000,
+    'first_check_availability_ms': first_check * 1000,
+    'loaded_at_import': loaded,
+    'ready': warm,
+}))
+'''
+
+
+def _child_env(with_provider: bool):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    env['RETENTION_ENABLED'] = '0' # its first run would write archives next to the benchmark
+    env['WARMUP_PROVIDER_CONNECTION'] = '1' if with_provider else '0'
+    return env
+
+
+def run_round(db_path: str, with_provider: bool):
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD, db_path, json.dumps(HEAVY_MODULES)],
+        cwd=ROOT, env=_child_env(with_provider), capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def show_imports(limit: int):
+    """Slowest modules (cumulative microseconds) while importing backend.main, from python -X importtime."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import backend.main'],
+        cwd=ROOT, env=_child_env(False), capture_output=True, text=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '').split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    print(f"--- Slowest imports under backend.main (top {limit}) ---")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:limit]:
+        print(f"  {name:<50} {cumulative_us / 1000:>8.1f} ms cumulative  {self_us / 1000:>7.1f} ms self")
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float):
+    """Returns the list of metrics whose median regressed beyond the tolerance."""
+    regressions = []
+    for name, median in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        limit = previous * (1 + tolerance)
+        change = (median / previous - 1) * 100
+        marker = 'REGRESSION' if median > limit else 'ok'
+        print(f"  {name:<30} {previous:>10.1f} -> {median:>10.1f} ms ({change:+.1f}%) {marker}")
+        if median > limit:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark: import time of backend.main, lifespan startup and time to ready.")
+    parser.add_argument('--rounds', type=int, default=5, help="Fresh interpreters to start; medians are reported.")
+    parser.add_argument('--db', default=None, help="Database to start against (a fresh seeded one by default).")
+    parser.add_argument('--with-provider', action='store_true', help="Include opening the LLM provider connection (needs network).")
+    parser.add_argument('--show-imports', type=int, default=0, metavar='N', help="Also list the N slowest imports.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'startup_benchmark.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            initialize_database(db_path)
+    db_path = os.path.abspath(db_path)
+
+    print(f"--- Startup benchmark: {args.rounds} cold starts against {db_path} ---")
+    rounds = []
+    for i in range(args.rounds):
+        try:
+            rounds.append(run_round(db_path, args.with_provider))
+        except RuntimeError as e:
+            print(f"Round {i + 1} failed: {e}")
+            return 2
+        r = rounds[-1]
+        print(f"  round {i + 1}: import {r['import_ms']:.1f} ms, startup {r['startup_ms']:.1f} ms, "
+              f"ready {r['ready_ms']:.1f} ms, first check {r['first_check_availability_ms']:.2f} ms")
+
+    results = {name: round(statistics.median(r[name] for r in rounds), 2) for name in METRICS}
+    print("Medians: " + ", ".join(f"{name} {value}" for name, value in results.items()))
+    loaded = sorted({name for r in rounds for name in r['loaded_at_import']})
+    if loaded:
+        print(f"Warning: imported by backend.main instead of the warmup: {', '.join(loaded)}")
+    if rounds[-1]['ready'] is not True:
+        print(f"Warning: warmup reported errors: {rounds[-1]['ready']}")
+    if args.show_imports:
+        show_imports(args.show_imports)
+
+    python = f"{sys.implementation.name} {sys.version.split()[0]}"
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': python, 'results': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run again with --save-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('python') != python:
+        print(f"Warning: baseline was recorded on {baseline.get('python')}.")
+
+    print(f"--- Comparison against {args.baseline} (tolerance {args.tolerance:.0%}) ---")
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"FAILED: {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
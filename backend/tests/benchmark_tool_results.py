@@ -0,0 +1,93 @@
+import re
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from backend.services import tool_results
+
+try:
+    import tiktoken
+except ImportError: # optional; falls back to an approximation
+    tiktoken = None
+
+
+# GPT-style pre-tokenisation: every piece is at least one token, and long words cost about one token per 4 characters.
+_PIECES = re.compile(r"""'(?:[sdmt]|ll|ve|re)| ?[A-Za-z]+| ?\d{1,3}| ?[^\s\w]+|\s+""")
+
+
+def approximate_tokens(text: str) -> int:
+    return sum(max(1, round(len(piece.strip() or piece) / 4)) for piece in _PIECES.findall(text))
+
+
+def token_counter():
+    if tiktoken is not None:
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken o200k_base"
+    return approximate_tokens, "approximate (install tiktoken for exact counts)"
+
+
+FIRST_NAMES = ['Josh', 'Maria', 'Emilie', 'Amanda', 'David', 'Priya', 'Liam', 'Sofia', 'Noah', 'Chen']
+LAST_NAMES = ['Matthews', 'Garcia', 'Laurent', 'Brooks', 'Okafor', 'Patel', 'Nguyen', 'Rossi', 'Kim', 'Walker']
+SERVICES = ['Technology', 'Sales', 'Financial', 'Legal']
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def sample_results(rng: random.Random):
+    """Representative results for each structured tool, at the sizes the agent loop actually sees."""
+    start = datetime(2030, 1, 7, 10)
+
+    def availability(count):
+        rows = [{'consultant_id': 100 + i, 'name': _name(rng)} for i in range(count)]
+        rows[0].update({'hold_token': 'q8Xr2bZk1LmN0pVa', 'hold_expires_at': '2030-01-07 09:05:00'})
+        return rows
+
+    def appointments(count):
+        return [{
+            'appointment_id': 48000 + i,
+            'appointment_datetime': (start + timedelta(days=i, hours=i % 6)).strftime('%Y-%m-%d %H:%M:%S'),
+            'consultant_name': _name(rng),
+            'service_name': rng.choice(SERVICES),
+        } for i in range(count)]
+
+    return [
+        ("check_availability", "1 consultant", availability(1)),
+        ("check_availability", "5 consultants", availability(5)),
+        ("check_availability", "25 consultants", availability(25)),
+        ("check_availability", "none", []),
+        ("find_next_available_slot", "found", ('2030-01-07 11:00:00', {'consultant_id': 7, 'name': _name(rng)})),
+        ("find_next_available_slot", "not found", (None, None)),
+        ("get_user_appointments", "1 booking", appointments(1)),
+        ("get_user_appointments", "8 bookings", appointments(8)),
+        ("get_user_appointments", "60 bookings", appointments(60)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens per tool result: old str() repr vs the compact encoders.")
+    parser.add_argument('--seed', type=int, default=3)
+    parser.add_argument('--show', action='store_true', help="Print the encoded text for each case.")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = token_counter()
+    print(f"--- Tool result encoding benchmark (tokens: {counter_name}) ---")
+    print(f"{'tool':<26} {'case':<16} {'before':>7} {'after':>7} {'saved':>7}")
+    total_before = total_after = 0
+    for function_name, case, value in sample_results(random.Random(args.seed)):
+        before_text = str(value)
+        after_text = tool_results.encode_tool_result(function_name, value)
+        before, after = count_tokens(before_text), count_tokens(after_text)
+        total_before += before
+        total_after += after
+        print(f"{function_name:<26} {case:<16} {before:>7} {after:>7} {1 - after / before:>7.0%}")
+        if args.show:
+            print(f"    before: {before_text[:200]}\n    after:  {after_text[:200]}")
+    print(f"{'total':<43} {total_before:>7} {total_after:>7} {1 - total_after / total_before:>7.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
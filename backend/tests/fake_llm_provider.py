@@ -0,0 +1,109 @@
+import json
+import uuid
+import random
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeProviderError(Exception):
+    """Mimics an HTTP error from the provider (status_code is what the resilience layer inspects)."""
+
+    def __init__(self, status_code: int = 503, message: str = "fake provider unavailable"):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeToolCall:
+    def __init__(self, name: str, arguments: dict | str):
+        self.id = f"call_{uuid.uuid4().hex[:12]}"
+        self.type = "function"
+        self.function = SimpleNamespace(
+            name=name,
+            arguments=arguments if isinstance(arguments, str) else json.dumps(arguments),
+        )
+
+
+class FakeMessage:
+    """Quacks like openai's ChatCompletionMessage for everything llm_service touches."""
+
+    def __init__(self, content: str | None = None, tool_calls: list[FakeToolCall] | None = None):
+        self.role = "assistant"
+        self.content = content
+        self.tool_calls = tool_calls or None
+
+    def model_dump(self):
+        return {
+            "role": self.role,
+            "content": self.content,
+            "tool_calls": [
+                {"id": tc.id, "type": tc.type, "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                for tc in self.tool_calls
+            ] if self.tool_calls else None,
+        }
+
+
+def make_completion(model: str, message: FakeMessage, prompt_tokens: int = 0, completion_tokens: int = 0):
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(message=message, finish_reason="tool_calls" if message.tool_calls else "stop")],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens),
+    )
+
+
+def _default_responder(model: str, messages: list[dict], kwargs: dict):
+    return FakeMessage(content=f"[{model}] fake reply")
+
+
+class FakeAsyncClient:
+    """
+    Local stand-in for AsyncOpenAI with controllable behaviour:
+    - latency / slow_latency / slow_fraction: base latency and a slow tail, to exercise timeouts and hedging
+    - latency_by_model: per-model base latency overriding `latency`, e.g. a fast small model and a slower premium one
+    - congestion: extra seconds per call already in flight, modelling a provider that slows down as it is flooded
+    - fail_first: the first N calls raise FakeProviderError
+    - failure_rate: random failures after that
+    - responder(model, messages, kwargs) -> FakeMessage: scripts the replies (text or tool calls)
+    Every call is recorded in `calls` as (model, kwargs).
+    """
+
+    def __init__(self, latency: float = 0.01, slow_latency: float = 0.0, slow_fraction: float = 0.0,
+                 fail_first: int = 0, failure_rate: float = 0.0, failure_status: int = 503,
+                 responder=None, seed: int = 0, latency_by_model: dict[str, float] | None = None,
+                 congestion: float = 0.0):
+        self.latency = latency
+        self.congestion = congestion
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latency_by_model = latency_by_model or {}
+        self.slow_latency = slow_latency
+        self.slow_fraction = slow_fraction
+        self.fail_first = fail_first
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.responder = responder or _default_responder
+        self.rng = random.Random(seed)
+        self.calls: list[tuple[str, dict]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, messages: list[dict], **kwargs):
+        self.calls.append((model, kwargs))
+        call_number = len(self.calls)
+
+        slow = self.slow_fraction and self.rng.random() < self.slow_fraction
+        delay = (self.slow_latency if slow else self.latency_by_model.get(model, self.latency)) + self.congestion * self.in_flight
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        if call_number <= self.fail_first or (self.failure_rate and self.rng.random() < self.failure_rate):
+            raise FakeProviderError(self.failure_status)
+
+        message = self.responder(model, messages, kwargs)
+        # Roughly 4 characters per token; the tool schema is billed as prompt input too.
+        prompt_tokens = (sum(len(str(m.get("content") or "")) for m in messages) + len(json.dumps(kwargs.get("tools") or []))) // 4
+        completion_tokens = len(json.dumps(message.model_dump())) // 4
+        return make_completion(model, message, prompt_tokens, completion_tokens)
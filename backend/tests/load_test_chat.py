@@ -0,0 +1,128 @@
+import io
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from contextlib import asynccontextmanager
+
+import httpx
+
+from backend.main import app
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import admission, llm_service, llm_provider, model_routing, rate_limiter
+from backend.tests.fake_llm_provider import FakeAsyncClient
+
+
+def _percentile(values: list[float], p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _track_session_overlap():
+    """Wraps the agent loop to record the most turns ever running at once for a single session."""
+    running: dict[str, int] = {}
+    observed = {'max_overlap': 0}
+    original = llm_service.get_llm_response_with_history
+
+    async def tracked(session_id, messages_history, **kwargs):
+        running[session_id] = running.get(session_id, 0) + 1
+        observed['max_overlap'] = max(observed['max_overlap'], running[session_id])
+        try:
+            return await original(session_id, messages_history, **kwargs)
+        finally:
+            running[session_id] -= 1
+
+    llm_service.get_llm_response_with_history = tracked
+    return observed, original
+
+
+@asynccontextmanager
+async def _no_admission(session_id):
+    yield
+
+
+async def run_scenario(args, controlled: bool):
+    """
+    Sends an open-loop stream of turns at args.rate per second and collects latency by status code.
+    The baseline (controlled=False) bypasses both the session locks and the global limit.
+    """
+    fake = FakeAsyncClient(latency=args.latency, congestion=args.congestion)
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)], total_deadline=600, timeout=600)
+    admission.admission_controller = admission.AdmissionController(args.max_concurrent, args.max_queued, args.queue_timeout)
+    admission.session_serializer = admission.SessionSerializer()
+    original_admit_turn = admission.admit_turn
+    if not controlled:
+        admission.admit_turn = _no_admission
+
+    label = "admission" if controlled else "baseline"
+    latencies: dict[int, list[float]] = {}
+    observed, original = _track_session_overlap()
+
+    async def send(client, session_id, text):
+        payload = {"session_id": session_id, "messages": [{"role": "user", "content": text}]}
+        started = time.perf_counter()
+        response = await client.post("/chat_turn", json=payload)
+        latencies.setdefault(response.status_code, []).append((time.perf_counter() - started) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        total = int(args.rate * args.duration)
+        tasks = []
+        started = time.perf_counter()
+        for i in range(total):
+            tasks.append(asyncio.create_task(send(client, f"load_{label}_{i}", "first message")))
+            if i % 5 == 0:
+                # A double submit: a second, different message for the same session at the same moment.
+                tasks.append(asyncio.create_task(send(client, f"load_{label}_{i}", "second message")))
+            await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    llm_service.get_llm_response_with_history = original
+    admission.admit_turn = original_admit_turn
+    return latencies, elapsed, fake.max_in_flight, observed['max_overlap']
+
+
+def _report(label: str, latencies: dict, elapsed: float, max_in_flight: int, max_overlap: int):
+    ok = latencies.get(200, [])
+    shed = [ms for status, values in latencies.items() if status in (429, 503) for ms in values]
+    other = sum(len(values) for status, values in latencies.items() if status not in (200, 429, 503))
+    print(f"{label:<13} ok {len(ok):>5}  shed {len(shed):>5}  errors {other:>3}  "
+          f"ok p50/p95/p99 {_percentile(ok, 50) or 0:>7.0f} {_percentile(ok, 95) or 0:>7.0f} {_percentile(ok, 99) or 0:>7.0f} ms  "
+          f"shed p99 {_percentile(shed, 99) or 0:>6.0f} ms  goodput {len(ok) / elapsed:>6.1f}/s  "
+          f"provider in-flight max {max_in_flight:>4}  session overlap max {max_overlap}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overload /chat_turn in-process (fake LLM) with and without admission control.")
+    parser.add_argument('--rate', type=float, default=250, help="Offered sessions per second (every fifth also double-submits).")
+    parser.add_argument('--duration', type=float, default=4, help="Seconds of offered load.")
+    parser.add_argument('--latency', type=float, default=0.1, help="Fake provider latency when idle.")
+    parser.add_argument('--congestion', type=float, default=0.005, help="Extra provider latency per call in flight.")
+    parser.add_argument('--max-concurrent', type=int, default=admission.CHAT_MAX_CONCURRENT_TURNS)
+    parser.add_argument('--max-queued', type=int, default=admission.CHAT_MAX_QUEUED_TURNS)
+    parser.add_argument('--queue-timeout', type=float, default=2.0)
+    args = parser.parse_args()
+
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/load_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    model_routing.LLM_ROUTING_POLICY = "premium" # one provider call per turn
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    print(f"--- /chat_turn load test: {args.rate:.0f} turns/s for {args.duration:.0f}s, "
+          f"limits {args.max_concurrent} running / {args.max_queued} queued / {args.queue_timeout}s wait ---")
+    for label, controlled in (("baseline", False), ("admission", True)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(run_scenario(args, controlled))
+        _report(label, *result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import io
+import tempfile
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import analytics
+
+
+def _next_monday():
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=7 - today.weekday())
+
+
+MONDAY = _next_monday()
+EMAIL = 'analytics@example.com'
+
+
+def _slot(days: int, hour: int) -> str:
+    return (MONDAY + timedelta(days=days, hours=hour)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _table_rows(name: str, where: str = "1"):
+    conn = db_utils.get_db_connection()
+    try:
+        return sorted(tuple(row) for row in conn.execute(f"SELECT * FROM {name} WHERE {where}"))
+    finally:
+        conn.close()
+
+
+def _table(name: str):
+    return _table_rows(name, "booked_slots != 0")
+
+
+def _book(slot: str, service_id: int):
+    appointment_id = db_utils.book_appointment('Analytics User', EMAIL, slot, service_id)
+    assert isinstance(appointment_id, int), appointment_id
+    return appointment_id
+
+
+def check_writes_update_rollups():
+    # Service 1 on weekdays has one consultant (Josh Matthews), service 2 has two.
+    first = _book(_slot(0, 10), 1)
+    second = _book(_slot(0, 11), 2)
+    third = _book(_slot(1, 15), 2)
+    _book(_slot(2, 16), 3)
+    assert db_utils.cancel_appointment(first, EMAIL) is True
+    assert db_utils.reschedule_appointment(second, EMAIL, _slot(3, 12)) is True
+    assert db_utils.modify_appointment_service(third, EMAIL, 4) is True
+
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    stats = {row['service_id']: row for row in db_utils.get_booking_daily_stats(today, today)}
+    assert (stats[1]['booked'], stats[1]['cancelled']) == (1, 1), stats[1]
+    assert (stats[2]['booked'], stats[2]['rescheduled']) == (2, 1), stats[2]
+    assert stats[4]['modified'] == 1, stats[4]
+
+    hourly = db_utils.get_service_hourly_load(_slot(0, 0)[:10], _slot(6, 0)[:10])
+    assert sorted((row['day'], row['hour'], row['service_id']) for row in hourly) == [
+        (_slot(1, 0)[:10], 15, 4), (_slot(2, 0)[:10], 16, 3), (_slot(3, 0)[:10], 12, 2),
+    ], hourly
+
+
+def check_rebuild_matches_incremental():
+    before = (_table('consultant_daily_load'), _table('service_hourly_load'))
+    stats_before = _table_rows('booking_daily_stats')
+    counts = db_utils.rebuild_analytics_rollups()
+    assert counts is not None
+    after = (_table('consultant_daily_load'), _table('service_hourly_load'))
+    assert before == after, (before, after)
+    # Incrementally counted days keep their reschedules and modifications.
+    assert _table_rows('booking_daily_stats') == stats_before, (stats_before, _table_rows('booking_daily_stats'))
+
+
+def check_heatmap_and_utilization():
+    start, end = _slot(0, 0)[:10], _slot(6, 0)[:10]
+    heatmap = analytics.utilization_heatmap(start, end, service_id=2)
+    # Two service-2 consultants, Monday to Friday, 10-13 and 14-19: 8 hourly slots each per day.
+    assert heatmap['hours'] == list(range(10, 19)), heatmap['hours']
+    capacity = sum(map(sum, heatmap['capacity']))
+    assert capacity == 2 * 5 * 8, capacity
+    thursday_noon = heatmap['utilization'][3][heatmap['hours'].index(12)]
+    assert thursday_noon == 0.5, thursday_noon
+    assert heatmap['overall_utilization'] == round(1 / 80, 4), heatmap['overall_utilization']
+
+    consultants = analytics.consultant_utilization(start, end)
+    assert len(consultants) == 8, consultants
+    assert consultants[0]['booked_slots'] == 1 and consultants[0]['available_slots'] == 40, consultants[0]
+    weekend = [c for c in consultants if c['consultant_id'] in (7, 8)]
+    assert all(c['available_slots'] == 16 and c['booked_slots'] == 0 for c in weekend), weekend
+
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    rates = {row['service_id']: row for row in analytics.booking_rates(today, today)['services']}
+    assert rates[1]['cancelled_rate'] == 1.0 and rates[2]['rescheduled_rate'] == 0.5, rates
+
+
+def run_analytics_tests():
+    print("--- Starting Analytics Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/analytics_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_writes_update_rollups,
+        check_rebuild_matches_incremental,
+        check_heatmap_and_utilization,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_analytics_tests() else 0)
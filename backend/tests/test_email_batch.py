@@ -0,0 +1,143 @@
+import io
+import smtplib
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import email_service, email_templates
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+DETAILS = {'user_name': 'Ann <admin>', 'user_email': 'ann@example.com', 'service_name': 'Sales',
+           'consultant_name': 'Sarah Jones', 'appointment_datetime': '2030-01-07 10:00:00'}
+
+
+class FakeSMTP:
+    """Records what one SMTP session sent. fail_with maps a recipient to the exception its first send raises."""
+
+    sessions = []
+
+    def __init__(self, fail_with: dict | None = None):
+        self.sent = []
+        self.fail_with = dict(fail_with or {})
+        self.quit_called = False
+        FakeSMTP.sessions.append(self)
+
+    def send_message(self, msg):
+        error = self.fail_with.pop(msg['To'], None)
+        if error is not None:
+            raise error
+        self.sent.append(msg)
+
+    def quit(self):
+        self.quit_called = True
+
+
+@contextlib.contextmanager
+def _fake_smtp(fail_with: dict | None = None):
+    """Replaces the SMTP connection; only the first session gets fail_with. Yields the list of sessions opened."""
+    FakeSMTP.sessions = []
+    originals = email_service._open_smtp, email_service.EMAIL_ADDRESS, email_service.EMAIL_PASSWORD
+    email_service._open_smtp = lambda: FakeSMTP(fail_with if not FakeSMTP.sessions else None)
+    email_service.EMAIL_ADDRESS, email_service.EMAIL_PASSWORD = 'firm@example.com', 'secret'
+    try:
+        yield FakeSMTP.sessions
+    finally:
+        email_service._open_smtp, email_service.EMAIL_ADDRESS, email_service.EMAIL_PASSWORD = originals
+
+
+def check_templates_render_every_action():
+    for action in email_templates._ACTIONS:
+        subject, text, html_body = email_templates.render_email(action, DETAILS, 42, 'firm@example.com')
+        assert '$' not in subject + text + html_body, f"unsubstituted placeholder in {action}"
+        assert text.startswith("Dear Ann <admin>,") and html_body.startswith("<html><body><p>Dear Ann &lt;admin&gt;,</p>"), action
+        assert "Sincerely," in text and "Sincerely," in html_body, action
+    assert email_templates.render_email('unknown', DETAILS, 42, 'firm@example.com') is None
+
+    subject, text, _ = email_templates.render_email('rescheduled', DETAILS, 42, 'firm@example.com')
+    assert subject == "Appointment Rescheduled: Sales Consultation." and "New Details:\nService: Sales" in text, text
+    _, text, _ = email_templates.render_email('cancelled', DETAILS, 42, 'firm@example.com')
+    assert "(ID: 42) has been cancelled" in text and "Consultant:" not in text, text
+    assert email_templates.render_email('booked', {**DETAILS, 'user_name': None}, 1, 'f')[1].startswith("Dear Client,")
+
+
+def check_message_is_multipart():
+    msg = email_service._build_message(42, 'booked', DETAILS)
+    assert msg.is_multipart() and [part.get_content_type() for part in msg.iter_parts()] == ['text/plain', 'text/html']
+    assert msg['To'] == 'ann@example.com' and msg['Subject'] == "Appointment Confirmed: Sales Consultation."
+    assert email_service._build_message(42, 'booked', {**DETAILS, 'user_email': None}) is None
+    assert email_service._build_message(42, 'unknown', DETAILS) is None
+
+
+def check_batch_uses_one_session_and_one_query():
+    booked = [db_utils.book_appointment(name, f"{name.lower()}@example.com",
+                                        (MONDAY + timedelta(days=day, hours=11)).strftime('%Y-%m-%d %H:%M:%S'), 1)
+              for day, name in enumerate(['Bea', 'Cal', 'Dee'])]
+    assert all(isinstance(appointment_id, int) for appointment_id in booked), booked
+
+    queries = []
+    original = db_utils.get_booking_details_many
+    db_utils.get_booking_details_many = lambda ids: queries.append(list(ids)) or original(ids)
+    try:
+        with _fake_smtp() as sessions:
+            results = email_service.send_appointment_emails_batch(
+                [{'appointment_id': appointment_id, 'action': 'reminder_24h'} for appointment_id in booked]
+                + [{'appointment_id': 999, 'action': 'booked', 'booking_details': DETAILS}])
+    finally:
+        db_utils.get_booking_details_many = original
+
+    assert results == {**{appointment_id: True for appointment_id in booked}, 999: True}, results
+    assert queries == [booked], "details that were not supplied are fetched in one query"
+    assert len(sessions) == 1 and sessions[0].quit_called
+    assert [msg['To'] for msg in sessions[0].sent] == ['bea@example.com', 'cal@example.com', 'dee@example.com', 'ann@example.com']
+
+
+def check_batch_reconnects_and_skips_refused():
+    items = [{'appointment_id': i, 'action': 'booked', 'booking_details': {**DETAILS, 'user_email': f"u{i}@example.com"}}
+             for i in (1, 2, 3)]
+    refused = smtplib.SMTPRecipientsRefused({'u1@example.com': (550, b'no such user')})
+    with _fake_smtp({'u1@example.com': refused, 'u2@example.com': smtplib.SMTPServerDisconnected()}) as sessions:
+        results = email_service.send_appointment_emails_batch(items)
+    assert results == {1: False, 2: True, 3: True}, results
+    # The dropped session is replaced once; the rest of the batch goes through the new one.
+    assert len(sessions) == 2 and sessions[0].sent == [] and [m['To'] for m in sessions[1].sent] == ['u2@example.com', 'u3@example.com']
+
+    with _fake_smtp() as sessions:
+        email_service.EMAIL_PASSWORD = None
+        assert email_service.send_appointment_emails_batch(items) == {1: False, 2: False, 3: False}
+    assert sessions == [], "nothing is sent without a configured sender"
+    assert email_service.send_appointment_emails_batch([]) == {}
+
+
+def run_email_batch_tests():
+    print("--- Starting Email Template and Batch Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/email_batch_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_templates_render_every_action,
+        check_message_is_multipart,
+        check_batch_uses_one_session_and_one_query,
+        check_batch_reconnects_and_skips_refused,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_email_batch_tests() else 0)
@@ -0,0 +1,139 @@
+import io
+import csv
+import random
+import sqlite3
+import tempfile
+import resource
+import contextlib
+from datetime import date, datetime, timedelta
+
+from backend.utils import db_utils, seed_large_db
+from backend.utils.init_db import initialize_database
+from backend.services import schedule_export
+
+
+SEEDED_APPOINTMENTS = 200_000
+SEED_DAYS = 180
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday() + 7 * 30)).replace(hour=0, minute=0, second=0, microsecond=0)
+TRICKY_NAME = '=Doe, Jane; "JD" \\ Zoë Ünïcödé-Mustermann-Schmidt the Third of Many Names'
+
+
+def _slot(hour: int, day: int = 0) -> str:
+    return (MONDAY + timedelta(days=day, hours=hour)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _day(value: date) -> str:
+    return value.strftime('%Y-%m-%d')
+
+
+def _seed(db_path: str):
+    """Spreads SEEDED_APPOINTMENTS over SEED_DAYS centred on today, the way seed_large_db does."""
+    rng = random.Random(7)
+    conn = sqlite3.connect(db_path)
+    try:
+        consultant_ids = seed_large_db.seed_consultants(conn, 300, rng, 50_000)
+        user_ids = seed_large_db.seed_users(conn, 20_000, rng, 50_000)
+        seed_large_db.seed_appointments(conn, consultant_ids, SEEDED_APPOINTMENTS, user_ids, SEED_DAYS, rng, 50_000)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _export_growth(start_day: str, end_day: str):
+    """(rows, bytes, growth of the process's peak RSS in KB) for streaming a CSV export of every status between the two days."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB on Linux
+    rows = size = 0
+    for chunk in schedule_export.csv_chunks(schedule_export.export_batches(start_day, end_day, status=None)):
+        rows += chunk.count('\n')
+        size += len(chunk)
+    return rows - 1, size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+
+def check_memory_does_not_grow_with_range():
+    today = date.today()
+    small = _export_growth(_day(today), _day(today + timedelta(days=SEED_DAYS // 10)))
+    full = _export_growth(_day(today - timedelta(days=SEED_DAYS)), _day(today + timedelta(days=SEED_DAYS)))
+    assert full[0] == SEEDED_APPOINTMENTS and small[0] < SEEDED_APPOINTMENTS // 5, (small, full)
+    # Holding the rows would take over 100 MB; streaming only ever holds one batch, which the small export already needed.
+    assert full[2] < 8 * 1024, f"peak memory grew by {full[2]} KB while streaming {full[0]} rows ({full[1]} bytes)"
+
+
+def _unfold(ics: str):
+    return ics.replace('\r\n ', '').split('\r\n')
+
+
+def check_csv_and_ics_are_well_formed():
+    first = db_utils.book_appointment(TRICKY_NAME, 'tricky@example.com', _slot(10), 1)
+    second = db_utils.book_appointment('Plain User', 'plain@example.com', _slot(11), 1)
+    cancelled = db_utils.book_appointment('Plain User', 'plain@example.com', _slot(12), 1)
+    assert all(isinstance(a, int) for a in (first, second, cancelled)), (first, second, cancelled)
+    assert db_utils.cancel_appointment(cancelled, 'plain@example.com') is True
+    day = _slot(0)[:10]
+
+    rows = list(csv.DictReader(io.StringIO(''.join(schedule_export.csv_chunks(schedule_export.export_batches(day, day, status=None))))))
+    assert [int(row['appointment_id']) for row in rows] == [first, second, cancelled], rows
+    assert rows[0]['user_name'] == "'" + TRICKY_NAME, rows[0] # no formula injection
+    assert (rows[0]['start'], rows[0]['end'], rows[2]['status']) == (_slot(10), _slot(11), 'cancelled'), rows
+
+    ics = ''.join(schedule_export.ics_chunks(schedule_export.export_batches(day, day, consultant_id=1), 'Appointments - Josh'))
+    assert all(len(line.encode('utf-8')) <= 75 for line in ics.split('\r\n')), "unfolded line longer than 75 octets"
+    assert ics.startswith('BEGIN:VCALENDAR\r\n') and ics.endswith('END:VCALENDAR\r\n'), ics[-40:]
+    lines = _unfold(ics)
+    assert lines.count('BEGIN:VEVENT') == lines.count('END:VEVENT') == 2, "only booked appointments by default"
+    assert f"UID:appointment-{first}@ai-receptionist" in lines and f"DTSTART:{_slot(10).replace('-', '').replace(':', '').replace(' ', 'T')}" in lines
+    summary = next(line for line in lines if line.startswith('SUMMARY:') and 'Doe' in line)
+    assert summary == 'SUMMARY:Technology with =Doe\\, Jane\\; "JD" \\\\ Zoë Ünïcödé-Mustermann-Schmidt the Third of Many Names', summary
+
+
+def check_conditional_requests():
+    params = {'start': '2030-01-01', 'end': '2030-12-31', 'consultant_id': None, 'service_id': None, 'status': 'booked'}
+    etag, last_modified = schedule_export.export_validators('csv', params)
+    assert etag and last_modified and schedule_export.export_validators('csv', params) == (etag, last_modified)
+    assert schedule_export.export_validators('ics', params)[0] != etag
+    assert schedule_export.export_validators('csv', {**params, 'consultant_id': 1})[0] != etag
+
+    assert schedule_export.is_not_modified(etag, last_modified, etag, None)
+    assert schedule_export.is_not_modified(etag, last_modified, f'"other", W/{etag}', None)
+    assert schedule_export.is_not_modified(etag, last_modified, '*', None)
+    assert not schedule_export.is_not_modified(etag, last_modified, '"other"', last_modified), "If-None-Match wins"
+    assert schedule_export.is_not_modified(etag, last_modified, None, last_modified)
+    assert not schedule_export.is_not_modified(etag, last_modified, None, 'Mon, 01 Jan 2001 00:00:00 GMT')
+    assert not schedule_export.is_not_modified(etag, last_modified, None, 'not a date')
+    later = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    assert schedule_export.export_validators('csv', params, later)[1] != last_modified, "a moving window moves Last-Modified"
+
+    # Any booking change, even outside the range, gives a new ETag.
+    assert isinstance(db_utils.book_appointment('Late User', 'late@example.com', _slot(14, 1), 1), int)
+    assert schedule_export.export_validators('csv', params)[0] != etag
+
+
+def run_export_tests():
+    print("--- Starting Export Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/export_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+        _seed(db_utils.DB_PATH)
+        db_utils.load_reference_data()
+
+    checks = [
+        check_memory_does_not_grow_with_range,
+        check_csv_and_ics_are_well_formed,
+        check_conditional_requests,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_export_tests() else 0)
@@ -0,0 +1,174 @@
+import io
+import time
+import asyncio
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils, idempotency
+from backend.utils.init_db import initialize_database
+from backend.routes import chat
+from backend.services import email_service, llm_service, llm_provider, model_routing, rate_limiter
+from backend.tests.fake_llm_provider import FakeAsyncClient, FakeMessage, FakeToolCall
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _slot(hour: int, day: int = 0) -> str:
+    return (MONDAY + timedelta(days=day, hours=hour)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _booked(slot: str):
+    conn = db_utils.get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM appointments WHERE status = 'booked' AND appointment_datetime = ?", (slot,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _messages(session_id: str):
+    conn = db_utils.get_db_connection()
+    try:
+        return [row[0] for row in conn.execute("SELECT role FROM conversation_history WHERE session_id = ? ORDER BY message_id", (session_id,))]
+    finally:
+        conn.close()
+
+
+@contextlib.contextmanager
+def _counted_emails():
+    """Replaces the confirmation email with a counter: [(appointment_id, action), ...]."""
+    sent = []
+    original = email_service.send_appointment_email
+
+    def fake_send(appointment_id, action, booking_details=None):
+        sent.append((appointment_id, action))
+        return True
+
+    email_service.send_appointment_email = fake_send
+    try:
+        yield sent
+    finally:
+        email_service.send_appointment_email = original
+
+
+def check_keys_ignore_trivial_differences():
+    args = {'user_email': ' Jane@Example.com ', 'appt_datetime': '2030-01-07T10:00:00', 'appointment_id': '12'}
+    same = {'appointment_id': 12, 'appt_datetime': '2030-01-07 10:00:00', 'user_email': 'jane@example.com'}
+    assert idempotency.normalize_args(args) == same, idempotency.normalize_args(args)
+    key = idempotency.make_idempotency_key('s1', 'cancel_appointment', args)
+    assert key == idempotency.make_idempotency_key('s1', 'cancel_appointment', same)
+    assert key != idempotency.make_idempotency_key('s2', 'cancel_appointment', same), "keys must be scoped by session"
+    assert key != idempotency.make_idempotency_key('s1', 'cancel_appointment', {**same, 'appointment_id': 13})
+
+
+def check_store_expires_evicts_and_forgets():
+    store = idempotency.TTLDedupStore(ttl_seconds=0.05, max_entries=3)
+    store.put('a', 'A', scope='s1')
+    assert store.get('a') == 'A'
+    time.sleep(0.06)
+    assert store.get('a') is None, "expired entries must not be replayed"
+
+    store = idempotency.TTLDedupStore(ttl_seconds=60, max_entries=3)
+    for key in 'abcd':
+        store.put(key, key.upper(), scope='s1' if key in 'ab' else 's2')
+    assert len(store) == 3 and store.get('a') is None and store.get('d') == 'D', "the oldest entry should be evicted"
+    store.forget_scope('s2')
+    assert len(store) == 1 and store.get('b') == 'B'
+
+
+def check_repeated_tool_calls_replay():
+    slot, args = _slot(11), {'user_name': 'Jane', 'user_email': 'jane@example.com', 'appt_datetime': _slot(11), 'service_id': 2}
+    with _counted_emails() as sent:
+        first = llm_service.execute_tool_call('replay_session', 'book_appointment', args)
+        again = llm_service.execute_tool_call('replay_session', 'book_appointment', {**args, 'user_email': 'JANE@example.com'})
+        assert first == again and _booked(slot) == 1 and len(sent) == 1, (first, again, sent)
+
+        # A later write supersedes the recorded ones: book -> cancel -> book the same slot again really books.
+        appointment_id = sent[0][0]
+        assert 'successful' in llm_service.execute_tool_call(
+            'replay_session', 'cancel_appointment', {'appointment_id': appointment_id, 'user_email': 'jane@example.com'})
+        llm_service.execute_tool_call('replay_session', 'book_appointment', args)
+    assert _booked(slot) == 1 and [action for _, action in sent] == ['booked', 'cancelled', 'booked'], sent
+
+
+def _double_booking_responder(slot: str):
+    """The model books, repeats the same call in the same response, then answers."""
+    def responder(model, messages, kwargs):
+        if messages[-1]['role'] == 'tool':
+            return FakeMessage(content="You're booked.")
+        args = {'user_name': 'Sam', 'user_email': 'sam@example.com', 'appt_datetime': slot, 'service_id': 2}
+        return FakeMessage(tool_calls=[FakeToolCall('book_appointment', args), FakeToolCall('book_appointment', args)])
+    return responder
+
+
+def check_concurrent_duplicate_turns_run_once():
+    # Sales has two consultants, so a second real write would double-book instead of failing.
+    slot = _slot(15, day=1)
+    fake = FakeAsyncClient(latency=0.05, responder=_double_booking_responder(slot))
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)])
+    payload = chat.ChatTurnInput(session_id='dup_session', messages=[{'role': 'user', 'content': f"Book Sales at {slot}"}])
+
+    async def run():
+        concurrent = await asyncio.gather(*[chat.chat_turn_endpoint(payload, idempotency_key=None) for _ in range(3)])
+        retried = await chat.chat_turn_endpoint(payload, idempotency_key=None)
+        return concurrent, retried
+
+    with _counted_emails() as sent:
+        concurrent, retried = asyncio.run(run())
+    assert all(response == retried for response in concurrent), (concurrent, retried)
+    assert len(fake.calls) == 2, f"the turn ran {len(fake.calls) // 2} times"
+    assert _booked(slot) == 1 and len(sent) == 1, (_booked(slot), sent)
+    assert _messages('dup_session') == ['user', 'ai'], _messages('dup_session')
+    assert not chat._inflight_turns
+
+
+def check_idempotency_key_header_coalesces():
+    slot = _slot(16, day=1)
+    fake = FakeAsyncClient(latency=0.05, responder=_double_booking_responder(slot))
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)])
+    first = chat.ChatTurnInput(session_id='header_session', messages=[{'role': 'user', 'content': f"Book Sales at {slot}"}])
+    # A client retry may resend slightly different history; the header still identifies the turn.
+    retry = chat.ChatTurnInput(session_id='header_session', messages=[{'role': 'user', 'content': f"Book Sales at {slot} please"}])
+
+    async def run():
+        return await asyncio.gather(chat.chat_turn_endpoint(first, idempotency_key='turn-1'),
+                                    chat.chat_turn_endpoint(retry, idempotency_key='turn-1'))
+
+    with _counted_emails() as sent:
+        responses = asyncio.run(run())
+    assert responses[0] == responses[1] and _booked(slot) == 1 and len(sent) == 1, (responses, sent)
+
+
+def run_idempotency_tests():
+    print("--- Starting Idempotency Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/idempotency_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    model_routing.LLM_ROUTING_POLICY = "premium"
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    checks = [
+        check_keys_ignore_trivial_differences,
+        check_store_expires_evicts_and_forgets,
+        check_repeated_tool_calls_replay,
+        check_concurrent_duplicate_turns_run_once,
+        check_idempotency_key_header_coalesces,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_idempotency_tests() else 0)
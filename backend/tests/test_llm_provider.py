@@ -0,0 +1,105 @@
+import time
+import asyncio
+from backend.services import llm_provider
+from backend.tests.fake_llm_provider import FakeAsyncClient, FakeProviderError
+
+
+def _provider(primary: FakeAsyncClient, fallback: FakeAsyncClient | None = None, **options):
+    routes = [llm_provider.ProviderRoute("primary", primary)]
+    if fallback is not None:
+        routes.append(llm_provider.ProviderRoute("fallback", fallback, model="fallback-model"))
+    options.setdefault("retry_base_delay", 0.01)
+    return llm_provider.ResilientChatProvider(routes, **options)
+
+
+async def _create(provider):
+    completion = await provider.create(model="primary-model", messages=[{"role": "user", "content": "hi"}])
+    return completion.choices[0].message.content
+
+
+async def check_retry_recovers_from_transient_errors():
+    primary = FakeAsyncClient(fail_first=2)
+    provider = _provider(primary, max_retries=2)
+    reply = await _create(provider)
+    assert reply == "[primary-model] fake reply", reply
+    assert provider.metrics()["primary"]["retries"] == 2
+
+
+async def check_timeout_fails_over_to_secondary_model():
+    primary = FakeAsyncClient(latency=1.0)
+    fallback = FakeAsyncClient()
+    provider = _provider(primary, fallback, timeout=0.05, max_retries=1)
+    started = time.perf_counter()
+    reply = await _create(provider)
+    elapsed = time.perf_counter() - started
+    assert reply == "[fallback-model] fake reply", reply
+    assert elapsed < 0.5, f"deadline not enforced ({elapsed:.2f}s)"
+    assert provider.metrics()["primary"]["timeouts"] == 2
+
+
+async def check_hedged_request_cuts_tail_latency():
+    # Every other call is slow; the hedge fired after 50ms should win for the slow ones.
+    primary = FakeAsyncClient(latency=0.01, slow_latency=0.5, slow_fraction=0.5, seed=1)
+    provider = _provider(primary, hedge_after=0.05, timeout=2.0)
+    started = time.perf_counter()
+    for _ in range(10):
+        await _create(provider)
+    elapsed = time.perf_counter() - started
+    metrics = provider.metrics()["primary"]
+    assert metrics["hedges"] > 0 and metrics["hedge_wins"] > 0, metrics
+    assert elapsed < 2.0, f"hedging did not cut the slow tail ({elapsed:.2f}s)"
+
+
+async def check_breaker_opens_and_short_circuits():
+    primary = FakeAsyncClient(failure_rate=1.0)
+    fallback = FakeAsyncClient()
+    provider = _provider(primary, fallback, max_retries=0)
+    provider.routes[0].breaker.failure_threshold = 3
+    for _ in range(6):
+        assert await _create(provider) == "[fallback-model] fake reply"
+    metrics = provider.metrics()["primary"]
+    assert metrics["breaker"] == "open", metrics
+    assert len(primary.calls) == 3, f"open breaker still sent {len(primary.calls)} calls"
+    assert metrics["short_circuits"] == 3
+
+
+async def check_non_retryable_error_is_not_retried():
+    primary = FakeAsyncClient(failure_rate=1.0, failure_status=400)
+    fallback = FakeAsyncClient()
+    provider = _provider(primary, fallback, max_retries=3)
+    provider.routes[0].breaker.failure_threshold = 2
+    for _ in range(3):
+        try:
+            await _create(provider)
+            raise AssertionError("expected the provider's 400 to be raised")
+        except FakeProviderError as e:
+            assert e.status_code == 400
+    assert len(primary.calls) == 3, f"400 was retried {len(primary.calls) - 3} times"
+    assert not fallback.calls, "a client error failed over to the fallback route"
+    metrics = provider.metrics()["primary"]
+    assert metrics["breaker"] == "closed" and metrics["failures"] == 0 and metrics["client_errors"] == 3, metrics
+
+
+async def run_provider_tests():
+    print("--- Starting LLM Provider Resilience Tests (fake provider) ---")
+    checks = [
+        check_retry_recovers_from_transient_errors,
+        check_timeout_fails_over_to_secondary_model,
+        check_hedged_request_cuts_tail_latency,
+        check_breaker_opens_and_short_circuits,
+        check_non_retryable_error_is_not_retried,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            await check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(run_provider_tests()) else 0)
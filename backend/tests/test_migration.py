@@ -0,0 +1,196 @@
+import io
+import sqlite3
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _slot(hour: int, day: int = 0) -> str:
+    return (MONDAY + timedelta(days=day, hours=hour)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# The schema a database created before the users table had: every appointment stores the user's name and email.
+BASELINE_SCHEMA = '''
+CREATE TABLE services (
+    service_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_name TEXT NOT NULL UNIQUE,
+    description TEXT
+);
+CREATE TABLE consultants (
+    consultant_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    service_id INTEGER NOT NULL,
+    FOREIGN KEY (service_id) REFERENCES services (service_id)
+);
+CREATE TABLE consultant_availability (
+    availability_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    consultant_id INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    FOREIGN KEY (consultant_id) REFERENCES consultants (consultant_id)
+);
+CREATE TABLE appointments(
+    appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT NOT NULL,
+    user_email TEXT NOT NULL,
+    appointment_datetime TEXT NOT NULL,
+    consultant_id INTEGER NOT NULL,
+    service_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'booked',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    confirmation_sent_at TIMESTAMP NULL,
+    FOREIGN KEY (consultant_id) REFERENCES consultants (consultant_id),
+    FOREIGN KEY (service_id) REFERENCES services (service_id)
+);
+CREATE UNIQUE INDEX idx_unique_booked_appointment ON appointments (consultant_id, appointment_datetime) WHERE status = 'booked';
+CREATE TABLE conversation_history(
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    message_text TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE session_state(
+    session_id TEXT PRIMARY KEY,
+    user_name TEXT,
+    user_email TEXT,
+    requested_service_id INTEGER,
+    requested_consultant_id INTEGER,
+    requested_datetime TEXT,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO services (service_name, description) VALUES
+    ('Technology', 'Consulting on cloud, AI and software implementation.'),
+    ('Sales', 'Consulting on sales strategy, CRM and team training.'),
+    ('Financial', 'Consulting on financial planning, investment, and risk assessment.'),
+    ('Legal', 'Consulting on corporate law, compliance, and contract review.');
+INSERT INTO consultants (name, email, service_id) VALUES
+    ('Josh Matthews', 'josh111@consult.com', 1),
+    ('James Johnson', 'johson123@consult.com', 2),
+    ('Chris Gates', 'gateschris@consult.com', 3),
+    ('David Kim', 'david121@consult.com', 4),
+    ('Sarah Jones', 'sarah234@consult.com', 2);
+INSERT INTO consultant_availability (consultant_id, day_of_week, start_time, end_time)
+    SELECT consultant_id, day, start_time, end_time
+    FROM consultants, (SELECT 0 AS day UNION SELECT 1 UNION SELECT 2 UNION SELECT 3 UNION SELECT 4),
+         (SELECT '10:00' AS start_time, '13:00' AS end_time UNION SELECT '14:00', '19:00');
+'''
+
+# (appointment_id, user_name, user_email, appointment_datetime, consultant_id, service_id, status, created_at, confirmation_sent_at)
+# IDs have gaps, as they do after deletes; Jane booked under three spellings of her email and renamed herself last.
+BASELINE_APPOINTMENTS = [
+    (3, 'Jane', 'Jane@Example.com', _slot(10), 1, 1, 'booked', '2024-01-02 09:00:00', '2024-01-02 09:00:05'),
+    (7, 'Bob', 'bob@example.com', _slot(11), 2, 2, 'cancelled', '2024-01-03 10:00:00', None),
+    (8, 'Bob', 'bob@example.com', _slot(11), 5, 2, 'booked', '2024-01-03 10:05:00', '2024-01-03 10:05:02'),
+    (12, 'Jane D.', ' jane@example.COM ', _slot(15, day=1), 1, 1, 'booked', '2024-01-04 11:00:00', None),
+    (20, 'Jane Doe', 'jane@example.com', _slot(16, day=2), 3, 3, 'rescheduled', '2024-01-05 12:00:00', None),
+]
+
+
+def _baseline_database() -> str:
+    path = f"{tempfile.mkdtemp()}/migration_test.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO appointments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", BASELINE_APPOINTMENTS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _rows(sql: str, params: tuple = ()):
+    conn = db_utils.get_db_connection()
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def check_users_merge_by_normalized_email():
+    users = _rows("SELECT user_id, email, name FROM users ORDER BY email")
+    assert [(u['email'], u['name']) for u in users] == [('bob@example.com', 'Bob'), ('jane@example.com', 'Jane Doe')], users
+
+
+def check_appointments_keep_ids_and_columns():
+    migrated = _rows(
+        """
+        SELECT a.appointment_id, u.email, a.appointment_datetime, a.consultant_id, a.service_id, a.status,
+               a.created_at, a.confirmation_sent_at
+        FROM appointments a JOIN users u ON u.user_id = a.user_id ORDER BY a.appointment_id
+        """
+    )
+    expected = [
+        {'appointment_id': row[0], 'email': db_utils.normalize_email(row[2]), 'appointment_datetime': row[3],
+         'consultant_id': row[4], 'service_id': row[5], 'status': row[6], 'created_at': row[7], 'confirmation_sent_at': row[8]}
+        for row in BASELINE_APPOINTMENTS
+    ]
+    assert migrated == expected, migrated
+
+    columns = {row['name'] for row in _rows("PRAGMA table_info(appointments)")}
+    assert 'user_email' not in columns and 'user_name' not in columns and 'user_id' in columns, columns
+    indexes = {row['name'] for row in _rows("PRAGMA index_list(appointments)")}
+    assert {'idx_unique_booked_appointment', 'idx_appointments_user'} <= indexes, indexes
+    assert _rows("SELECT name FROM sqlite_master WHERE name = 'appointments_migrated'") == []
+
+
+def check_reads_and_writes_work_after_upgrade():
+    jane = db_utils.get_user_appointments('JANE@example.com')
+    assert [a['appointment_id'] for a in jane] == [3, 12], jane
+
+    # The unique booked index still guards the migrated rows; a new booking gets an ID past the old ones.
+    assert isinstance(db_utils.book_appointment('Jane Doe', 'jane@example.com', _slot(10), 1), str), "the slot is taken"
+    assert len(_rows("SELECT 1 FROM appointments WHERE appointment_datetime = ? AND status = 'booked'", (_slot(10),))) == 1
+    new_id = db_utils.book_appointment('Bob', 'Bob@Example.com', _slot(14, day=3), 1)
+    assert isinstance(new_id, int) and new_id > 20, new_id
+    assert len(_rows("SELECT user_id FROM users")) == 2, "an existing user must not be created twice"
+
+
+def check_second_run_is_a_no_op():
+    before = _rows("SELECT * FROM appointments ORDER BY appointment_id"), _rows("SELECT * FROM users ORDER BY user_id")
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        initialize_database(db_utils.DB_PATH)
+    assert "Migrating appointments" not in out.getvalue(), out.getvalue()
+    after = _rows("SELECT * FROM appointments ORDER BY appointment_id"), _rows("SELECT * FROM users ORDER BY user_id")
+    assert before == after
+
+
+def run_migration_tests():
+    print("--- Starting Migration Tests ---")
+    db_utils.DB_PATH = _baseline_database()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        initialize_database(db_utils.DB_PATH)
+    if "Migrated appointments to 2 users." not in out.getvalue():
+        print(out.getvalue())
+
+    checks = [
+        check_users_merge_by_normalized_email,
+        check_appointments_keep_ids_and_columns,
+        check_reads_and_writes_work_after_upgrade,
+        check_second_run_is_a_no_op,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_migration_tests() else 0)
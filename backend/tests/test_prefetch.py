@@ -0,0 +1,95 @@
+import io
+import asyncio
+import tempfile
+import contextlib
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import llm_service, llm_provider, prefetch, rate_limiter
+from backend.tests.fake_llm_provider import FakeAsyncClient, FakeMessage, FakeToolCall
+
+
+SLOT = "2030-01-07 10:00:00" # a Monday
+
+
+def check_predictions():
+    predicted = prefetch.predict_tool_calls("I'm jane@example.com, is Legal free Monday at 10am?")
+    assert predicted == [("get_user_appointments", {"user_email": "jane@example.com"})], predicted
+    # check_availability places a hold, so it is never run speculatively.
+    assert prefetch.predict_tool_calls("is Technology free Monday at 10am?") == []
+
+
+def _scripted_responder(tool_name: str, tool_args: dict):
+    def responder(model, messages, kwargs):
+        if messages[-1].get("role") == "tool":
+            return FakeMessage(content="Done.")
+        return FakeMessage(tool_calls=[FakeToolCall(tool_name, tool_args)])
+    return responder
+
+
+async def _run_turn(message: str, tool_name: str, tool_args: dict):
+    fake = FakeAsyncClient(latency=0.05, responder=_scripted_responder(tool_name, tool_args))
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await llm_service.get_llm_response_with_history(
+            "prefetch_test_session", [{"role": "user", "content": message}], routing_policy="premium"
+        )
+
+
+async def check_tool_call_served_from_prefetch():
+    before = prefetch.stats.snapshot()
+    await _run_turn("Show my bookings, I'm user@example.com", "get_user_appointments", {"user_email": "User@Example.com "})
+    after = prefetch.stats.snapshot()
+    assert after["hits"] == before["hits"] + 1, after
+
+
+async def check_mismatched_args_run_normally():
+    before = prefetch.stats.snapshot()
+    await _run_turn("Show my bookings, I'm user@example.com", "get_user_appointments", {"user_email": "someone.else@example.com"})
+    after = prefetch.stats.snapshot()
+    assert after["hits"] == before["hits"] and after["misses"] == before["misses"] + 1, after
+
+
+async def check_availability_holds_on_the_writer():
+    before = prefetch.stats.snapshot()
+    await _run_turn("Is Technology free on 2030-01-07 10:00?", "check_availability",
+                    {"service_name": "Technology", "requested_datetime_str": SLOT})
+    assert prefetch.stats.snapshot()["started"] == before["started"]
+    conn = db_utils.get_db_connection()
+    try:
+        holds = conn.execute("SELECT session_id, appointment_datetime FROM slot_holds").fetchall()
+    finally:
+        conn.close()
+    assert [tuple(row) for row in holds] == [("prefetch_test_session", SLOT)], [tuple(row) for row in holds]
+
+
+async def run_prefetch_tests():
+    print("--- Starting Speculative Prefetch Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/prefetch_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    checks = [
+        check_predictions,
+        check_tool_call_served_from_prefetch,
+        check_mismatched_args_run_normally,
+        check_availability_holds_on_the_writer,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            result = check()
+            if asyncio.iscoroutine(result):
+                await result
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+    print(f"Prefetch stats: {prefetch.stats.snapshot()}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(run_prefetch_tests()) else 0)
@@ -0,0 +1,89 @@
+import time
+import asyncio
+from types import SimpleNamespace
+from backend.services import rate_limiter
+
+
+def _drained(rpm: int = 600, tpm: int = 60000, max_wait: float = 5.0):
+    """A scheduler whose buckets start empty, so every request has to wait for the refill."""
+    scheduler = rate_limiter.RateLimitScheduler(rpm, tpm, max_wait)
+    scheduler.requests.level = 0
+    scheduler.tokens.level = 0
+    return scheduler
+
+
+async def check_requests_wait_for_rpm_refill():
+    scheduler = _drained(rpm=600) # 10 requests per second
+    started = time.perf_counter()
+    await asyncio.gather(*(scheduler.acquire("s1", 10) for _ in range(3)))
+    elapsed = time.perf_counter() - started
+    assert 0.25 <= elapsed < 1.0, f"3 requests at 10 rps took {elapsed:.2f}s"
+    assert scheduler.stats()["wait_ms"]["max"] >= 250
+
+
+async def check_tokens_limit_admission():
+    scheduler = _drained(rpm=0, tpm=60000) # 1000 tokens per second, no request limit
+    started = time.perf_counter()
+    await scheduler.acquire("s1", 500)
+    elapsed = time.perf_counter() - started
+    assert 0.4 <= elapsed < 0.9, f"500 tokens at 1000 tps took {elapsed:.2f}s"
+
+
+async def check_sessions_are_served_round_robin():
+    scheduler = _drained(rpm=1200)
+    order = []
+
+    async def request(session_id, label):
+        await scheduler.acquire(session_id, 10)
+        order.append(label)
+
+    # The busy session queues five requests before the quiet one arrives; the quiet one must not wait behind all five.
+    tasks = [asyncio.create_task(request("busy", f"busy{i}")) for i in range(5)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("quiet", "quiet")))
+    await asyncio.gather(*tasks)
+    assert order.index("quiet") <= 1, order
+
+
+async def check_queue_timeout_gives_retry_after():
+    scheduler = _drained(rpm=6, max_wait=0.1) # one request every 10 seconds
+    try:
+        await scheduler.acquire("s1", 10)
+        raise AssertionError("expected RateLimitQueueTimeout")
+    except rate_limiter.RateLimitQueueTimeout as e:
+        assert e.retry_after >= 1, e.retry_after
+    assert scheduler.stats()["timed_out"] == 1
+    assert scheduler.queue_depth == 0, "timed out waiter left in the queue"
+
+
+async def check_settle_refunds_over_estimate():
+    scheduler = rate_limiter.RateLimitScheduler(rpm=0, tpm=60000)
+    await scheduler.acquire("s1", 5000)
+    level_after_acquire = scheduler.tokens.level
+    scheduler.settle(5000, SimpleNamespace(total_tokens=1000))
+    assert scheduler.tokens.level >= level_after_acquire + 3900, scheduler.tokens.level
+
+
+async def run_rate_limiter_tests():
+    print("--- Starting LLM Rate Limiter Tests ---")
+    checks = [
+        check_requests_wait_for_rpm_refill,
+        check_tokens_limit_admission,
+        check_sessions_are_served_round_robin,
+        check_queue_timeout_gives_retry_after,
+        check_settle_refunds_over_estimate,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            await check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(run_rate_limiter_tests()) else 0)
@@ -0,0 +1,133 @@
+import io
+import time
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import llm_service, model_routing
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _join_query(service_name: str, requested_datetime_str: str, session_id: str | None = None):
+    """The availability query as it was before the snapshot: services and consultant_availability joined on every call."""
+    dt = datetime.fromisoformat(requested_datetime_str)
+    conn = db_utils.get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT c.consultant_id, c.name
+            FROM consultants c
+            JOIN services s ON c.service_id = s.service_id
+            JOIN consultant_availability ca ON c.consultant_id = ca.consultant_id
+            WHERE s.service_name = ? AND ca.day_of_week = ? AND ? >= ca.start_time AND ? <= time(ca.end_time, '-60 minutes')
+              AND c.consultant_id NOT IN (
+                SELECT consultant_id FROM appointments WHERE status = 'booked'
+                AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes'))
+              AND c.consultant_id NOT IN (
+                SELECT consultant_id FROM slot_holds WHERE expires_at > ?
+                AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes')
+                AND session_id IS NOT ?)
+            ORDER BY c.consultant_id
+            """,
+            (service_name, dt.weekday(), dt.strftime('%H:%M'), dt.strftime('%H:%M'), requested_datetime_str, requested_datetime_str,
+             datetime.now().strftime('%Y-%m-%d %H:%M:%S'), requested_datetime_str, requested_datetime_str, session_id)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def check_availability_matches_join_query():
+    slot = lambda days, hour, minute=0: (MONDAY + timedelta(days=days, hours=hour, minutes=minute)).strftime('%Y-%m-%d %H:%M:%S')
+    assert isinstance(db_utils.book_appointment('Ref User', 'ref@example.com', slot(0, 10), 1), int)
+    assert isinstance(db_utils.book_appointment('Ref User', 'ref@example.com', slot(1, 15), 2), int)
+    assert db_utils.hold_slot('other_session', 'Sales', slot(2, 11), 5)
+
+    compared = 0
+    for service in db_utils.get_all_services():
+        for days in range(7):
+            for hour in range(8, 21):
+                for minute in (0, 30):
+                    requested = slot(days, hour, minute)
+                    expected = _join_query(service['service_name'], requested, 'my_session')
+                    actual = db_utils.check_availability(service['service_name'], requested, 'my_session')
+                    assert actual == expected, (service['service_name'], requested, actual, expected)
+                    compared += 1
+    assert db_utils.check_availability('Astrology', slot(0, 10)) == []
+    assert compared == 4 * 7 * 13 * 2, compared
+
+
+def check_changes_are_picked_up():
+    before = db_utils.get_reference_data()
+    saturday_noon = (MONDAY + timedelta(days=5, hours=12)).strftime('%Y-%m-%d %H:%M:%S')
+    assert db_utils.check_availability('Technology', saturday_noon) == [{'consultant_id': 7, 'name': 'Emilie Johnson'}]
+
+    db_utils.run_write(lambda conn: conn.execute(
+        "INSERT INTO consultant_availability (consultant_id, day_of_week, start_time, end_time) VALUES (1, 5, '12:00', '14:00')"
+    ))
+    # Still within the check interval: the old snapshot is served.
+    assert db_utils.get_reference_data() is before
+    time.sleep(db_utils.REFERENCE_DATA_CHECK_SECONDS + 0.05)
+    after = db_utils.get_reference_data()
+    assert after.version > before.version, (before.version, after.version)
+    assert [c['consultant_id'] for c in db_utils.check_availability('Technology', saturday_noon)] == [1, 7]
+    # Unchanged tables: the next check keeps the same snapshot.
+    time.sleep(db_utils.REFERENCE_DATA_CHECK_SECONDS + 0.05)
+    assert db_utils.get_reference_data() is after
+
+
+def check_tools_and_prompt_come_from_snapshot():
+    db_utils.run_write(lambda conn: conn.execute("INSERT INTO services (service_name, description) VALUES ('Marketing', 'Campaigns')"))
+    time.sleep(db_utils.REFERENCE_DATA_CHECK_SECONDS + 0.05)
+    tools, prompt = llm_service.tools_and_prompt()
+    assert "5=Marketing" in prompt and "1=Technology" in prompt, prompt[:300]
+    properties = {tool["function"]["name"]: tool["function"]["parameters"]["properties"] for tool in tools}
+    assert properties["book_appointment"]["service_id"]["enum"] == [1, 2, 3, 4, 5]
+    assert "5=Marketing" in properties["modify_appointment_service"]["new_service_id"]["description"]
+    assert "'Marketing'" in properties["check_availability"]["service_name"]["description"]
+    assert "{service" not in str(tools), "unfilled placeholder in tool schema"
+    assert llm_service.tools_and_prompt()[0] is tools # cached until the version moves
+
+    class _Call:
+        type = "function"
+        def __init__(self, name, arguments):
+            self.function = type("F", (), {"name": name, "arguments": arguments})()
+    bad = _Call("book_appointment", '{"user_name": "A", "user_email": "a@b.c", "appt_datetime": "2030-01-01 10:00:00", "service_id": 9}')
+    assert "service_id" in (model_routing.invalid_tool_call_reason([bad], tools) or ""), "unknown service id not rejected"
+
+
+def run_reference_data_tests():
+    print("--- Starting Reference Data Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/reference_data_test.db"
+    db_utils.REFERENCE_DATA_CHECK_SECONDS = 0.2
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+        db_utils.load_reference_data()
+
+    checks = [
+        check_availability_matches_join_query,
+        check_changes_are_picked_up,
+        check_tools_and_prompt_come_from_snapshot,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"Reference data: {db_utils.reference_data_stats()}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_reference_data_tests() else 0)
@@ -0,0 +1,207 @@
+import io
+import asyncio
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import email_service, reminder_service
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _slot(hour: int, day: int = 0) -> datetime:
+    return MONDAY + timedelta(days=day, hours=hour)
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class FakeClock:
+    """Stands in for reminder_service.datetime, so the scheduler loop runs on a clock the test moves."""
+
+    def __init__(self, now: datetime):
+        self.now_value = now
+        clock = self
+
+        class ClockedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now_value
+
+        self.datetime = ClockedDatetime
+
+
+@contextlib.contextmanager
+def _fake_emails(failing: tuple = ()):
+    """Replaces the SMTP batch sender; yields the (appointment_id, action) pairs it was asked to send."""
+    sent = []
+    original = email_service.send_appointment_emails_batch
+
+    def fake_batch(items):
+        sent.extend((item['appointment_id'], item['action']) for item in items)
+        return {item['appointment_id']: item['appointment_id'] not in failing for item in items}
+
+    email_service.send_appointment_emails_batch = fake_batch
+    try:
+        yield sent
+    finally:
+        email_service.send_appointment_emails_batch = original
+
+
+def _fresh_database():
+    """Each check starts empty: the scheduler loads every pending reminder that is due, including earlier checks'."""
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/reminders_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+
+def _reminders(appointment_id: int):
+    conn = db_utils.get_db_connection()
+    try:
+        return {row['reminder_type']: (row['due_at'], row['status']) for row in conn.execute(
+            "SELECT reminder_type, due_at, status FROM reminders WHERE appointment_id = ? ORDER BY reminder_id", (appointment_id,))}
+    finally:
+        conn.close()
+
+
+def _book(name: str, slot: datetime, service_id: int = 1):
+    appointment_id = db_utils.book_appointment(name, f"{name.lower()}@example.com", _fmt(slot), service_id)
+    assert isinstance(appointment_id, int), appointment_id
+    return appointment_id
+
+
+def check_due_times():
+    _fresh_database()
+    slot = _slot(10)
+    appointment_id = _book('Dana', slot)
+    assert _reminders(appointment_id) == {
+        '24h': (_fmt(slot - timedelta(hours=24)), 'pending'),
+        '1h': (_fmt(slot - timedelta(hours=1)), 'pending'),
+    }, _reminders(appointment_id)
+
+    # An appointment less than a day away only gets its 1h reminder.
+    soon = (datetime.now() + timedelta(hours=5)).replace(microsecond=0)
+    db_utils.run_write(lambda conn: db_utils._plan_reminders(conn, appointment_id, _fmt(soon)))
+    reminders = _reminders(appointment_id)
+    assert reminders['24h'][1] == 'cancelled' and reminders['1h'] == (_fmt(soon - timedelta(hours=1)), 'pending'), reminders
+    db_utils.run_write(lambda conn: db_utils._plan_reminders(conn, appointment_id, _fmt(slot))) # back as it was
+
+
+def check_heap_matches_table():
+    _fresh_database()
+    slot = _slot(11, day=1)
+    appointment_id = _book('Eli', slot)
+    scheduler = reminder_service.ReminderScheduler(lookahead=timedelta(minutes=60))
+    now = slot - timedelta(hours=24, minutes=30)
+
+    scheduler._refill(now)
+    pending = {row['reminder_id'] for row in db_utils.get_pending_reminders(_fmt(now + scheduler.lookahead))}
+    assert {reminder_id for _, reminder_id in scheduler._heap} == pending == scheduler._queued, (scheduler._heap, pending)
+    assert scheduler._heap[0][0] == _fmt(slot - timedelta(hours=24)), scheduler._heap
+    # It sleeps until the next refill or the earliest reminder, whichever comes first.
+    expected_sleep = min(30 * 60, reminder_service.REMINDER_REFILL_INTERVAL.total_seconds())
+    assert scheduler._seconds_until_next_event(now) == expected_sleep, scheduler._seconds_until_next_event(now)
+    scheduler._refill(now) # refilling again must not queue anything twice
+    assert len(scheduler._heap) == len(pending)
+
+    assert scheduler._pop_due(now) == [], "nothing is due yet"
+    with _fake_emails() as sent:
+        due = scheduler._pop_due(now + timedelta(minutes=30))
+        scheduler._fire(due)
+    assert (appointment_id, 'reminder_24h') in sent and _reminders(appointment_id)['24h'][1] == 'sent', (sent, _reminders(appointment_id))
+    assert _reminders(appointment_id)['1h'][1] == 'pending' and scheduler.sent_count == len(due)
+
+
+def check_reschedule_and_cancel_replan():
+    _fresh_database()
+    slot = _slot(15, day=2)
+    moved = _book('Fay', slot)
+    cancelled = _book('Gus', slot + timedelta(hours=1))
+    scheduler = reminder_service.ReminderScheduler(lookahead=timedelta(hours=3))
+    now = slot - timedelta(hours=24, minutes=10)
+    scheduler._refill(now)
+    queued_before = set(scheduler._queued)
+
+    new_slot = slot + timedelta(days=1, hours=2)
+    assert db_utils.reschedule_appointment(moved, 'fay@example.com', _fmt(new_slot)) is True
+    assert db_utils.cancel_appointment(cancelled, 'gus@example.com') is True
+    assert _reminders(moved)['24h'] == (_fmt(new_slot - timedelta(hours=24)), 'pending'), _reminders(moved)
+    assert _reminders(cancelled) == {
+        '24h': (_fmt(slot + timedelta(hours=1) - timedelta(hours=24)), 'cancelled'),
+        '1h': (_fmt(slot), 'cancelled'),
+    }, _reminders(cancelled)
+
+    # The heap still holds the old entries; firing them sends nothing because the table no longer has them pending.
+    with _fake_emails() as sent:
+        due = scheduler._pop_due(now + timedelta(hours=2))
+        assert set(due) == queued_before, (due, queued_before)
+        scheduler._fire(due)
+    assert sent == [] and scheduler.sent_count == 0, sent
+
+    scheduler._refill(new_slot - timedelta(hours=24, minutes=10))
+    assert any(due_at == _fmt(new_slot - timedelta(hours=24)) for due_at, _ in scheduler._heap), scheduler._heap
+
+
+def check_scheduler_loop_on_fake_clock():
+    _fresh_database()
+    slot = _slot(16, day=3)
+    appointment_id = _book('Hal', slot)
+    failing = _book('Ivy', slot, service_id=2)
+    clock = FakeClock(slot - timedelta(hours=24, minutes=5))
+    original = reminder_service.datetime
+    reminder_service.datetime = clock.datetime
+    scheduler = reminder_service.ReminderScheduler(lookahead=timedelta(minutes=90))
+
+    async def run():
+        scheduler.start()
+        await asyncio.sleep(0.2)
+        assert sent == [], "the 24h reminders are not due yet"
+        clock.now_value = slot - timedelta(hours=23, minutes=59)
+        scheduler.wake()
+        for _ in range(50):
+            if scheduler.sent_count + scheduler.failed_count >= 2:
+                break
+            await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    try:
+        with _fake_emails(failing=(failing,)) as sent:
+            asyncio.run(run())
+    finally:
+        reminder_service.datetime = original
+
+    assert sorted(sent) == sorted([(appointment_id, 'reminder_24h'), (failing, 'reminder_24h')]), sent
+    assert _reminders(appointment_id)['24h'][1] == 'sent' and _reminders(failing)['24h'][1] == 'failed'
+    assert _reminders(appointment_id)['1h'][1] == 'pending', "the 1h reminder is not due yet"
+    assert scheduler.stats()['sent'] == 1 and scheduler.stats()['failed'] == 1, scheduler.stats()
+
+
+def run_reminder_tests():
+    print("--- Starting Reminder Scheduler Tests ---")
+    checks = [
+        check_due_times,
+        check_heap_matches_table,
+        check_reschedule_and_cancel_replan,
+        check_scheduler_loop_on_fake_clock,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_reminder_tests() else 0)
@@ -0,0 +1,109 @@
+import io
+import os
+import glob
+import asyncio
+import tempfile
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import retention_service
+
+
+NOW = datetime.now(timezone.utc)
+
+
+def _ts(days_ago: float) -> str:
+    return (NOW - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _seed():
+    """Old sessions with long transcripts, one old session that is active again, a recent one and an old state-only one."""
+    def seed(conn):
+        for i in range(300):
+            session_id = f"old_{i:04d}"
+            conn.executemany(
+                "INSERT INTO conversation_history (session_id, role, message_text, timestamp) VALUES (?, ?, ?, ?)",
+                [(session_id, 'user' if n % 2 == 0 else 'ai', f"message {n} " + "x" * 400, _ts(90 - n / 100)) for n in range(20)],
+            )
+        conn.execute("INSERT INTO session_state (session_id, user_email, last_updated) VALUES ('old_0000', 'a@example.com', ?)", (_ts(90),))
+        conn.execute("INSERT INTO conversation_history (session_id, role, message_text, timestamp) VALUES ('old_0001', 'user', 'back again', ?)", (_ts(1),))
+        conn.execute("INSERT INTO conversation_history (session_id, role, message_text, timestamp) VALUES ('recent', 'user', 'hello', ?)", (_ts(2),))
+        conn.execute("INSERT INTO session_state (session_id, user_email, last_updated) VALUES ('state_only', 'b@example.com', ?)", (_ts(60),))
+    db_utils.run_write(seed)
+
+
+def _count(sql: str, *params):
+    conn = db_utils.get_db_connection()
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def check_expired_sessions_are_archived_and_deleted(job):
+    archived, _ = await job.run_once()
+    assert archived == 300, archived # 299 old transcripts (old_0001 is active again) + state_only
+    assert _count("SELECT COUNT(*) FROM conversation_history WHERE session_id LIKE 'old_%' AND session_id != 'old_0001'") == 0
+    assert _count("SELECT COUNT(*) FROM conversation_history WHERE session_id = 'old_0001'") == 21
+    assert _count("SELECT COUNT(*) FROM conversation_history WHERE session_id = 'recent'") == 1
+    assert _count("SELECT COUNT(*) FROM session_state") == 0
+
+
+def check_archive_contents(job):
+    files = glob.glob(os.path.join(job.archive_dir, f"conversations-*{retention_service.ARCHIVE_EXTENSION}"))
+    assert files, "no archive files written"
+    sessions = {session['session_id']: session for path in files for session in retention_service.read_archive(path)}
+    assert len(sessions) == 300, len(sessions)
+    assert len(sessions['old_0000']['messages']) == 20 and sessions['old_0000']['state']['user_email'] == 'a@example.com'
+    assert sessions['state_only']['messages'] == [] and sessions['state_only']['state']['user_email'] == 'b@example.com'
+    expected_file = retention_service.archive_path(sessions['old_0000']['last_activity'][:7], job.archive_dir)
+    assert expected_file in files, (expected_file, files)
+
+
+async def check_vacuum_returns_pages(job):
+    # run_once already vacuumed within its time budget; a second pass must find nothing left to free.
+    free_pages, auto_vacuum = db_utils.get_freelist_pages()
+    assert auto_vacuum == 2, auto_vacuum
+    assert job.vacuumed_pages > 0, job.stats()
+    assert free_pages == 0, free_pages
+
+
+async def run_retention_tests():
+    print("--- Starting Retention Tests ---")
+    workdir = tempfile.mkdtemp()
+    db_utils.DB_PATH = f"{workdir}/retention_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    _seed()
+    size_before = os.path.getsize(db_utils.DB_PATH) + os.path.getsize(f"{db_utils.DB_PATH}-wal")
+    job = retention_service.RetentionJob(retention_days=30, batch_size=50, archive_dir=f"{workdir}/archive")
+
+    checks = [
+        check_expired_sessions_are_archived_and_deleted,
+        check_archive_contents,
+        check_vacuum_returns_pages,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = check(job)
+                if asyncio.iscoroutine(result):
+                    await result
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop() # checkpoints the WAL into the main file
+    print(f"Database + WAL: {size_before // 1024} KB before, {os.path.getsize(db_utils.DB_PATH) // 1024} KB after; "
+          f"archive ({job.stats()['compression']}): {sum(os.path.getsize(p) for p in glob.glob(f'{workdir}/archive/*')) // 1024} KB")
+    print(f"Retention stats: {job.stats()}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(run_retention_tests()) else 0)
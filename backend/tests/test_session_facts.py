@@ -0,0 +1,98 @@
+import io
+import tempfile
+import contextlib
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import session_facts
+
+
+def check_extract_facts_from_arguments_and_results():
+    facts = session_facts.extract_facts('book_appointment', {
+        'user_name': 'Jane', 'user_email': ' jane@example.com ', 'appt_datetime': '2030-01-07 10:00:00', 'service_id': 2}, "ok")
+    assert facts == {'user_name': 'Jane', 'user_email': 'jane@example.com',
+                     'requested_service_id': 2, 'requested_datetime': '2030-01-07 10:00:00'}, facts
+
+    # new_* arguments win over the originals; a service name is resolved to its id.
+    facts = session_facts.extract_facts('modify_appointment', {'service_id': 1, 'new_service_id': 3}, "ok")
+    assert facts == {'requested_service_id': 3}, facts
+    facts = session_facts.extract_facts('check_availability', {'service_name': ' sales ', 'requested_datetime_str': '2030-01-07 15:00:00'},
+                                        [{'consultant_id': 5, 'name': 'Sarah Jones'}, {'consultant_id': 2, 'name': 'James Johnson'}])
+    assert facts == {'requested_service_id': 2, 'requested_datetime': '2030-01-07 15:00:00', 'requested_consultant_id': 5}, facts
+
+    # The slot the search found replaces the one it started from.
+    facts = session_facts.extract_facts('find_next_available_slot', {'service_name': 'Technology', 'start_datetime_str': '2030-01-07 09:00:00'},
+                                        ('2030-01-07 10:00:00', {'consultant_id': 1}))
+    assert facts['requested_datetime'] == '2030-01-07 10:00:00' and facts['requested_consultant_id'] == 1, facts
+    assert session_facts.extract_facts('find_next_available_slot', {}, (None, None)) == {}
+    assert session_facts.extract_facts('check_availability', {'service_name': 'Unknown'}, []) == {}
+
+
+def check_record_tool_call_persists_and_caches():
+    session_id = 'facts_session'
+    assert session_facts.get_facts(session_id) == {}
+    session_facts.record_tool_call(session_id, 'check_availability',
+                                   {'service_name': 'Sales', 'requested_datetime_str': '2030-01-08 11:00:00'}, [{'consultant_id': 2}])
+    session_facts.record_tool_call(session_id, 'book_appointment',
+                                   {'user_name': 'Sam', 'user_email': 'sam@example.com', 'appt_datetime': '2030-01-08 11:00:00', 'service_id': 2}, 7)
+    expected = {'user_name': 'Sam', 'user_email': 'sam@example.com', 'requested_service_id': 2,
+                'requested_consultant_id': 2, 'requested_datetime': '2030-01-08 11:00:00'}
+    assert session_facts.get_facts(session_id) == expected, session_facts.get_facts(session_id)
+
+    # A cold cache reloads the same facts from session_state.
+    session_facts.facts_cache = session_facts.SessionFactsCache()
+    assert session_facts.get_facts(session_id) == expected, session_facts.get_facts(session_id)
+
+    cache = session_facts.SessionFactsCache(max_entries=2)
+    for key in 'abc':
+        cache.put(key, {'user_name': key})
+    assert cache.get('a') is None and cache.get('c') == {'user_name': 'c'}, "the least recently used session should be evicted"
+
+
+def check_facts_block():
+    block = session_facts.build_facts_block({'user_name': 'Sam', 'user_email': 'sam@example.com', 'requested_service_id': 2,
+                                             'requested_datetime': '2030-01-08 11:00:00', 'requested_consultant_id': 2})
+    assert block.endswith("name=Sam; email=sam@example.com; service=Sales (id 2); datetime=2030-01-08 11:00:00; consultant_id=2"), block
+    assert session_facts.build_facts_block({'user_name': 'Sam'}).endswith("do not ask again): name=Sam")
+
+
+def check_trim_history_starts_at_a_user_message():
+    history = [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': str(i)} for i in range(10)]
+    assert session_facts.trim_history(history, 0) == history and session_facts.trim_history(history, 10) == history
+    assert [m['content'] for m in session_facts.trim_history(history, 4)] == ['6', '7', '8', '9']
+    # An odd window would start at an assistant reply; it is dropped.
+    assert [m['content'] for m in session_facts.trim_history(history, 5)] == ['6', '7', '8', '9']
+    # No user message in the window: only the last message is kept.
+    assistant_only = [{'role': 'user', 'content': 'hi'}] + [{'role': 'assistant', 'content': str(i)} for i in range(4)]
+    assert session_facts.trim_history(assistant_only, 3) == [{'role': 'assistant', 'content': '3'}]
+
+
+def run_session_facts_tests():
+    print("--- Starting Session Facts Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/session_facts_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_extract_facts_from_arguments_and_results,
+        check_record_tool_call_persists_and_caches,
+        check_facts_block,
+        check_trim_history_starts_at_a_user_message,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_session_facts_tests() else 0)
@@ -0,0 +1,124 @@
+import io
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _slot(hour: int, minute: int = 0, day: int = 0) -> str:
+    return (MONDAY + timedelta(days=day, hours=hour, minutes=minute)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _concurrently(*calls):
+    """Runs the calls on separate threads released at the same moment; returns their results in order."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(i, call):
+        barrier.wait()
+        results[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _booked_at(slot: str):
+    conn = db_utils.get_db_connection()
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT consultant_id FROM appointments WHERE status = 'booked' AND appointment_datetime = ?", (slot,))]
+    finally:
+        conn.close()
+
+
+def check_concurrent_holds_on_one_consultant():
+    # Technology on weekdays has one consultant: both sessions see them free, only one may hold them.
+    slot = _slot(10)
+    sessions = ('hold_session_a', 'hold_session_b')
+    seen = _concurrently(*[lambda s=s: db_utils.check_availability('Technology', slot, s) for s in sessions])
+    assert all(len(available) == 1 for available in seen), seen
+    holds = _concurrently(*[
+        lambda s=s, a=a: db_utils.hold_slot(s, 'Technology', slot, a[0]['consultant_id']) for s, a in zip(sessions, seen)
+    ])
+    assert sorted(hold is None for hold in holds) == [False, True], holds
+
+    winner = 0 if holds[0] else 1
+    loser = 1 - winner
+    booked = db_utils.book_appointment('Holder', 'holder@example.com', slot, 1,
+                                       hold_token=holds[winner]['hold_token'], session_id=sessions[winner])
+    assert isinstance(booked, int), booked
+    failed = db_utils.book_appointment('Other', 'other@example.com', slot, 1, session_id=sessions[loser])
+    assert failed == f"Booking failed: No consultants available for Technology at {slot}.", failed
+
+
+def check_concurrent_holds_spread_over_consultants():
+    # Sales on weekdays has two consultants: both sessions ask for the first, each ends up holding a different one.
+    slot = _slot(11, day=1)
+    first = db_utils.check_availability('Sales', slot)[0]['consultant_id']
+    holds = _concurrently(*[lambda s=s: db_utils.hold_slot(s, 'Sales', slot, first) for s in ('spread_a', 'spread_b')])
+    assert all(holds) and holds[0]['consultant_id'] != holds[1]['consultant_id'], holds
+    results = _concurrently(*[
+        lambda s=s, h=h: db_utils.book_appointment(s, f"{s}@example.com", slot, 2, hold_token=h['hold_token'], session_id=s)
+        for s, h in zip(('spread_a', 'spread_b'), holds)
+    ])
+    assert all(isinstance(result, int) for result in results), results
+    assert sorted(_booked_at(slot)) == sorted(hold['consultant_id'] for hold in holds)
+
+
+def check_stale_hold_does_not_double_book():
+    # A booking at 15:44 lands after a hold for 15:30 was placed (e.g. the hold predates the booking's check).
+    held_slot, booked_slot = _slot(15, 30, day=2), _slot(15, 44, day=2)
+    assert isinstance(db_utils.book_appointment('Early', 'early@example.com', booked_slot, 1), int)
+    expires_at = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
+    db_utils.run_write(lambda conn: conn.execute(
+        """
+        INSERT INTO slot_holds (hold_token, session_id, consultant_id, service_id, appointment_datetime, expires_at)
+        VALUES ('stale-token', 'stale_session', 1, 1, ?, ?)
+        """,
+        (held_slot, expires_at)
+    ))
+    result = db_utils.book_appointment('Late', 'late@example.com', held_slot, 1, hold_token='stale-token', session_id='stale_session')
+    assert result == f"Booking failed: No consultants available for Technology at {held_slot}.", result
+    assert _booked_at(held_slot) == [], "the held consultant was booked on top of an overlapping appointment"
+    # Nobody free also means nothing to hold.
+    assert db_utils.hold_slot('stale_session', 'Technology', held_slot, 1) is None
+
+
+def run_slot_hold_tests():
+    print("--- Starting Slot Hold Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/slot_holds_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_concurrent_holds_on_one_consultant,
+        check_concurrent_holds_spread_over_consultants,
+        check_stale_hold_does_not_double_book,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_slot_hold_tests() else 0)
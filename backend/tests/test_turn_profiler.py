@@ -0,0 +1,155 @@
+import io
+import json
+import time
+import asyncio
+import tempfile
+import contextlib
+
+from backend.services import turn_profiler
+
+
+ADMIN_TOKEN = 'profile-admin'
+HISTORY = [{'role': 'user', 'content': 'I would like to book a Technology consultation next Monday at 10. ' * 20}] * 200
+
+
+def _burn(seconds: float):
+    """Busy work that shows up on the CPU, the way validation and JSON handling of a long history do."""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        json.loads(json.dumps(HISTORY))
+
+
+def blocking_tool_call():
+    _burn(0.05)
+
+
+async def child_task_work():
+    _burn(0.05)
+
+
+async def slow_llm_call():
+    await asyncio.sleep(0.1)
+
+
+async def chat_turn_app(scope, receive, send):
+    """Stands in for the FastAPI app: a turn that computes, awaits an LLM, spawns a task and calls a tool in a thread."""
+    await receive()
+    _burn(0.05)
+    turn_profiler.profiler.tag(session_id='profiled_session')
+    await slow_llm_call()
+    await asyncio.create_task(child_task_work())
+    await asyncio.to_thread(blocking_tool_call)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+async def unprofiled_neighbour():
+    """Another request on the same loop, never profiled."""
+    for _ in range(10):
+        _burn(0.01)
+        await asyncio.sleep(0.01)
+
+
+async def _request(middleware, headers: dict):
+    scope = {'type': 'http', 'method': 'POST', 'path': '/chat_turn',
+             'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'{}', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return dict(sent[0]['headers'])
+
+
+def _stacks(profile_id: str):
+    folded = turn_profiler.profiler.read_profile(profile_id)
+    assert folded, profile_id
+    stacks = {}
+    for line in folded.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        stacks[stack] = int(count)
+    return stacks
+
+
+def _samples(stacks: dict, kind: str, function: str):
+    return sum(count for stack, count in stacks.items() if stack.split(';')[1] == kind and f";{function} (" in stack)
+
+
+def check_profile_covers_the_whole_turn():
+    middleware = turn_profiler.ProfilingMiddleware(chat_turn_app, admin_token=ADMIN_TOKEN, sample_percent=0)
+
+    async def run():
+        return (await asyncio.gather(
+            _request(middleware, {'X-Profile': '1', 'X-Admin-Token': ADMIN_TOKEN}), unprofiled_neighbour()))[0]
+
+    headers = asyncio.run(run())
+    profile_id = headers[b'x-profile-id'].decode()
+    stacks = _stacks(profile_id)
+    assert all(stack.startswith('POST /chat_turn;') for stack in stacks), list(stacks)[:3]
+    assert _samples(stacks, 'cpu', 'chat_turn_app') > 0, "time spent in the endpoint itself"
+    assert _samples(stacks, 'cpu', 'child_task_work') > 0, "a task created by the turn"
+    assert _samples(stacks, 'thread', 'blocking_tool_call') > 0, "an asyncio.to_thread call made by the turn"
+    assert _samples(stacks, 'waiting', 'slow_llm_call') > 0, "time suspended in an await"
+    assert not any('unprofiled_neighbour' in stack for stack in stacks), "another request's work was attributed"
+
+    [meta] = turn_profiler.profiler.list_profiles()
+    assert meta['profile_id'] == profile_id and meta['session_id'] == 'profiled_session', meta
+    assert meta['reason'] == 'header' and meta['status_code'] == 200 and meta['duration_ms'] >= 250, meta
+    # While the turn holds the GIL the sampler only gets it every switch interval (5 ms), so expect at least that rate.
+    assert meta['samples'] > meta['duration_ms'] / 10, meta
+
+
+def check_opt_in_only():
+    quiet = turn_profiler.ProfilingMiddleware(chat_turn_app, admin_token=ADMIN_TOKEN, sample_percent=0)
+    assert b'x-profile-id' not in asyncio.run(_request(quiet, {}))
+    assert b'x-profile-id' not in asyncio.run(_request(quiet, {'X-Profile': '1', 'X-Admin-Token': 'wrong'}))
+    no_token = turn_profiler.ProfilingMiddleware(chat_turn_app, admin_token=None, sample_percent=0)
+    assert b'x-profile-id' not in asyncio.run(_request(no_token, {'X-Profile': '1'})), "anyone could turn profiling on"
+    assert b'x-profile-id' not in asyncio.run(_request(no_token, {'X-Profile': '1', 'X-Admin-Token': ''}))
+    sampled = turn_profiler.ProfilingMiddleware(chat_turn_app, admin_token=ADMIN_TOKEN, sample_percent=100)
+    profile_id = asyncio.run(_request(sampled, {}))[b'x-profile-id'].decode()
+    assert turn_profiler.profiler.list_profiles()[0]['reason'] == 'sampled'
+    assert turn_profiler.profiler.read_profile(profile_id)
+
+
+def check_retention_and_ids():
+    middleware = turn_profiler.ProfilingMiddleware(chat_turn_app, sample_percent=100)
+    for _ in range(3):
+        asyncio.run(_request(middleware, {}))
+    profiles = turn_profiler.profiler.list_profiles()
+    assert len(profiles) == turn_profiler.profiler.max_files == 3, profiles
+    assert all(turn_profiler.profiler.read_profile(meta['profile_id']) for meta in profiles)
+    assert turn_profiler.profiler.read_profile('../../etc/passwd') is None
+    assert turn_profiler.profiler.read_profile('20990101T000000000000-00000000') is None
+    assert turn_profiler.profiler.stats()['active'] == 0
+
+
+def run_turn_profiler_tests():
+    print("--- Starting Turn Profiler Tests ---")
+    turn_profiler.profiler = turn_profiler.TurnProfiler(interval_ms=1, profile_dir=tempfile.mkdtemp(), max_files=3)
+
+    checks = [
+        check_profile_covers_the_whole_turn,
+        check_opt_in_only,
+        check_retention_and_ids,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_turn_profiler_tests() else 0)
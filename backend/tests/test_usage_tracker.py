@@ -0,0 +1,125 @@
+import io
+import asyncio
+import tempfile
+import contextlib
+from types import SimpleNamespace
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import llm_service, llm_provider, model_routing, rate_limiter, usage_tracker
+from backend.tests.fake_llm_provider import FakeAsyncClient, FakeMessage
+
+
+def _usage(prompt_tokens: int, completion_tokens: int):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+async def check_batched_writes_and_aggregates():
+    tracker = usage_tracker.UsageTracker(flush_interval=60, batch_size=1000)
+    for iteration in range(3):
+        tracker.record("usage_a", "gpt-4o", iteration, _usage(1000, 100))
+    tracker.record("usage_b", "gpt-4o-mini", 0, _usage(500, 50))
+    assert db_utils.get_session_usage("usage_a") is None, "calls were written before the flush"
+    assert tracker.session_totals("usage_a")["tokens"] == 3300
+
+    await tracker.flush()
+    totals = db_utils.get_session_usage("usage_a")
+    assert totals["calls"] == 3 and totals["prompt_tokens"] == 3000 and totals["completion_tokens"] == 300, totals
+    expected_cost = 3 * model_routing.estimate_cost("gpt-4o", _usage(1000, 100))
+    assert abs(totals["cost_usd"] - expected_cost) < 1e-9, totals
+    assert len(db_utils.get_session_usage_calls("usage_a")) == 3
+
+    today = db_utils.get_daily_usage("0000-01-01", "9999-12-31")
+    models = {row["model"]: row["calls"] for row in today}
+    assert models.get("gpt-4o") == 3 and models.get("gpt-4o-mini") == 1, today
+    top = db_utils.get_top_sessions_by_cost("0000-01-01 00:00:00", limit=1)
+    assert top and top[0]["session_id"] == "usage_a", top
+
+
+async def check_totals_survive_a_cold_cache():
+    tracker = usage_tracker.UsageTracker(flush_interval=60, batch_size=1000)
+    tracker.record("usage_c", "gpt-4o", 0, _usage(2000, 0))
+    await tracker.flush()
+    tracker.record("usage_c", "gpt-4o", 1, _usage(2000, 0)) # buffered, not yet written
+
+    fresh = usage_tracker.UsageTracker()
+    fresh._pending = list(tracker._pending)
+    assert fresh.session_totals("usage_c")["tokens"] == 4000, fresh.session_totals("usage_c")
+
+
+async def check_failed_flushes_are_capped():
+    tracker = usage_tracker.UsageTracker(flush_interval=60, batch_size=10, max_pending=25)
+    tracker._full = asyncio.Event() # as if the flush task were running, so record() never writes inline
+    original = db_utils.record_llm_usage
+    db_utils.record_llm_usage = lambda batch: False
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for iteration in range(40):
+                tracker.record("usage_d", "gpt-4o", iteration, _usage(100, 0))
+                if iteration % 10 == 9:
+                    await tracker.flush()
+    finally:
+        db_utils.record_llm_usage = original
+    stats = tracker.stats()
+    assert stats["pending_calls"] == 25 and stats["dropped_calls"] == 15 and stats["failed_flushes"] == 4, stats
+    assert [call["iteration"] for call in tracker._pending] == list(range(15, 40)), "the oldest calls should be dropped"
+    assert tracker.session_totals("usage_d")["tokens"] == 4000, "dropped calls still count towards the budget"
+
+    await tracker.flush()
+    assert db_utils.get_session_usage("usage_d")["calls"] == 25 and tracker.stats()["pending_calls"] == 0
+
+
+async def check_budget_switches_model_and_trims_history():
+    sent = []
+
+    def responder(model, messages, kwargs):
+        sent.append((model, len(messages)))
+        return FakeMessage(content="Sure.")
+
+    fake = FakeAsyncClient(latency=0.0, responder=responder)
+    llm_service.provider = llm_provider.ResilientChatProvider([llm_provider.ProviderRoute("fake", fake)])
+    usage_tracker.tracker = usage_tracker.UsageTracker(flush_interval=60, batch_size=1000)
+    usage_tracker.SESSION_TOKEN_BUDGET = 1
+    usage_tracker.SESSION_BUDGET_ACTION = "both"
+    history = []
+    for i in range(6):
+        history += [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": f"answer {i}"}]
+    history.append({"role": "user", "content": "one more question"})
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await llm_service.get_llm_response_with_history("usage_budget", history, routing_policy="premium")
+            await llm_service.get_llm_response_with_history("usage_budget", history, routing_policy="premium")
+    finally:
+        usage_tracker.SESSION_TOKEN_BUDGET = 0
+    (first_model, first_length), (second_model, second_length) = sent
+    assert first_model == llm_service.PRIMARY_MODEL, sent
+    assert second_model == usage_tracker.BUDGET_MODEL and second_length < first_length, sent
+
+
+async def run_usage_tracker_tests():
+    print("--- Starting Usage Tracking Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/usage_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+    rate_limiter.LLM_RPM_LIMIT = rate_limiter.LLM_TPM_LIMIT = 0
+
+    checks = [
+        check_batched_writes_and_aggregates,
+        check_totals_survive_a_cold_cache,
+        check_failed_flushes_are_capped,
+        check_budget_switches_model_and_trims_history,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            await check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if asyncio.run(run_usage_tracker_tests()) else 0)
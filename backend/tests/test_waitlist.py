@@ -0,0 +1,155 @@
+import io
+import json
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timedelta
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import email_service, reminder_service
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+SLOT = (MONDAY + timedelta(hours=16)).strftime('%Y-%m-%d %H:%M:%S')
+LATER_SLOT = (MONDAY + timedelta(days=1, hours=14)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _rows(sql: str, params: tuple = ()):
+    conn = db_utils.get_db_connection()
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def _waitlist(email: str):
+    [row] = _rows("SELECT * FROM waitlist WHERE user_email = ?", (email,))
+    return row
+
+
+def _booked_at(slot: str):
+    return _rows(
+        """
+        SELECT a.appointment_id, a.consultant_id, u.email FROM appointments a JOIN users u ON u.user_id = a.user_id
+        WHERE a.status = 'booked' AND a.appointment_datetime = ?
+        """,
+        (slot,)
+    )
+
+
+def check_cancel_books_first_in_line():
+    # Technology on weekdays has one consultant, so the slot is full once booked.
+    first_booking = db_utils.book_appointment('Owner', 'owner@example.com', SLOT, 1)
+    assert isinstance(first_booking, int), first_booking
+    first = db_utils.join_waitlist('First', 'first@example.com', 1, SLOT)
+    second = db_utils.join_waitlist('Second', 'second@example.com', 1, SLOT)
+    assert isinstance(first, int) and isinstance(second, int) and first < second, (first, second)
+    events_before = _rows("SELECT MAX(event_id) AS last FROM appointment_events")[0]['last'] or 0
+
+    assert db_utils.cancel_appointment(first_booking, 'owner@example.com') is True
+    [booking] = _booked_at(SLOT)
+    assert booking['email'] == 'first@example.com', booking
+    assert _waitlist('first@example.com')['status'] == 'booked' and _waitlist('first@example.com')['appointment_id'] == booking['appointment_id']
+    assert _waitlist('second@example.com')['status'] == 'waiting', "only the first entry should be booked"
+
+    # The hand-over wrote its reminders, rollups and outbox event in the cancel's transaction.
+    reminders = _rows("SELECT reminder_type, due_at FROM reminders WHERE appointment_id = ? AND status = 'pending'",
+                      (booking['appointment_id'],))
+    slot_dt = datetime.fromisoformat(SLOT)
+    assert sorted((r['reminder_type'], r['due_at']) for r in reminders) == sorted([
+        ('1h', (slot_dt - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')),
+        ('24h', (slot_dt - timedelta(hours=24)).strftime('%Y-%m-%d %H:%M:%S')),
+    ]), reminders
+    [load] = _rows("SELECT booked_slots FROM consultant_daily_load WHERE day = ? AND consultant_id = ?",
+                   (SLOT[:10], booking['consultant_id']))
+    assert load['booked_slots'] == 1, load
+    events = _rows("SELECT event_type, appointment_id, payload FROM appointment_events WHERE event_id > ? ORDER BY event_id",
+                   (events_before,))
+    assert [(e['event_type'], e['appointment_id']) for e in events] == [
+        ('appointment.cancelled', first_booking), ('appointment.booked', booking['appointment_id'])], events
+    payload = json.loads(events[1]['payload'])
+    assert payload['source'] == 'waitlist' and payload['user']['email'] == 'first@example.com', payload
+
+
+def check_reschedule_hands_over_to_the_next():
+    [booking] = _booked_at(SLOT)
+    assert db_utils.reschedule_appointment(booking['appointment_id'], 'first@example.com', LATER_SLOT) is True
+    [handed_over] = _booked_at(SLOT)
+    assert handed_over['email'] == 'second@example.com', handed_over
+    assert _waitlist('second@example.com')['appointment_id'] == handed_over['appointment_id']
+    assert [b['email'] for b in _booked_at(LATER_SLOT)] == ['first@example.com']
+
+
+def check_past_and_unwanted_slots_are_skipped():
+    past = (datetime.now() - timedelta(hours=2)).replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
+    db_utils.run_write(lambda conn: conn.execute(
+        "INSERT INTO waitlist (user_name, user_email, service_id, requested_datetime) VALUES ('Late', 'late@example.com', 1, ?)",
+        (past,)
+    ))
+    assert db_utils.run_write(lambda conn: db_utils._fill_from_waitlist(conn, 1, past, 1)) is None
+    assert _waitlist('late@example.com')['status'] == 'waiting' and _booked_at(past) == []
+
+    # Nobody waiting: a cancellation just frees the slot.
+    free_slot = (MONDAY + timedelta(days=2, hours=11)).strftime('%Y-%m-%d %H:%M:%S')
+    booking = db_utils.book_appointment('Solo', 'solo@example.com', free_slot, 1)
+    assert db_utils.cancel_appointment(booking, 'solo@example.com') is True
+    assert _booked_at(free_slot) == []
+
+
+def check_notify_waitlist_emails_the_booked_users():
+    sent = []
+    outcomes = iter([False, True]) # the first SMTP session fails
+
+    def fake_batch(items):
+        ok = next(outcomes)
+        sent.append((ok, sorted(item['booking_details']['user_email'] for item in items)))
+        return {item['appointment_id']: ok for item in items}
+
+    original = email_service.send_appointment_emails_batch
+    email_service.send_appointment_emails_batch = fake_batch
+    try:
+        scheduler = reminder_service.ReminderScheduler() # not started: notify_waitlist sends from a thread
+        for _ in range(2):
+            before = set(threading.enumerate())
+            scheduler.notify_waitlist()
+            for thread in set(threading.enumerate()) - before:
+                thread.join(5)
+    finally:
+        email_service.send_appointment_emails_batch = original
+
+    expected = ['first@example.com', 'second@example.com']
+    assert sent == [(False, expected), (True, expected)], sent
+    assert db_utils.get_unnotified_waitlist_bookings() == [], "sent entries should be marked notified"
+    assert scheduler.waitlist_sent_count == 2, scheduler.stats()
+
+
+def run_waitlist_tests():
+    print("--- Starting Waitlist Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/waitlist_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_cancel_books_first_in_line,
+        check_reschedule_hands_over_to_the_next,
+        check_past_and_unwanted_slots_are_skipped,
+        check_notify_waitlist_emails_the_booked_users,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_waitlist_tests() else 0)
@@ -0,0 +1,189 @@
+import io
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.utils import db_utils
+from backend.utils.init_db import initialize_database
+from backend.services import webhook_dispatcher
+
+
+MONDAY = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+SECRET = 'test-secret'
+WEBHOOK_URLS: list[str] = [] # receivers started by check_batched_delivery_in_order
+
+
+def _slot(hour: int, day: int = 0) -> str:
+    return (MONDAY + timedelta(days=day, hours=hour)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class StubReceiver:
+    """Local HTTP endpoint recording every POST. The first `fail_first` requests get 503 with Retry-After: 0."""
+
+    def __init__(self, fail_first: int = 0):
+        self.requests: list[tuple[dict, bytes]] = []
+        self.fail_first = fail_first
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests.append((dict(self.headers), body))
+                if len(receiver.requests) <= receiver.fail_first:
+                    self.send_response(503)
+                    self.send_header('Retry-After', '0')
+                else:
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hooks"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def delivered_ids(self):
+        """Event ids of acknowledged batches, in the order received."""
+        ids = []
+        for i, (_, body) in enumerate(self.requests):
+            if i >= self.fail_first:
+                ids += [event['event_id'] for event in json.loads(body)['events']]
+        return ids
+
+
+def _event_types(events: list[dict]):
+    return [(event['appointment_id'], event['event_type']) for event in events]
+
+
+def _make_changes(day: int = 0):
+    """Book, reschedule, move to another service and cancel one appointment; then free a slot someone is waiting for."""
+    appointment_id = db_utils.book_appointment('Hook User', 'Hook@Example.com', _slot(10, day), 1)
+    assert isinstance(appointment_id, int), appointment_id
+    assert db_utils.reschedule_appointment(appointment_id, 'hook@example.com', _slot(11, day)) is True
+    assert db_utils.modify_appointment_service(appointment_id, 'hook@example.com', 2) is True
+    assert db_utils.cancel_appointment(appointment_id, 'hook@example.com') is True
+    # No Technology consultant works at 08:00: nothing is written, so no event either.
+    assert not isinstance(db_utils.book_appointment('Hook User', 'hook@example.com', _slot(8, day), 1), int)
+
+    first = db_utils.book_appointment('Full One', 'one@example.com', _slot(15, day), 3)
+    second = db_utils.book_appointment('Full Two', 'two@example.com', _slot(15, day), 3)
+    assert isinstance(first, int) and isinstance(second, int), (first, second)
+    assert isinstance(db_utils.join_waitlist('Waiting User', 'wait@example.com', 3, _slot(15, day)), int)
+    assert db_utils.cancel_appointment(first, 'one@example.com') is True
+    return appointment_id, first, second
+
+
+def check_events_written_with_changes():
+    appointment_id, first, second = _make_changes()
+    events = db_utils.get_appointment_events(0, 100)
+    assert _event_types(events)[:4] == [
+        (appointment_id, 'appointment.booked'), (appointment_id, 'appointment.rescheduled'),
+        (appointment_id, 'appointment.service_changed'), (appointment_id, 'appointment.cancelled'),
+    ], _event_types(events)
+    assert _event_types(events)[4:7] == [
+        (first, 'appointment.booked'), (second, 'appointment.booked'), (first, 'appointment.cancelled'),
+    ], _event_types(events)
+    waitlisted = events[7]
+    assert waitlisted['event_type'] == 'appointment.booked' and len(events) == 8, _event_types(events)
+    waitlisted_payload = json.loads(waitlisted['payload'])
+    assert waitlisted_payload['source'] == 'waitlist' and waitlisted_payload['user']['email'] == 'wait@example.com', waitlisted_payload
+
+    rescheduled = json.loads(events[1]['payload'])
+    assert rescheduled['appointment_datetime'] == _slot(11) and rescheduled['previous']['appointment_datetime'] == _slot(10), rescheduled
+    changed = json.loads(events[2]['payload'])
+    assert (changed['service_name'], changed['previous']['service_id']) == ('Sales', 1), changed
+    assert json.loads(events[0]['payload'])['user'] == {'name': 'Hook User', 'email': 'hook@example.com'}
+
+
+async def _deliver_all(dispatcher, changes):
+    dispatcher.start()
+    deadline = time.monotonic() + 10
+    while any(target.cursor is None for target in dispatcher.targets) and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await asyncio.to_thread(changes)
+    last_event_id = db_utils.get_last_event_id()
+    while any(target.cursor != last_event_id for target in dispatcher.targets) and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await dispatcher.stop()
+    return last_event_id
+
+
+def check_batched_delivery_in_order():
+    healthy, flaky = StubReceiver(), StubReceiver(fail_first=2)
+    webhook_dispatcher.WEBHOOK_RETRY_BASE_SECONDS = 0.01
+    dispatcher = webhook_dispatcher.WebhookDispatcher([healthy.url, flaky.url], secret=SECRET, batch_size=3, poll_interval=0.02)
+    first_new = db_utils.get_last_event_id() + 1
+    last_event_id = asyncio.run(_deliver_all(dispatcher, lambda: _make_changes(day=1)))
+
+    expected = list(range(first_new, last_event_id + 1))
+    assert len(expected) == 8, expected
+    for receiver in (healthy, flaky):
+        assert receiver.delivered_ids() == expected, (receiver.url, receiver.delivered_ids(), expected)
+        assert all(len(json.loads(body)['events']) <= 3 for _, body in receiver.requests)
+        for headers, body in receiver.requests:
+            assert headers['X-Webhook-Signature'] == 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    # The failed batch was retried as is, so nothing behind it was sent first.
+    assert [json.loads(body)['events'][0]['event_id'] for _, body in flaky.requests[:3]] == [first_new] * 3
+    flaky_stats = next(w for w in dispatcher.stats()['webhooks'] if w['url'] == flaky.url)
+    assert flaky_stats['total_failures'] == 2 and flaky_stats['backlog'] == 0, flaky_stats
+
+    # Per appointment, events arrive in the order the changes were made.
+    received = [event for _, body in healthy.requests for event in json.loads(body)['events']]
+    types = [event['type'] for event in received if event['appointment_id'] == received[0]['appointment_id']]
+    assert types == ['appointment.booked', 'appointment.rescheduled', 'appointment.service_changed', 'appointment.cancelled'], types
+    WEBHOOK_URLS[:] = [healthy.url, flaky.url]
+
+
+def check_cursors_persist_and_prune():
+    urls = WEBHOOK_URLS
+    restarted = webhook_dispatcher.WebhookDispatcher(urls, batch_size=3)
+    cursors = db_utils.ensure_webhook_cursors(urls)
+    last_event_id = db_utils.get_last_event_id()
+    assert all(cursor['last_event_id'] == last_event_id and cursor['delivered'] == 8 for cursor in cursors.values()), cursors
+    restarted.targets[0].cursor = cursors[urls[0]]['last_event_id']
+    assert asyncio.run(restarted.deliver_once(restarted.targets[0])) == 0, "acknowledged events were sent again"
+
+    # A new event nobody has acknowledged yet survives pruning; acknowledged ones go.
+    assert isinstance(db_utils.book_appointment('Late User', 'late@example.com', _slot(16, 2), 4), int)
+    webhook_dispatcher.WEBHOOK_EVENT_RETENTION_HOURS = -1 # everything counts as old enough
+    pruned = restarted.prune()
+    remaining = db_utils.get_appointment_events(0, 100)
+    assert pruned == last_event_id and [event['event_id'] for event in remaining] == [last_event_id + 1], (pruned, remaining)
+
+
+def run_webhook_tests():
+    print("--- Starting Webhook Tests ---")
+    db_utils.DB_PATH = f"{tempfile.mkdtemp()}/webhooks_test.db"
+    with contextlib.redirect_stdout(io.StringIO()):
+        initialize_database(db_utils.DB_PATH)
+
+    checks = [
+        check_events_written_with_changes,
+        check_batched_delivery_in_order,
+        check_cursors_persist_and_prune,
+    ]
+    failures = 0
+    for check in checks:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                check()
+            print(f"PASS  {check.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {check.__name__}: {e}")
+
+    db_utils.writer.stop()
+    print(f"--- {len(checks) - failures}/{len(checks)} checks passed ---")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if run_webhook_tests() else 0)
@@ -1,38 +1,349 @@
 import os
+import json
 import sqlite3
-from datetime import datetime, timedelta
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import Any
+from .db_writer import SQLiteWriter, open_read_connection
+from .reference_data import ReferenceData
 
 
 DIR_NAME = 'data'
 DB_NAME = 'consulting.db'
 DB_PATH = os.path.join(DIR_NAME, DB_NAME)   
 
+# Booking details already known to a write function, kept briefly so the confirmation email can skip get_booking_details.
+RECENT_DETAILS_MAX = 256
+_recent_booking_details: OrderedDict[int, dict] = OrderedDict()
+_recent_details_lock = threading.Lock()
+
+# Tentative holds returned by check_availability, committed directly by the write tools.
+SLOT_HOLD_TTL_SECONDS = int(os.getenv("SLOT_HOLD_TTL_SECONDS", "300"))
+MAX_HOLDS_PER_SESSION = 8
+
+# Reminder emails sent ahead of each booked appointment, keyed by reminder_type.
+REMINDER_OFFSETS = {'24h': timedelta(hours=24), '1h': timedelta(hours=1)}
+
+# Normalized email -> users.user_id, for the lookups every per-user read and write starts with.
+USER_ID_CACHE_SIZE = int(os.getenv("USER_ID_CACHE_SIZE", "4096"))
+_user_ids: OrderedDict[str, int] = OrderedDict()
+_user_ids_lock = threading.Lock()
+
+# Services, consultants and availability are served from an in-memory snapshot. At most this often, a read checks
+# reference_data_version (bumped by triggers on those tables) and reloads the snapshot if it moved.
+REFERENCE_DATA_CHECK_SECONDS = float(os.getenv("REFERENCE_DATA_CHECK_SECONDS", "5"))
+_reference_data: ReferenceData | None = None
+_reference_data_path: str | None = None
+_reference_checked_at = 0.0
+_reference_reloads = 0
+_reference_lock = threading.Lock()
+
+def _remember_booking_details(appointment_id: int, details: dict):
+    """Records the details a write function just stored, for pop_recent_booking_details."""
+    with _recent_details_lock:
+        _recent_booking_details[appointment_id] = details
+        _recent_booking_details.move_to_end(appointment_id)
+        while len(_recent_booking_details) > RECENT_DETAILS_MAX:
+            _recent_booking_details.popitem(last=False)
+
+def pop_recent_booking_details(appointment_id: int):
+    """
+    Returns and forgets the details recorded by the last successful book/reschedule/modify of this appointment.
+    Keys match get_booking_details (except consultant_email). Returns None if nothing was recorded.
+    """
+    with _recent_details_lock:
+        return _recent_booking_details.pop(appointment_id, None)
+
+def normalize_email(email: str | None) -> str:
+    """The form emails are stored and matched in: surrounding whitespace removed, lower-cased."""
+    return (email or '').strip().lower()
+
+def get_user_id(user_email: str):
+    """
+    Returns the user_id for an email (matched case-insensitively), or None if that email never booked.
+    Only committed rows reach the cache, and user_ids never change, so cached entries stay valid.
+    """
+    email = normalize_email(user_email)
+    with _user_ids_lock:
+        user_id = _user_ids.get(email)
+        if user_id is not None:
+            _user_ids.move_to_end(email)
+            return user_id
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT user_id FROM users WHERE email = ?", (email,)).fetchone()
+    except Exception as e:
+        print(f"Error looking up user: {e}")
+        return None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    with _user_ids_lock:
+        _user_ids[email] = row['user_id']
+        while len(_user_ids) > USER_ID_CACHE_SIZE:
+            _user_ids.popitem(last=False)
+    return row['user_id']
+
+def _upsert_user(conn, user_name: str, user_email: str):
+    """Returns the user_id for this email on the caller's connection, creating the user or updating their name."""
+    return conn.execute(
+        """
+        INSERT INTO users (email, name) VALUES (?, ?)
+        ON CONFLICT (email) DO UPDATE SET name = excluded.name
+        RETURNING user_id
+        """,
+        (normalize_email(user_email), user_name)
+    ).fetchone()['user_id']
+
+def _plan_reminders(conn, appointment_id: int, appt_datetime_str: str):
+    """
+    Replaces the pending reminders of an appointment with fresh ones for its (new) start time.
+    Runs on the caller's connection so it commits together with the booking change.
+    Reminders that would already be due are not created.
+    """
+    _cancel_reminders(conn, appointment_id)
+    appt_dt = datetime.fromisoformat(appt_datetime_str)
+    now = datetime.now()
+    rows = [
+        (appointment_id, reminder_type, (appt_dt - offset).strftime('%Y-%m-%d %H:%M:%S'))
+        for reminder_type, offset in REMINDER_OFFSETS.items()
+        if appt_dt - offset > now
+    ]
+    conn.executemany("INSERT INTO reminders (appointment_id, reminder_type, due_at) VALUES (?, ?, ?)", rows)
+
+def _cancel_reminders(conn, appointment_id: int):
+    """Cancels the pending reminders of an appointment on the caller's connection."""
+    conn.execute(
+        "UPDATE reminders SET status = 'cancelled' WHERE appointment_id = ? AND status = 'pending'",
+        (appointment_id,)
+    )
+
+# Columns of booking_daily_stats, one per kind of booking change.
+BOOKING_EVENTS = ('booked', 'cancelled', 'rescheduled', 'modified')
+
+def _update_rollups(conn, event: str, service_id: int, freed: tuple | None = None, taken: tuple | None = None):
+    """
+    Keeps the analytics rollups in step with a booking change, on the caller's connection so both commit together.
+    The event is counted for today (UTC) and service_id. freed / taken are the (appointment_datetime, consultant_id,
+    service_id) of a booked slot that was released / occupied, and move the per-day and per-hour load counters.
+    """
+    if event not in BOOKING_EVENTS:
+        raise ValueError(f"Unknown booking event '{event}'")
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    conn.execute(
+        f"""
+        INSERT INTO booking_daily_stats (day, service_id, {event}) VALUES (?, ?, 1)
+        ON CONFLICT (day, service_id) DO UPDATE SET {event} = {event} + 1
+        """,
+        (today, service_id)
+    )
+    for slot, delta in ((freed, -1), (taken, 1)):
+        if slot is None:
+            continue
+        appt_datetime_str, consultant_id, slot_service_id = slot
+        slot_dt = datetime.fromisoformat(appt_datetime_str)
+        conn.execute(
+            """
+            INSERT INTO consultant_daily_load (day, consultant_id, booked_slots) VALUES (?, ?, ?)
+            ON CONFLICT (day, consultant_id) DO UPDATE SET booked_slots = booked_slots + excluded.booked_slots
+            """,
+            (slot_dt.strftime('%Y-%m-%d'), consultant_id, delta)
+        )
+        conn.execute(
+            """
+            INSERT INTO service_hourly_load (day, hour, service_id, booked_slots) VALUES (?, ?, ?, ?)
+            ON CONFLICT (day, hour, service_id) DO UPDATE SET booked_slots = booked_slots + excluded.booked_slots
+            """,
+            (slot_dt.strftime('%Y-%m-%d'), slot_dt.hour, slot_service_id, delta)
+        )
+
+def _append_event(conn, event_type: str, appointment_id: int, appt_datetime_str: str, consultant_id: int, service_id: int,
+                  user_name: str, user_email: str, **extra):
+    """
+    Appends an appointment event to the outbox on the caller's connection, so it commits (or rolls back) with the
+    change it describes. The payload is a snapshot taken now; the webhook dispatcher delivers it as is.
+    """
+    reference = get_reference_data()
+    consultant = reference.consultants.get(consultant_id)
+    payload = {
+        'appointment_id': appointment_id,
+        'appointment_datetime': appt_datetime_str,
+        'service_id': service_id,
+        'service_name': reference.service_name(service_id),
+        'consultant_id': consultant_id,
+        'consultant_name': consultant['name'] if consultant else None,
+        'user': {'name': user_name, 'email': normalize_email(user_email)},
+        **extra,
+    }
+    conn.execute(
+        "INSERT INTO appointment_events (event_type, appointment_id, payload, created_at) VALUES (?, ?, ?, ?)",
+        (event_type, appointment_id, json.dumps(payload), datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
+    )
+
+def _fill_from_waitlist(conn, service_id: int, freed_datetime_str: str, consultant_id: int):
+    """
+    Offers a slot that was just freed to the first user waiting for exactly that (service, slot), on the caller's
+    connection so the hand-over commits with the cancel/reschedule. The lookup is a single probe of the
+    idx_waitlist_slot index. The new booking is left unnotified for send_waitlist_notifications.
+    Returns the new appointment_id, or None if nobody was waiting.
+    """
+    slot_str = datetime.fromisoformat(freed_datetime_str).strftime('%Y-%m-%d %H:%M:%S')
+    if slot_str <= datetime.now().strftime('%Y-%m-%d %H:%M:%S'):
+        return None
+
+    waiting = conn.execute(
+        """
+        SELECT waitlist_id, user_name, user_email
+        FROM waitlist
+        WHERE status = 'waiting' AND service_id = ? AND requested_datetime = ?
+        ORDER BY waitlist_id
+        LIMIT 1
+        """,
+        (service_id, slot_str)
+    ).fetchone()
+    if not waiting:
+        return None
+
+    cursor = conn.execute(
+        """
+        INSERT INTO appointments (user_id, appointment_datetime, consultant_id, service_id)
+        VALUES (?, ?, ?, ?)
+        """,
+        (_upsert_user(conn, waiting['user_name'], waiting['user_email']), slot_str, consultant_id, service_id)
+    )
+    new_appointment_id = cursor.lastrowid
+    conn.execute(
+        "UPDATE waitlist SET status = 'booked', appointment_id = ? WHERE waitlist_id = ?",
+        (new_appointment_id, waiting['waitlist_id'])
+    )
+    _plan_reminders(conn, new_appointment_id, slot_str) #type: ignore
+    _update_rollups(conn, 'booked', service_id, taken=(slot_str, consultant_id, service_id))
+    _append_event(conn, 'appointment.booked', new_appointment_id, slot_str, consultant_id, service_id, #type: ignore
+                  waiting['user_name'], waiting['user_email'], source='waitlist')
+    print(f"Waitlist: booked freed slot {slot_str} for waitlist entry {waiting['waitlist_id']} (appointment {new_appointment_id}).")
+    return new_appointment_id
+
+# Every write goes through this single writer thread; see run_write.
+writer = SQLiteWriter()
+
 def get_db_connection():
     '''
-    Establishes and returns a database connection.
-    Configures the connection to return rows as dictionary-like objects.
+    Establishes and returns a read-only database connection.
+    Configures the connection to return rows as dictionary-like objects. Writes go through run_write.
+    '''
+
+    return open_read_connection(DB_PATH)
+
+def run_write(command):
+    '''
+    Runs command(conn) on the writer's connection, inside a transaction shared with other queued writes,
+    and returns its result once committed. If the command raises, only its own changes are rolled back
+    and the exception is re-raised here. Commands must not commit or roll back themselves.
+    '''
+    return writer.execute(DB_PATH, command)
+
+def _load_reference_snapshot():
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN") # one read transaction, so the version matches the rows
+        version = conn.execute("SELECT version FROM reference_data_version WHERE id = 1").fetchone()
+        services = conn.execute("SELECT service_id, service_name, description FROM services").fetchall()
+        consultants = conn.execute("SELECT consultant_id, name, email, service_id FROM consultants").fetchall()
+        availability = conn.execute("SELECT consultant_id, day_of_week, start_time, end_time FROM consultant_availability").fetchall()
+    finally:
+        conn.close()
+    return ReferenceData(version['version'] if version else 0, services, consultants, availability)
+
+def load_reference_data():
+    """Loads the reference data snapshot from the database and makes it current. Called at startup; returns the snapshot."""
+    global _reference_data, _reference_data_path, _reference_checked_at, _reference_reloads
+    with _reference_lock:
+        snapshot = _load_reference_snapshot()
+        if _reference_data is not None:
+            _reference_reloads += 1
+        _reference_data, _reference_data_path, _reference_checked_at = snapshot, DB_PATH, time.monotonic()
+    print(f"Reference data v{snapshot.version} loaded: {len(snapshot.services)} services, {len(snapshot.consultants)} consultants.")
+    return snapshot
+
+def get_reference_data() -> ReferenceData:
+    """
+    The current reference data snapshot, loading it on first use. Changes to services, consultants or availability
+    show up within REFERENCE_DATA_CHECK_SECONDS. If the version check fails, the previous snapshot is kept.
+    """
+    global _reference_checked_at
+    snapshot = _reference_data
+    if (snapshot is not None and _reference_data_path == DB_PATH
+            and time.monotonic() - _reference_checked_at < REFERENCE_DATA_CHECK_SECONDS):
+        return snapshot
+    with _reference_lock:
+        snapshot = _reference_data
+        if snapshot is not None and _reference_data_path == DB_PATH:
+            if time.monotonic() - _reference_checked_at < REFERENCE_DATA_CHECK_SECONDS:
+                return snapshot
+            conn = get_db_connection()
+            try:
+                row = conn.execute("SELECT version FROM reference_data_version WHERE id = 1").fetchone()
+            except Exception as e:
+                print(f"Error checking reference data version: {e}")
+                return snapshot
+            finally:
+                conn.close()
+            _reference_checked_at = time.monotonic()
+            if (row['version'] if row else 0) == snapshot.version:
+                return snapshot
+    return load_reference_data()
+
+def reference_data_stats():
+    snapshot = _reference_data
+    return {
+        'version': snapshot.version if snapshot else None,
+        'loaded_at': snapshot.loaded_at if snapshot else None,
+        'services': len(snapshot.services) if snapshot else 0,
+        'consultants': len(snapshot.consultants) if snapshot else 0,
+        'reloads': _reference_reloads,
+        'check_interval_seconds': REFERENCE_DATA_CHECK_SECONDS,
+    }
+
+def warm_up():
+    '''
+    Gets the database ready for the first request: starts the writer and opens its connection, loads the reference
+    data snapshot, and runs the hot read paths once (availability, session state, history, user lookup) so the schema
+    is parsed and the pages they touch are in the OS cache. Returns {step: milliseconds}, or None if a step failed.
     '''
+    timings = {}
+    next_hour = (datetime.now() + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
 
-    conn = sqlite3.connect(DB_PATH)
+    def hot_reads():
+        for service_name in get_reference_data().service_ids:
+            check_availability(service_name, next_hour)
+        get_session_state('')
+        get_conversation_history('', limit=1)
+        get_user_id('')
 
-    conn.row_factory = sqlite3.Row
-    return conn
+    try:
+        for step, action in (('writer', lambda: run_write(lambda conn: None)), ('reference_data', load_reference_data), ('hot_reads', hot_reads)):
+            started = time.perf_counter()
+            action()
+            timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        print(f"Error warming up the database: {e}")
+        return None
+    return timings
 
 def create_session_if_not_exists(session_id: str):
     """
     Ensures a row exists in session_state for the given session_id.
     This prevents errors if trying to update a session which does not exist.
     """
-    conn = get_db_connection()
     try:
-        conn.execute("INSERT OR IGNORE INTO session_state (session_id) VALUES (?)", (session_id,))
-        conn.commit()
+        run_write(lambda conn: conn.execute("INSERT OR IGNORE INTO session_state (session_id) VALUES (?)", (session_id,)))
 
     except Exception as e:
         print(f"Error creating session: {e}")
-    finally:
-        conn.close()
 
 
 
@@ -44,8 +355,6 @@ def update_session_state(session_id: str, data: dict):
 
     if not data:
         return
-    
-    conn = get_db_connection()
 
     try:
         set_clauses = [f'{key} = ?' for key in data.keys()]
@@ -58,12 +367,9 @@ def update_session_state(session_id: str, data: dict):
         WHERE session_id = ?
         """
 
-        conn.execute(query, tuple(values))
-        conn.commit()
+        run_write(lambda conn: conn.execute(query, tuple(values)))
     except Exception as e:
         print(f"Error updating session state: {e}")
-    finally:
-        conn.close()
 
 
 def get_session_state(session_id: str):
@@ -92,19 +398,14 @@ def add_conversation_message(session_id: str, role: str, message: str):
 
     """
 
-    conn = get_db_connection()
     try:
-        conn.execute(
+        run_write(lambda conn: conn.execute(
         "INSERT INTO conversation_history (session_id, role, message_text) VALUES (?, ?, ?)", (session_id, role, message)
-        )
-        conn.commit()
+        ))
         
     except Exception as e:
         print(f"Error adding conversation message: {e}")
 
-    finally:
-        conn.close()
-
 def get_conversation_history(session_id: str, limit: int = 10):
     """
     Gets the last 'limit' messages for a session to provide context to the LLM.
@@ -131,62 +432,125 @@ def get_conversation_history(session_id: str, limit: int = 10):
     finally:
         conn.close()
 
-def check_availability(service_name: str, requested_datetime_str: str):
+def _fts_query(text: str):
+    """
+    Turns a support-staff search string into an FTS5 query: every word must match, each word as a quoted phrase
+    so emails and IDs (jane.doe@example.com, 48213) need no escaping. A string wrapped in double quotes is one phrase.
+    Returns None if nothing searchable is left.
+    """
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        terms = [text[1:-1]]
+    else:
+        terms = text.split()
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms if any(char.isalnum() for char in term)]
+    return ' AND '.join(phrases) or None
+
+def search_conversations(query: str, session_id: str | None = None, role: str | None = None,
+                         before_message_id: int | None = None, limit: int = 20):
+    """
+    Full-text search over conversation messages using the conversation_fts index, newest first.
+    Optional filters: session_id, role ('user' or 'ai'). For the next page pass the last result's message_id
+    as before_message_id. Returns a list of dicts with a highlighted snippet, or None if the query has nothing
+    searchable in it. Database errors (e.g. a missing index) are raised.
+    """
+    fts_query = _fts_query(query)
+    if fts_query is None:
+        return None
+
+    sql = """
+        SELECT h.message_id, h.session_id, h.role, h.timestamp,
+               snippet(conversation_fts, 0, '[', ']', '…', 16) AS snippet
+        FROM conversation_fts f
+        JOIN conversation_history h ON h.message_id = f.rowid
+        WHERE conversation_fts MATCH ?
+    """
+    params: list[Any] = [fts_query]
+    if before_message_id is not None:
+        sql += " AND f.rowid < ?"
+        params.append(before_message_id)
+    if session_id:
+        sql += " AND h.session_id = ?"
+        params.append(session_id)
+    if role:
+        sql += " AND h.role = ?"
+        params.append(role)
+    sql += " ORDER BY f.rowid DESC LIMIT ?"
+    params.append(limit)
+
+    conn = get_db_connection()
+    try:
+        return [dict(row) for row in conn.execute(sql, tuple(params)).fetchall()]
+    except Exception as e:
+        print(f"Error searching conversations: {e}")
+        raise
+    finally:
+        conn.close()
+
+def _query_available_consultants(conn, service_name: str, requested_datetime_str: str, session_id: str | None = None):
+    """
+    Runs the availability query on the caller's connection. Consultants with an active slot hold that overlaps
+    the slot are excluded, unless the hold belongs to session_id.
+    Who offers the service and works that hour comes from the reference data snapshot; only bookings and holds
+    are read from the database, and only for those consultants.
+    """
+    candidates = get_reference_data().candidates(service_name, datetime.fromisoformat(requested_datetime_str))
+    if not candidates:
+        return []
+    placeholders = ','.join('?' * len(candidates))
+    candidate_ids = [candidate['consultant_id'] for candidate in candidates]
+
+    cursor = conn.execute(
+        f"""
+        -- Does an appointment already exist that overlaps this time?
+        SELECT consultant_id
+        FROM appointments
+        WHERE
+            status = 'booked'
+            AND consultant_id IN ({placeholders})
+            -- Check for any booking starting 59 mins before or after
+            AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes')
+
+        UNION
+
+        -- Is the slot tentatively held by another session?
+        SELECT consultant_id
+        FROM slot_holds
+        WHERE
+            expires_at > ?
+            AND consultant_id IN ({placeholders})
+            AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes')
+            AND session_id IS NOT ?
+        """,
+        (
+            *candidate_ids,
+            requested_datetime_str,
+            requested_datetime_str,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            *candidate_ids,
+            requested_datetime_str,
+            requested_datetime_str,
+            session_id
+        )
+    )
+    taken = {row['consultant_id'] for row in cursor.fetchall()}
+    return [candidate for candidate in candidates if candidate['consultant_id'] not in taken]
+
+def check_availability(service_name: str, requested_datetime_str: str, session_id: str | None = None):
     """
     Check which consultants are available for a 60 minute slot starting at the requested datetime.
 
     requested_datetime_str format: 'YYYY-MM-DD HH:MM:SS'
+    session_id: holds placed by this session do not count as taken.
 
     Returns: a list of available consultant dictionaries
     """
 
     try:
-        dt = datetime.fromisoformat(requested_datetime_str)
-        day_of_week = dt.weekday()
-        time_str = dt.strftime('%H:%M')
-
+        if not get_reference_data().candidates(service_name, datetime.fromisoformat(requested_datetime_str)):
+            return [] # nobody offers the service at that hour; no need to look at bookings
         conn = get_db_connection()
-        cursor = conn.execute(
-            """
-            SELECT c.consultant_id, c.name
-            FROM consultants c
-            JOIN services s ON c.service_id = s.service_id 
-            JOIN consultant_availability ca ON c.consultant_id = ca.consultant_id
-            WHERE
-                -- 1. Does a consultant offer this service?
-                s.service_name = ?
-
-                -- 2. Does consultant work on this day?
-                AND ca.day_of_week = ?
-
-                -- 3. Is the START time within a valid work block?
-                AND ? >= ca.start_time
-
-                -- 4. Does the 60-min END time ALSO fall within the same block?
-                AND ? <= time(ca.end_time, '-60 minutes')
-
-                -- 5. Does an appointment already exist that overlaps this time?
-                AND c.consultant_id NOT IN (
-                    SELECT consultant_id
-                    FROM appointments
-                    WHERE 
-                        status = 'booked'
-                        -- Check for any booking starting 59 mins before or after
-                        AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes')
-                )
-            """,
-            (
-                service_name,
-                day_of_week,
-                time_str,
-                time_str,
-                requested_datetime_str,
-                requested_datetime_str
-            )
-        )
-
-        available_consultants = cursor.fetchall()
-        return [dict(row) for row in available_consultants]
+        return _query_available_consultants(conn, service_name, requested_datetime_str, session_id)
     
     except Exception as e:
         print(f"Error checking availability: {e}")
@@ -195,24 +559,141 @@ def check_availability(service_name: str, requested_datetime_str: str):
         if 'conn' in locals():
             conn.close()
 
-def book_appointment(user_name: str, user_email: str, appt_datetime: str, service_id: int):
+def _place_hold(conn, session_id: str, service_name: str, requested_datetime_str: str, consultant_id: int | None = None):
+    """
+    Checks availability on the writer's connection and holds consultant_id if it is still free, otherwise the
+    first free consultant. Returns (hold, available): hold is {'consultant_id', 'name', 'hold_token',
+    'hold_expires_at'} or None if nobody is free; available is the full result of the check.
+    """
+    now = datetime.now()
+    service_id = get_reference_data().service_id(service_name)
+    if service_id is None:
+        return None, []
+
+    hold_token = secrets.token_urlsafe(12)
+    expires_at = (now + timedelta(seconds=SLOT_HOLD_TTL_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+    slot_str = datetime.fromisoformat(requested_datetime_str).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.execute("DELETE FROM slot_holds WHERE expires_at <= ?", (now.strftime('%Y-%m-%d %H:%M:%S'),))
+    available = _query_available_consultants(conn, service_name, slot_str, session_id)
+    if not available:
+        return None, available
+    held = next((c for c in available if c['consultant_id'] == consultant_id), available[0])
+    conn.execute(
+        """
+        DELETE FROM slot_holds WHERE hold_token IN (
+            SELECT hold_token FROM slot_holds WHERE session_id = ?
+            ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?
+        )
+        """,
+        (session_id, MAX_HOLDS_PER_SESSION - 1)
+    )
+    conn.execute(
+        """
+        INSERT INTO slot_holds (hold_token, session_id, consultant_id, service_id, appointment_datetime, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (hold_token, session_id, held['consultant_id'], service_id, slot_str, expires_at)
+    )
+    return {'consultant_id': held['consultant_id'], 'name': held['name'], 'hold_token': hold_token, 'hold_expires_at': expires_at}, available
+
+def hold_slot(session_id: str, service_name: str, requested_datetime_str: str, consultant_id: int | None = None):
+    """
+    Places a short-lived tentative hold on a consultant's slot for a session, so other sessions see it as taken
+    until it expires. A session keeps at most MAX_HOLDS_PER_SESSION holds; the oldest are released first.
+    Availability is checked again inside the write, against bookings and other sessions' live holds, so two
+    sessions can never hold the same consultant. consultant_id is preferred if still free, otherwise the first
+    free consultant is held.
+    Returns {'consultant_id', 'name', 'hold_token', 'hold_expires_at'}, or None if nobody is free or on failure.
+    """
+    try:
+        return run_write(lambda conn: _place_hold(conn, session_id, service_name, requested_datetime_str, consultant_id)[0])
+    except Exception as e:
+        print(f"Error placing slot hold: {e}")
+        return None
+
+def check_availability_and_hold(session_id: str, service_name: str, requested_datetime_str: str):
+    """
+    check_availability and hold_slot as one write, so the hold is never placed from an outdated read.
+    Returns the available consultants with the held one first, carrying hold_token and hold_expires_at; [] if nobody is free.
+    """
+    try:
+        if not get_reference_data().candidates(service_name, datetime.fromisoformat(requested_datetime_str)):
+            return [] # nobody offers the service at that hour; no need to queue a write
+        hold, available = run_write(lambda conn: _place_hold(conn, session_id, service_name, requested_datetime_str))
+    except Exception as e:
+        print(f"Error checking availability: {e}")
+        return []
+    if hold is None:
+        return available
+    return [hold] + [c for c in available if c['consultant_id'] != hold['consultant_id']]
+
+def _take_hold(conn, hold_token: str, session_id: str | None, service_id: int, appt_datetime_str: str):
+    """
+    Consumes a hold on the caller's connection if it is unexpired and matches the session, service and slot.
+    Returns the held consultant as {'consultant_id', 'name'}, or None if the hold cannot be used.
+    """
+    row = conn.execute(
+        """
+        SELECT h.consultant_id, c.name, h.session_id, h.service_id, h.appointment_datetime, h.expires_at
+        FROM slot_holds h
+        JOIN consultants c ON h.consultant_id = c.consultant_id
+        WHERE h.hold_token = ?
+        """,
+        (hold_token,)
+    ).fetchone()
+    if not row:
+        return None
+
+    conn.execute("DELETE FROM slot_holds WHERE hold_token = ?", (hold_token,))
+    slot_str = datetime.fromisoformat(appt_datetime_str).strftime('%Y-%m-%d %H:%M:%S')
+    if (row['expires_at'] <= datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            or row['service_id'] != service_id
+            or row['appointment_datetime'] != slot_str
+            or (session_id is not None and row['session_id'] != session_id)):
+        print("Hold could not be used (expired or for a different slot); checking availability instead.")
+        return None
+    # The unique index only catches the exact same start time; a hold that outlived a check can still overlap a booking.
+    overlapping = conn.execute(
+        """
+        SELECT 1 FROM appointments
+        WHERE status = 'booked' AND consultant_id = ?
+          AND appointment_datetime BETWEEN datetime(?, '-59 minutes') AND datetime(?, '+59 minutes')
+        LIMIT 1
+        """,
+        (row['consultant_id'], slot_str, slot_str)
+    ).fetchone()
+    if overlapping:
+        print("Held consultant has an overlapping booking; checking availability instead.")
+        return None
+    return {'consultant_id': row['consultant_id'], 'name': row['name']}
+
+def _consultants_for_write(conn, service_id: int, service_name: str, appt_datetime_str: str,
+                           hold_token: str | None, session_id: str | None):
+    """Consultants a write may assign: the held one when the hold is valid, otherwise a fresh availability check."""
+    if hold_token:
+        held = _take_hold(conn, hold_token, session_id, service_id, appt_datetime_str)
+        if held:
+            return [held]
+    return _query_available_consultants(conn, service_name, appt_datetime_str, session_id)
+
+def book_appointment(user_name: str, user_email: str, appt_datetime: str, service_id: int,
+                     hold_token: str | None = None, session_id: str | None = None):
     """
     Books an appointment.
+    If a valid hold_token from check_availability is given, the held consultant is booked without re-checking availability.
     If a 'cancelled' slot exists for the same time, it re-books it (UPDATE).
     Otherwise, it creates a new one (INSERT).
     """
-    
-    conn = get_db_connection()
-    
-    try:
+
+    def book(conn):
         
-        service_row = conn.execute("SELECT service_name FROM services WHERE service_id = ?", (service_id,)).fetchone()
-        if not service_row:
+        service_name = get_reference_data().service_name(service_id)
+        if service_name is None:
             print(f"Booking failed: No service found with ID {service_id}.")
             return None
-        
-        service_name = service_row['service_name']
-        available_consultants = check_availability(service_name, appt_datetime)
+
+        available_consultants = _consultants_for_write(conn, service_id, service_name, appt_datetime, hold_token, session_id)
         
         if not available_consultants:
             print(f"Booking failed: No consultants available for {service_name} at {appt_datetime}.")
@@ -221,6 +702,11 @@ def book_appointment(user_name: str, user_email: str, appt_datetime: str, servic
         
         assigned_consultant = available_consultants[0]
         assigned_consultant_id = assigned_consultant['consultant_id']
+        user_id = _upsert_user(conn, user_name, user_email)
+        details = {
+            'user_name': user_name, 'user_email': normalize_email(user_email), 'appointment_datetime': appt_datetime,
+            'consultant_name': assigned_consultant['name'], 'service_name': service_name,
+        }
         
       
         cursor = conn.execute(
@@ -238,38 +724,47 @@ def book_appointment(user_name: str, user_email: str, appt_datetime: str, servic
             conn.execute(
                 """
                 UPDATE appointments
-                SET user_name = ?, user_email = ?, service_id = ?, status = 'booked'
+                SET user_id = ?, service_id = ?, status = 'booked'
                 WHERE appointment_id = ?
                 """,
-                (user_name, user_email, service_id, existing_cancelled_slot['appointment_id'])
+                (user_id, service_id, existing_cancelled_slot['appointment_id'])
             )
-            conn.commit()
-            return existing_cancelled_slot['appointment_id']
+            _plan_reminders(conn, existing_cancelled_slot['appointment_id'], appt_datetime)
+            _update_rollups(conn, 'booked', service_id, taken=(appt_datetime, assigned_consultant_id, service_id))
+            _append_event(conn, 'appointment.booked', existing_cancelled_slot['appointment_id'], appt_datetime,
+                          assigned_consultant_id, service_id, user_name, user_email)
+            return existing_cancelled_slot['appointment_id'], details
             
         else:
             
             print(f"Booking new slot for consultant {assigned_consultant_id}...")
             cursor = conn.execute(
                 """
-                INSERT INTO appointments (user_name, user_email, appointment_datetime, consultant_id, service_id)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO appointments (user_id, appointment_datetime, consultant_id, service_id)
+                VALUES (?, ?, ?, ?)
                 """,
-                (user_name, user_email, appt_datetime, assigned_consultant_id, service_id)
+                (user_id, appt_datetime, assigned_consultant_id, service_id)
             )
-            conn.commit()
-            return cursor.lastrowid
+            _plan_reminders(conn, cursor.lastrowid, appt_datetime) #type: ignore
+            _update_rollups(conn, 'booked', service_id, taken=(appt_datetime, assigned_consultant_id, service_id))
+            _append_event(conn, 'appointment.booked', cursor.lastrowid, appt_datetime, #type: ignore
+                          assigned_consultant_id, service_id, user_name, user_email)
+            return cursor.lastrowid, details
 
+    try:
+        result = run_write(book)
     except sqlite3.IntegrityError as e:
         print(f"Booking failed (IntegrityError) : {e}")
-        conn.rollback()
         return "Booking failed: This slot is already booked."
     except Exception as e:
         print(f"Error booking appointment: {e}")
-        conn.rollback()
         return f"An unexpected error occurred: {e}"
-    finally:
-        if conn:
-            conn.close()
+
+    if not isinstance(result, tuple):
+        return result
+    appointment_id, details = result
+    _remember_booking_details(appointment_id, details)
+    return appointment_id
 
 def get_user_appointments(user_email:str):
     
@@ -278,6 +773,9 @@ def get_user_appointments(user_email:str):
     Used for cancellation or rescheduling.
 
     """
+    user_id = get_user_id(user_email)
+    if user_id is None:
+        return []
     conn = get_db_connection()
 
     try:
@@ -291,8 +789,8 @@ def get_user_appointments(user_email:str):
             FROM appointments a
             JOIN consultants c ON a.consultant_id = c.consultant_id
             JOIN services s ON a.service_id = s.service_id
-            WHERE a.user_email = ? AND a.status = 'booked'
-            ORDER BY a.appointment_datetime""", (user_email,)
+            WHERE a.user_id = ? AND a.status = 'booked'
+            ORDER BY a.appointment_datetime""", (user_id,)
         )
         return [dict(row) for row in cursor.fetchall()]
     except Exception as e:
@@ -307,33 +805,54 @@ def cancel_appointment(appointment_id: int, user_email: str):
     Checks that the email matches the appointment for security.
     Returns True on success, False on failure.
     """
-    conn = get_db_connection()
-    
-    try: 
+    user_id = get_user_id(user_email)
+
+    def cancel(conn):
+        freed = conn.execute(
+            """
+            SELECT a.service_id, a.consultant_id, a.appointment_datetime, u.name AS user_name, u.email AS user_email
+            FROM appointments a JOIN users u ON u.user_id = a.user_id
+            WHERE a.appointment_id = ? and a.user_id = ? and a.status = 'booked'
+            """,
+            (appointment_id, user_id)
+        ).fetchone()
 
         cursor = conn.execute(
             """
             UPDATE appointments
             SET status = 'cancelled'
-            WHERE appointment_id = ? and user_email = ? and status = 'booked'
+            WHERE appointment_id = ? and user_id = ? and status = 'booked'
             """,
-            (appointment_id, user_email)
+            (appointment_id, user_id)
         )
-        conn.commit()
-        return cursor.rowcount > 0
-    
+        cancelled = cursor.rowcount > 0
+        if cancelled:
+            _cancel_reminders(conn, appointment_id)
+            _update_rollups(conn, 'cancelled', freed['service_id'],
+                            freed=(freed['appointment_datetime'], freed['consultant_id'], freed['service_id']))
+            _append_event(conn, 'appointment.cancelled', appointment_id, freed['appointment_datetime'], freed['consultant_id'],
+                          freed['service_id'], freed['user_name'], freed['user_email'])
+            _fill_from_waitlist(conn, freed['service_id'], freed['appointment_datetime'], freed['consultant_id'])
+        return cancelled
+
+    try:
+        return run_write(cancel)
     except Exception as e:
         print(f"Error cancelling appointment: {e}")
         return False
-    finally:
-        conn.close()
 
-def modify_appointment_service(appointment_id: int, user_email: str, new_service_id: int):
-    conn = get_db_connection()
-    try:
+def modify_appointment_service(appointment_id: int, user_email: str, new_service_id: int,
+                               hold_token: str | None = None, session_id: str | None = None):
+    user_id = get_user_id(user_email)
+
+    def modify(conn):
         current_appt = conn.execute(
-            "SELECT appointment_datetime, service_id FROM appointments WHERE appointment_id = ? AND user_email = ? AND status = 'booked'",
-            (appointment_id, user_email)
+            """
+            SELECT a.appointment_datetime, a.service_id, a.consultant_id, u.name AS user_name, u.email AS user_email
+            FROM appointments a JOIN users u ON u.user_id = a.user_id
+            WHERE a.appointment_id = ? AND a.user_id = ? AND a.status = 'booked'
+            """,
+            (appointment_id, user_id)
         ).fetchone()
         
         if not current_appt:
@@ -344,12 +863,11 @@ def modify_appointment_service(appointment_id: int, user_email: str, new_service
              
         appt_datetime = current_appt['appointment_datetime']
         
-        new_service_name_row = conn.execute("SELECT service_name FROM services WHERE service_id = ?", (new_service_id,)).fetchone()
-        if not new_service_name_row:
+        new_service_name = get_reference_data().service_name(new_service_id)
+        if new_service_name is None:
             return "Modify failed: Invalid new service ID."
-        
-        new_service_name = new_service_name_row['service_name']
-        available_consultants = check_availability(new_service_name, appt_datetime)
+
+        available_consultants = _consultants_for_write(conn, new_service_id, new_service_name, appt_datetime, hold_token, session_id)
         
         if not available_consultants:
             return f"Modify failed: No consultants available for {new_service_name} at {appt_datetime}."
@@ -360,40 +878,55 @@ def modify_appointment_service(appointment_id: int, user_email: str, new_service
             """
             UPDATE appointments
             SET service_id = ?, consultant_id = ?
-            WHERE appointment_id = ? AND user_email = ?
+            WHERE appointment_id = ? AND user_id = ?
             """,
-            (new_service_id, new_consultant_id, appointment_id, user_email)
+            (new_service_id, new_consultant_id, appointment_id, user_id)
         )
-        
-        conn.commit()
-        return True
-        
+        _update_rollups(conn, 'modified', new_service_id,
+                        freed=(appt_datetime, current_appt['consultant_id'], current_appt['service_id']),
+                        taken=(appt_datetime, new_consultant_id, new_service_id))
+        _append_event(conn, 'appointment.service_changed', appointment_id, appt_datetime, new_consultant_id, new_service_id,
+                      current_appt['user_name'], current_appt['user_email'],
+                      previous={'service_id': current_appt['service_id'], 'consultant_id': current_appt['consultant_id']})
+        return {
+            'user_name': current_appt['user_name'], 'user_email': current_appt['user_email'], 'appointment_datetime': appt_datetime,
+            'consultant_name': available_consultants[0]['name'], 'service_name': new_service_name,
+        }
+
+    try:
+        result = run_write(modify)
     except sqlite3.IntegrityError:
-        conn.rollback()
         return "Modify failed: The new slot is already booked."
     except Exception as e:
         print(f"Error modifying appointment: {e}")
-        conn.rollback()
         return f"An internal error occurred: {e}"
-    finally:
-        if conn:
-            conn.close()
 
-def reschedule_appointment(appointment_id: int, user_email: str, new_appt_datetime: str):
-    conn = get_db_connection()
-    try:
+    if not isinstance(result, dict):
+        return result
+    _remember_booking_details(appointment_id, result)
+    return True
+
+def reschedule_appointment(appointment_id: int, user_email: str, new_appt_datetime: str,
+                           hold_token: str | None = None, session_id: str | None = None):
+    user_id = get_user_id(user_email)
+
+    def reschedule(conn):
         current_appt = conn.execute(
-            "SELECT service_id FROM appointments WHERE appointment_id = ? AND user_email = ? AND status = 'booked'",
-            (appointment_id, user_email)
+            """
+            SELECT a.service_id, a.consultant_id, a.appointment_datetime, u.name AS user_name, u.email AS user_email
+            FROM appointments a JOIN users u ON u.user_id = a.user_id
+            WHERE a.appointment_id = ? AND a.user_id = ? AND a.status = 'booked'
+            """,
+            (appointment_id, user_id)
         ).fetchone()
         
         if not current_appt:
             return "Reschedule failed: No active appointment found for that ID and email."
         
         service_id = current_appt['service_id']
-        service_name = conn.execute("SELECT service_name FROM services WHERE service_id = ?", (service_id,)).fetchone()['service_name']
+        service_name = get_reference_data().service_name(service_id)
         
-        available_consultants = check_availability(service_name, new_appt_datetime)
+        available_consultants = _consultants_for_write(conn, service_id, service_name, new_appt_datetime, hold_token, session_id)
         
         if not available_consultants:
             return f"Reschedule failed: No consultants available for {service_name} at {new_appt_datetime}."
@@ -404,24 +937,35 @@ def reschedule_appointment(appointment_id: int, user_email: str, new_appt_dateti
             """
             UPDATE appointments
             SET appointment_datetime = ?, consultant_id = ?
-            WHERE appointment_id = ? AND user_email = ?
+            WHERE appointment_id = ? AND user_id = ?
             """,
-            (new_appt_datetime, new_consultant_id, appointment_id, user_email)
+            (new_appt_datetime, new_consultant_id, appointment_id, user_id)
         )
+        _plan_reminders(conn, appointment_id, new_appt_datetime)
+        _update_rollups(conn, 'rescheduled', service_id,
+                        freed=(current_appt['appointment_datetime'], current_appt['consultant_id'], service_id),
+                        taken=(new_appt_datetime, new_consultant_id, service_id))
+        _append_event(conn, 'appointment.rescheduled', appointment_id, new_appt_datetime, new_consultant_id, service_id,
+                      current_appt['user_name'], current_appt['user_email'],
+                      previous={'appointment_datetime': current_appt['appointment_datetime'], 'consultant_id': current_appt['consultant_id']})
+        _fill_from_waitlist(conn, service_id, current_appt['appointment_datetime'], current_appt['consultant_id'])
+        return {
+            'user_name': current_appt['user_name'], 'user_email': current_appt['user_email'], 'appointment_datetime': new_appt_datetime,
+            'consultant_name': available_consultants[0]['name'], 'service_name': service_name,
+        }
 
-        conn.commit()
-        return True
-        
+    try:
+        result = run_write(reschedule)
     except sqlite3.IntegrityError:
-        conn.rollback()
         return "Reschedule failed: The new slot is already booked."
     except Exception as e:
         print(f"Error rescheduling appointment: {e}")
-        conn.rollback()
         return f"An internal error occurred: {e}"
-    finally:
-        if conn:
-            conn.close()
+
+    if not isinstance(result, dict):
+        return result
+    _remember_booking_details(appointment_id, result)
+    return True
 
 def get_booking_details(appointment_id:int, ignore_status=False):
     
@@ -441,10 +985,11 @@ def get_booking_details(appointment_id:int, ignore_status=False):
             params.append('booked')
         query = f"""
             SELECT
-                a.user_name, a.user_email, a.appointment_datetime,
+                u.name AS user_name, u.email AS user_email, a.appointment_datetime,
                 c.name AS consultant_name, c.email AS consultant_email,
                 s.service_name
             FROM appointments a
+            JOIN users u ON a.user_id = u.user_id
             JOIN consultants c ON a.consultant_id = c.consultant_id
             JOIn services s ON a.service_id = s.service_id
             {where_clause}
@@ -460,7 +1005,69 @@ def get_booking_details(appointment_id:int, ignore_status=False):
 
 
 
-def find_next_available_slot(service_name: str, start_datetime_str: str):
+def get_booking_details_many(appointment_ids: list[int]):
+    """
+    Fetches details for many appointments in one query, regardless of status (for batched emails).
+    Returns a dict of appointment_id -> details dict.
+    """
+    if not appointment_ids:
+        return {}
+
+    conn = get_db_connection()
+    try:
+        placeholders = ', '.join('?' for _ in appointment_ids)
+        cursor = conn.execute(
+            f"""
+            SELECT
+                a.appointment_id, u.name AS user_name, u.email AS user_email, a.appointment_datetime,
+                c.name AS consultant_name, c.email AS consultant_email,
+                s.service_name
+            FROM appointments a
+            JOIN users u ON a.user_id = u.user_id
+            JOIN consultants c ON a.consultant_id = c.consultant_id
+            JOIN services s ON a.service_id = s.service_id
+            WHERE a.appointment_id IN ({placeholders})
+            """,
+            tuple(appointment_ids)
+        )
+        return {row['appointment_id']: dict(row) for row in cursor.fetchall()}
+    except Exception as e:
+        print(f"Error getting booking details: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def get_consultant_bookings(consultant_id: int, start_datetime_str: str, end_datetime_str: str):
+    """
+    Fetches all 'booked' appointments of a consultant in [start, end), with the same fields as get_booking_details
+    plus appointment_id. Used for bulk notifications, e.g. when a consultant is out sick.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """
+            SELECT
+                a.appointment_id, u.name AS user_name, u.email AS user_email, a.appointment_datetime,
+                c.name AS consultant_name, c.email AS consultant_email,
+                s.service_name
+            FROM appointments a
+            JOIN users u ON a.user_id = u.user_id
+            JOIN consultants c ON a.consultant_id = c.consultant_id
+            JOIN services s ON a.service_id = s.service_id
+            WHERE a.consultant_id = ? AND a.status = 'booked'
+              AND a.appointment_datetime >= ? AND a.appointment_datetime < ?
+            ORDER BY a.appointment_datetime
+            """,
+            (consultant_id, start_datetime_str, end_datetime_str)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting consultant bookings: {e}")
+        return []
+    finally:
+        conn.close()
+
+def find_next_available_slot(service_name: str, start_datetime_str: str, session_id: str | None = None):
     """
     Searches for the next available 60-minute slot for a given service,
     starting from the requested datetime.
@@ -487,7 +1094,7 @@ def find_next_available_slot(service_name: str, start_datetime_str: str):
         for _ in range(search_limit):
             
             
-            available_consultants = check_availability(service_name, current_time.isoformat(sep=' '))
+            available_consultants = check_availability(service_name, current_time.isoformat(sep=' '), session_id)
             
             if available_consultants:
                 
@@ -509,53 +1116,725 @@ def find_next_available_slot(service_name: str, start_datetime_str: str):
     
 def mark_confirmation_sent(appointment_id: int):
     """Updates the appointment record to show the confirmation email was sent."""
-    conn = get_db_connection()
     try:
-        conn.execute(
+        run_write(lambda conn: conn.execute(
             "UPDATE appointments SET confirmation_sent_at = ? WHERE appointment_id = ?",
             (datetime.now(), appointment_id)
-        )
-        conn.commit()
+        ))
         print(f"Marked confirmation sent for appointment ID: {appointment_id}")
     except Exception as e:
         print(f"Error marking confirmation sent: {e}")
-        conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def get_all_services():
-    """Fetches a list of all available services."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute("SELECT service_id, service_name, description FROM services ORDER BY service_name")
-        return [dict(row) for row in cursor.fetchall()]
-    except Exception as e:
-        print(f"Error getting all services: {e}")
-        return [] 
-    finally:
-        if conn:
-            conn.close()
 
-def get_consultants_by_service(service_name: str):
-    """Fetches all consultants associated with a specific service name."""
+def get_pending_reminders(due_before_str: str, limit: int = 5000):
+    """
+    Fetches pending reminders due before the given time, earliest first.
+    Served by the partial index on reminders(due_at), so it never scans appointments.
+    """
     conn = get_db_connection()
     try:
         cursor = conn.execute(
             """
-            SELECT c.consultant_id, c.name, c.email
-            FROM consultants c
-            JOIN services s ON c.service_id = s.service_id
-            WHERE s.service_name = ?
-            ORDER BY c.name
+            SELECT reminder_id, appointment_id, reminder_type, due_at
+            FROM reminders
+            WHERE status = 'pending' AND due_at <= ?
+            ORDER BY due_at
+            LIMIT ?
             """,
-            (service_name,)
+            (due_before_str, limit)
         )
-        # Convert list of Row objects to a list of standard dicts
         return [dict(row) for row in cursor.fetchall()]
     except Exception as e:
-        print(f"Error getting consultants by service: {e}")
-        return [] # Return empty list on error
+        print(f"Error getting pending reminders: {e}")
+        return []
+    finally:
+        conn.close()
+
+def claim_reminders(reminder_ids: list[int]):
+    """
+    Atomically moves still-pending reminders to 'sending' and returns them with their booking details.
+    Reminders whose appointment was cancelled or has already started are marked 'cancelled' instead.
+    When several reminders of one appointment are claimed together, only the latest one is kept; the rest are 'skipped'.
+    """
+    if not reminder_ids:
+        return []
+
+    def claim(conn):
+        placeholders = ', '.join('?' for _ in reminder_ids)
+        rows = conn.execute(
+            f"""
+            SELECT
+                r.reminder_id, r.reminder_type, r.due_at, a.appointment_id, a.status AS appointment_status,
+                u.name AS user_name, u.email AS user_email, a.appointment_datetime,
+                c.name AS consultant_name, s.service_name
+            FROM reminders r
+            JOIN appointments a ON r.appointment_id = a.appointment_id
+            JOIN users u ON a.user_id = u.user_id
+            JOIN consultants c ON a.consultant_id = c.consultant_id
+            JOIN services s ON a.service_id = s.service_id
+            WHERE r.reminder_id IN ({placeholders}) AND r.status = 'pending'
+            ORDER BY r.due_at
+            """,
+            tuple(reminder_ids)
+        ).fetchall()
+
+        now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        latest_by_appointment = {}
+        stale_ids = []
+        for row in rows:
+            if row['appointment_status'] != 'booked' or row['appointment_datetime'] <= now_str:
+                stale_ids.append(row['reminder_id'])
+                continue
+            previous = latest_by_appointment.get(row['appointment_id'])
+            if previous is not None:
+                conn.execute("UPDATE reminders SET status = 'skipped' WHERE reminder_id = ?", (previous['reminder_id'],))
+            latest_by_appointment[row['appointment_id']] = row
+
+        conn.executemany("UPDATE reminders SET status = 'cancelled' WHERE reminder_id = ?", [(rid,) for rid in stale_ids])
+        claimed = list(latest_by_appointment.values())
+        conn.executemany("UPDATE reminders SET status = 'sending' WHERE reminder_id = ?", [(row['reminder_id'],) for row in claimed])
+        return [dict(row) for row in claimed]
+
+    try:
+        return run_write(claim)
+    except Exception as e:
+        print(f"Error claiming reminders: {e}")
+        return []
+
+def complete_reminders(sent_ids: list[int], failed_ids: list[int]):
+    """Marks claimed reminders as 'sent' (with sent_at) or 'failed'."""
+    def complete(conn):
+        now = datetime.now()
+        conn.executemany("UPDATE reminders SET status = 'sent', sent_at = ? WHERE reminder_id = ?", [(now, rid) for rid in sent_ids])
+        conn.executemany("UPDATE reminders SET status = 'failed' WHERE reminder_id = ?", [(rid,) for rid in failed_ids])
+
+    try:
+        run_write(complete)
+    except Exception as e:
+        print(f"Error completing reminders: {e}")
+
+def release_unfinished_reminders():
+    """Returns reminders left in 'sending' by an interrupted run to 'pending'. Called when the scheduler starts."""
+    try:
+        return run_write(lambda conn: conn.execute("UPDATE reminders SET status = 'pending' WHERE status = 'sending'").rowcount)
+    except Exception as e:
+        print(f"Error releasing reminders: {e}")
+        return 0
+
+def join_waitlist(user_name: str, user_email: str, service_id: int, requested_datetime: str):
+    """
+    Adds a user to the waitlist for a specific slot that is currently unavailable.
+    Returns the waitlist_id, or an error string.
+    """
+    user_email = normalize_email(user_email)
+
+    def join(conn):
+        slot_dt = datetime.fromisoformat(requested_datetime)
+        if slot_dt <= datetime.now():
+            return "Waitlist failed: The requested time is in the past."
+        slot_str = slot_dt.strftime('%Y-%m-%d %H:%M:%S')
+
+        if get_reference_data().service_name(service_id) is None:
+            return f"Waitlist failed: No service found with ID {service_id}."
+
+        existing = conn.execute(
+            """
+            SELECT waitlist_id FROM waitlist
+            WHERE status = 'waiting' AND service_id = ? AND requested_datetime = ? AND user_email = ?
+            """,
+            (service_id, slot_str, user_email)
+        ).fetchone()
+        if existing:
+            return existing['waitlist_id']
+
+        cursor = conn.execute(
+            "INSERT INTO waitlist (user_name, user_email, service_id, requested_datetime) VALUES (?, ?, ?, ?)",
+            (user_name, user_email, service_id, slot_str)
+        )
+        return cursor.lastrowid
+
+    try:
+        return run_write(join)
+    except Exception as e:
+        print(f"Error joining waitlist: {e}")
+        return f"An unexpected error occurred: {e}"
+
+def get_unnotified_waitlist_bookings(limit: int = 500):
+    """Fetches waitlist entries that were auto-booked but whose user has not been emailed yet, with booking details."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """
+            SELECT
+                w.waitlist_id, a.appointment_id, u.name AS user_name, u.email AS user_email, a.appointment_datetime,
+                c.name AS consultant_name, s.service_name
+            FROM waitlist w
+            JOIN appointments a ON w.appointment_id = a.appointment_id
+            JOIN users u ON a.user_id = u.user_id
+            JOIN consultants c ON a.consultant_id = c.consultant_id
+            JOIN services s ON a.service_id = s.service_id
+            WHERE w.status = 'booked' AND w.notified_at IS NULL
+            ORDER BY w.waitlist_id
+            LIMIT ?
+            """,
+            (limit,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting waitlist bookings: {e}")
+        return []
+    finally:
+        conn.close()
+
+def mark_waitlist_notified(waitlist_ids: list[int]):
+    """Records that the users of these auto-booked waitlist entries were emailed."""
+    now = datetime.now()
+    try:
+        run_write(lambda conn: conn.executemany(
+            "UPDATE waitlist SET notified_at = ? WHERE waitlist_id = ?", [(now, wid) for wid in waitlist_ids]
+        ))
+    except Exception as e:
+        print(f"Error marking waitlist notified: {e}")
+
+def get_expired_sessions(cutoff: str, after_session_id: str = '', limit: int = 200):
+    """
+    Returns up to `limit` session_ids after `after_session_id` (in session_id order) with no conversation message
+    and no session_state update at or after `cutoff` ('YYYY-MM-DD HH:MM:SS', UTC like CURRENT_TIMESTAMP).
+    Sessions that only have a session_state row are included. Walks idx_conversation_history_session, so each call
+    reads about as far as it needs to find `limit` sessions.
+    """
+    conn = get_db_connection()
+    try:
+        from_history = conn.execute(
+            """
+            SELECT h.session_id
+            FROM conversation_history h
+            WHERE h.session_id > ?
+            GROUP BY h.session_id
+            HAVING MAX(h.timestamp) < ?
+               AND NOT EXISTS (SELECT 1 FROM session_state s WHERE s.session_id = h.session_id AND s.last_updated >= ?)
+            ORDER BY h.session_id
+            LIMIT ?
+            """,
+            (after_session_id, cutoff, cutoff, limit)
+        ).fetchall()
+        state_only = conn.execute(
+            """
+            SELECT s.session_id
+            FROM session_state s
+            WHERE s.session_id > ? AND s.last_updated < ?
+              AND NOT EXISTS (SELECT 1 FROM conversation_history h WHERE h.session_id = s.session_id)
+            ORDER BY s.session_id
+            LIMIT ?
+            """,
+            (after_session_id, cutoff, limit)
+        ).fetchall()
+        return sorted({row['session_id'] for row in from_history} | {row['session_id'] for row in state_only})[:limit]
+    except Exception as e:
+        print(f"Error getting expired sessions: {e}")
+        return []
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        conn.close()
+
+def get_sessions_for_archive(session_ids: list[str]):
+    """Returns {session_id: {'session_id', 'last_activity', 'state', 'messages'}} with each session's full transcript and state."""
+    if not session_ids:
+        return {}
+    conn = get_db_connection()
+    try:
+        placeholders = ', '.join('?' for _ in session_ids)
+        sessions = {session_id: {'session_id': session_id, 'last_activity': None, 'state': None, 'messages': []} for session_id in session_ids}
+        for row in conn.execute(f"SELECT * FROM session_state WHERE session_id IN ({placeholders})", tuple(session_ids)):
+            sessions[row['session_id']]['state'] = dict(row)
+            sessions[row['session_id']]['last_activity'] = row['last_updated']
+        for row in conn.execute(
+            f"""
+            SELECT session_id, role, message_text, timestamp FROM conversation_history
+            WHERE session_id IN ({placeholders})
+            ORDER BY session_id, timestamp, message_id
+            """,
+            tuple(session_ids)
+        ):
+            session = sessions[row['session_id']]
+            session['messages'].append({'role': row['role'], 'message_text': row['message_text'], 'timestamp': row['timestamp']})
+            session['last_activity'] = max(session['last_activity'] or '', row['timestamp'] or '')
+        return sessions
+    except Exception as e:
+        print(f"Error reading sessions for archive: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def delete_expired_sessions(session_ids: list[str], cutoff: str):
+    """
+    Deletes the conversation history and session state of these sessions, skipping any that became active
+    again (a message or state update at or after `cutoff`) since they were selected.
+    Returns the list of session_ids actually deleted, or None on failure.
+    """
+    def delete(conn):
+        deleted = []
+        for session_id in session_ids:
+            active = conn.execute(
+                """
+                SELECT 1 FROM conversation_history WHERE session_id = ? AND timestamp >= ?
+                UNION ALL
+                SELECT 1 FROM session_state WHERE session_id = ? AND last_updated >= ?
+                LIMIT 1
+                """,
+                (session_id, cutoff, session_id, cutoff)
+            ).fetchone()
+            if active:
+                continue
+            conn.execute("DELETE FROM conversation_history WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            deleted.append(session_id)
+        return deleted
+
+    try:
+        return run_write(delete)
+    except Exception as e:
+        print(f"Error deleting expired sessions: {e}")
+        return None
+
+def get_freelist_pages():
+    """Returns (free pages, auto_vacuum mode) of the database file; auto_vacuum 2 means incremental."""
+    conn = get_db_connection()
+    try:
+        return conn.execute("PRAGMA freelist_count").fetchone()[0], conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    except Exception as e:
+        print(f"Error reading freelist: {e}")
+        return 0, 0
+    finally:
+        conn.close()
+
+def incremental_vacuum(pages: int):
+    """
+    Returns up to `pages` free pages to the filesystem as one short write, so it queues behind live writes
+    like any other. Requires auto_vacuum=INCREMENTAL. Returns the number of free pages left, or None on failure.
+    """
+    def vacuum(conn):
+        # Python's sqlite3 steps a PRAGMA only once, and incremental_vacuum frees one page per step.
+        for _ in range(pages):
+            conn.execute("PRAGMA incremental_vacuum(1)")
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    try:
+        return run_write(vacuum)
+    except Exception as e:
+        print(f"Error running incremental vacuum: {e}")
+        return None
+
+def record_llm_usage(calls: list[dict]):
+    """
+    Writes a batch of LLM call records (session_id, model, iteration, prompt_tokens, completion_tokens, cost_usd,
+    created_at) and folds them into the per-session and per-day totals, all in one transaction.
+    Returns True on success, False on failure.
+    """
+    if not calls:
+        return True
+    sessions: dict[str, list] = {}
+    days: dict[tuple[str, str], list] = {}
+    for call in calls:
+        totals = sessions.setdefault(call['session_id'], [0, 0, 0, 0.0, call['created_at'], call['created_at']])
+        totals[0] += 1; totals[1] += call['prompt_tokens']; totals[2] += call['completion_tokens']; totals[3] += call['cost_usd']
+        totals[4] = min(totals[4], call['created_at']); totals[5] = max(totals[5], call['created_at'])
+        day_totals = days.setdefault((call['created_at'][:10], call['model']), [0, 0, 0, 0.0])
+        day_totals[0] += 1; day_totals[1] += call['prompt_tokens']; day_totals[2] += call['completion_tokens']; day_totals[3] += call['cost_usd']
+
+    def record(conn):
+        conn.executemany(
+            """
+            INSERT INTO llm_usage_calls (session_id, model, iteration, prompt_tokens, completion_tokens, cost_usd, created_at)
+            VALUES (:session_id, :model, :iteration, :prompt_tokens, :completion_tokens, :cost_usd, :created_at)
+            """,
+            calls
+        )
+        conn.executemany(
+            """
+            INSERT INTO llm_usage_sessions (session_id, calls, prompt_tokens, completion_tokens, cost_usd, first_call_at, last_call_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET
+                calls = calls + excluded.calls,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                cost_usd = cost_usd + excluded.cost_usd,
+                last_call_at = MAX(last_call_at, excluded.last_call_at)
+            """,
+            [(session_id, *totals) for session_id, totals in sessions.items()]
+        )
+        conn.executemany(
+            """
+            INSERT INTO llm_usage_daily (day, model, calls, prompt_tokens, completion_tokens, cost_usd)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, model) DO UPDATE SET
+                calls = calls + excluded.calls,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                cost_usd = cost_usd + excluded.cost_usd
+            """,
+            [(day, model, *totals) for (day, model), totals in days.items()]
+        )
+
+    try:
+        run_write(record)
+        return True
+    except Exception as e:
+        print(f"Error recording LLM usage: {e}")
+        return False
+
+def get_session_usage(session_id: str):
+    """Returns the token and cost totals for one session, or None if it has made no recorded LLM calls."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM llm_usage_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"Error getting session usage: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_session_usage_calls(session_id: str, limit: int = 100):
+    """Returns the most recent LLM call records for a session, newest first."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """
+            SELECT model, iteration, prompt_tokens, completion_tokens, cost_usd, created_at
+            FROM llm_usage_calls WHERE session_id = ? ORDER BY call_id DESC LIMIT ?
+            """,
+            (session_id, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting session usage calls: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_daily_usage(start_day: str, end_day: str):
+    """Returns per-day, per-model totals between two 'YYYY-MM-DD' days, inclusive."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT * FROM llm_usage_daily WHERE day BETWEEN ? AND ? ORDER BY day, model", (start_day, end_day)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting daily usage: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_top_sessions_by_cost(since: str, limit: int = 20):
+    """Returns the sessions with the highest LLM cost whose last call was at or after `since` ('YYYY-MM-DD HH:MM:SS')."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT * FROM llm_usage_sessions WHERE last_call_at >= ? ORDER BY cost_usd DESC LIMIT ?", (since, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting top sessions by cost: {e}")
+        return []
+    finally:
+        conn.close()
+
+def rebuild_analytics_rollups():
+    """
+    Recomputes the analytics rollups from the appointments table, for backfilling a database that predates them or
+    repairing drift. The load tables are rebuilt exactly from booked appointments. booking_daily_stats is only
+    backfilled for (day, service) pairs it has no row for, and only approximately: bookings are counted on the day
+    they were created and cancellations on that same day, since reschedules, modifications and cancellation times
+    are not recorded anywhere else. Rows already counted incrementally are kept as they are.
+    Returns the number of rows written per table, or None on error.
+    """
+    def rebuild(conn):
+        conn.execute("DELETE FROM consultant_daily_load")
+        conn.execute("DELETE FROM service_hourly_load")
+        consultant_rows = conn.execute(
+            """
+            INSERT INTO consultant_daily_load (day, consultant_id, booked_slots)
+            SELECT substr(appointment_datetime, 1, 10), consultant_id, COUNT(*)
+            FROM appointments WHERE status = 'booked'
+            GROUP BY 1, 2
+            """
+        ).rowcount
+        hourly_rows = conn.execute(
+            """
+            INSERT INTO service_hourly_load (day, hour, service_id, booked_slots)
+            SELECT substr(appointment_datetime, 1, 10), CAST(substr(appointment_datetime, 12, 2) AS INTEGER), service_id, COUNT(*)
+            FROM appointments WHERE status = 'booked'
+            GROUP BY 1, 2, 3
+            """
+        ).rowcount
+        daily_rows = conn.execute(
+            """
+            INSERT INTO booking_daily_stats (day, service_id, booked, cancelled)
+            SELECT date(created_at), service_id, COUNT(*), SUM(status = 'cancelled')
+            FROM appointments WHERE created_at IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (day, service_id) DO NOTHING
+            """
+        ).rowcount
+        return {'consultant_daily_load': consultant_rows, 'service_hourly_load': hourly_rows, 'booking_daily_stats': daily_rows}
+
+    try:
+        return run_write(rebuild)
+    except Exception as e:
+        print(f"Error rebuilding analytics rollups: {e}")
+        return None
+
+def get_booking_daily_stats(start_day: str, end_day: str):
+    """Booking changes per day and service between two 'YYYY-MM-DD' days (inclusive)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """
+            SELECT b.day, b.service_id, s.service_name, b.booked, b.cancelled, b.rescheduled, b.modified
+            FROM booking_daily_stats b
+            LEFT JOIN services s ON s.service_id = b.service_id
+            WHERE b.day BETWEEN ? AND ?
+            ORDER BY b.day, b.service_id
+            """,
+            (start_day, end_day)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting booking stats: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_consultant_daily_load(start_day: str, end_day: str):
+    """Booked slots per consultant and appointment day between two 'YYYY-MM-DD' days (inclusive)."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT day, consultant_id, booked_slots FROM consultant_daily_load WHERE day BETWEEN ? AND ? AND booked_slots > 0",
+            (start_day, end_day)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting consultant load: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_service_hourly_load(start_day: str, end_day: str, service_id: int | None = None):
+    """Booked slots per appointment day, hour and service between two 'YYYY-MM-DD' days (inclusive)."""
+    conn = get_db_connection()
+    try:
+        sql = "SELECT day, hour, service_id, booked_slots FROM service_hourly_load WHERE day BETWEEN ? AND ? AND booked_slots > 0"
+        params: list = [start_day, end_day]
+        if service_id is not None:
+            sql += " AND service_id = ?"
+            params.append(service_id)
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+    except Exception as e:
+        print(f"Error getting hourly load: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_availability_windows(service_id: int | None = None):
+    """Weekly availability windows of every consultant (optionally of one service), with the consultant's service."""
+    conn = get_db_connection()
+    try:
+        sql = """
+            SELECT c.consultant_id, c.name, c.service_id, a.day_of_week, a.start_time, a.end_time
+            FROM consultants c
+            JOIN consultant_availability a ON a.consultant_id = c.consultant_id
+        """
+        params: list = []
+        if service_id is not None:
+            sql += " WHERE c.service_id = ?"
+            params.append(service_id)
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+    except Exception as e:
+        print(f"Error getting availability windows: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_appointment_events(after_event_id: int, limit: int = 100):
+    """Outbox events after after_event_id, oldest first: [{'event_id', 'event_type', 'appointment_id', 'payload' (JSON text), 'created_at'}]."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT event_id, event_type, appointment_id, payload, created_at
+            FROM appointment_events WHERE event_id > ? ORDER BY event_id LIMIT ?
+            """,
+            (after_event_id, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Error reading appointment events: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_last_event_id():
+    conn = get_db_connection()
+    try:
+        return conn.execute("SELECT COALESCE(MAX(event_id), 0) FROM appointment_events").fetchone()[0]
+    except Exception as e:
+        print(f"Error reading last appointment event: {e}")
+        return None
+    finally:
+        conn.close()
+
+def ensure_webhook_cursors(urls: list[str]):
+    """
+    Returns {url: {'last_event_id', 'delivered'}} for each webhook URL. A URL seen for the first time starts at the
+    newest event, so it receives changes from now on rather than the retained history. Returns None on error.
+    """
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def ensure(conn):
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO webhook_cursors (url, last_event_id, updated_at)
+            SELECT ?, COALESCE(MAX(event_id), 0), ? FROM appointment_events
+            """,
+            [(url, now) for url in urls]
+        )
+        rows = conn.execute(
+            f"SELECT url, last_event_id, delivered FROM webhook_cursors WHERE url IN ({','.join('?' * len(urls))})", urls
+        ).fetchall()
+        return {row['url']: {'last_event_id': row['last_event_id'], 'delivered': row['delivered']} for row in rows}
+
+    if not urls:
+        return {}
+    try:
+        return run_write(ensure)
+    except Exception as e:
+        print(f"Error preparing webhook cursors: {e}")
+        return None
+
+def advance_webhook_cursor(url: str, last_event_id: int, delivered: int):
+    """Records that the webhook acknowledged every event up to last_event_id. Returns True on success."""
+    try:
+        return run_write(lambda conn: conn.execute(
+            """
+            UPDATE webhook_cursors SET last_event_id = ?, delivered = delivered + ?, updated_at = ?
+            WHERE url = ? AND last_event_id < ?
+            """,
+            (last_event_id, delivered, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), url, last_event_id)
+        ).rowcount > 0)
+    except Exception as e:
+        print(f"Error advancing webhook cursor: {e}")
+        return False
+
+def prune_appointment_events(cutoff: str, urls: list[str], limit: int = 5000):
+    """
+    Deletes up to `limit` events created before cutoff (UTC) that every webhook in urls has acknowledged.
+    Returns the number deleted, or None on error.
+    """
+    acknowledged = (
+        f"(SELECT COALESCE(MIN(last_event_id), 0) FROM webhook_cursors WHERE url IN ({','.join('?' * len(urls))}))"
+        if urls else "(SELECT MAX(event_id) FROM appointment_events)"
+    )
+    try:
+        return run_write(lambda conn: conn.execute(
+            f"""
+            DELETE FROM appointment_events WHERE event_id IN (
+                SELECT event_id FROM appointment_events
+                WHERE event_id <= {acknowledged} AND created_at < ?
+                ORDER BY event_id LIMIT ?)
+            """,
+            (*urls, cutoff, limit)
+        ).rowcount)
+    except Exception as e:
+        print(f"Error pruning appointment events: {e}")
+        return None
+
+def get_appointments_version():
+    """
+    (sequence, last_changed_at) for conditional exports. The sequence is the appointment_events outbox sequence,
+    which moves with every booking change, plus the newest appointment_id so rows written behind the outbox's back
+    (seed_large_db) count too. last_changed_at is the UTC 'YYYY-MM-DD HH:MM:SS' of the newest event still in the
+    outbox, or None once it has been pruned. Returns None on error.
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT (SELECT seq FROM sqlite_sequence WHERE name = 'appointment_events') AS sequence,
+                   (SELECT MAX(appointment_id) FROM appointments) AS newest_appointment_id,
+                   (SELECT created_at FROM appointment_events ORDER BY event_id DESC LIMIT 1) AS last_changed_at
+            """
+        ).fetchone()
+        return f"{row['sequence'] or 0}.{row['newest_appointment_id'] or 0}", row['last_changed_at']
+    except Exception as e:
+        print(f"Error reading appointments version: {e}")
+        return None
+    finally:
+        conn.close()
+
+def iter_appointments(start_datetime_str: str, end_datetime_str: str, consultant_id: int | None = None,
+                      service_id: int | None = None, status: str | None = 'booked', batch_size: int = 1000):
+    """
+    Yields lists of up to batch_size appointments with start_datetime_str <= appointment_datetime < end_datetime_str,
+    in appointment_datetime order. Rows come from one cursor read batch by batch, so memory does not grow with the
+    range, and the whole export sees one snapshot. status=None includes every status. Service and consultant
+    names come from the reference data snapshot. Database errors are raised: a half-sent export cannot be turned
+    into an empty result.
+    """
+    conditions, params = ["a.appointment_datetime >= ?", "a.appointment_datetime < ?"], [start_datetime_str, end_datetime_str]
+    for column, value in (('consultant_id', consultant_id), ('service_id', service_id), ('status', status)):
+        if value is not None:
+            conditions.append(f"a.{column} = ?")
+            params.append(value)
+
+    reference = get_reference_data()
+    # Streaming responses advance the generator from whichever worker thread is free.
+    conn = open_read_connection(DB_PATH, check_same_thread=False)
+    try:
+        cursor = conn.execute(
+            f"""
+            SELECT a.appointment_id, a.appointment_datetime, a.status, a.service_id, a.consultant_id, a.created_at,
+                   u.name AS user_name, u.email AS user_email
+            FROM appointments a JOIN users u ON u.user_id = a.user_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.appointment_datetime
+            """,
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                appointment = dict(row)
+                consultant = reference.consultants.get(row['consultant_id'])
+                appointment['service_name'] = reference.service_name(row['service_id'])
+                appointment['consultant_name'] = consultant['name'] if consultant else None
+                batch.append(appointment)
+            yield batch
+    finally:
+        conn.close()
+
+def get_all_services():
+    """Fetches a list of all available services."""
+    try:
+        services = get_reference_data().services.values()
+        return sorted((dict(service) for service in services), key=lambda service: service['service_name'])
+    except Exception as e:
+        print(f"Error getting all services: {e}")
+        return []
+
+def get_consultants_by_service(service_name: str):
+    """Fetches all consultants associated with a specific service name."""
+    try:
+        reference = get_reference_data()
+        service_id = reference.service_id(service_name)
+        consultants = [
+            {'consultant_id': c['consultant_id'], 'name': c['name'], 'email': c['email']}
+            for c in reference.consultants.values() if c['service_id'] == service_id
+        ]
+        return sorted(consultants, key=lambda consultant: consultant['name'])
+    except Exception as e:
+        print(f"Error getting consultants by service: {e}")
+        return [] # Return empty list on error
\ No newline at end of file
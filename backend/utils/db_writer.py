@@ -0,0 +1,175 @@
+import os
+import queue
+import sqlite3
+import threading
+import urllib.parse
+from concurrent.futures import Future
+
+
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Most write commands grouped into one transaction. The writer never waits to fill a batch: it takes whatever
+# queued up while the previous commit was running, so batches only grow under load.
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))
+
+_STOP = object()
+
+
+def open_read_connection(db_path: str, check_same_thread: bool = True):
+    """
+    Read-only connection. In WAL mode readers never block the writer and are never blocked by it, and
+    they see every write that has been acknowledged by SQLiteWriter.execute.
+    check_same_thread=False is for cursors handed from thread to thread (one at a time), e.g. by a streaming response.
+    """
+    uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def open_write_connection(db_path: str):
+    """The writer's connection: WAL journal, NORMAL sync (durable at checkpoints, safe against corruption) and explicit transactions."""
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteWriter:
+    """
+    Owns the only write connection, on a dedicated thread. Callers submit a function taking that connection;
+    queued commands are run back to back inside one BEGIN IMMEDIATE ... COMMIT, each under its own savepoint,
+    so a command that raises is rolled back alone and the rest of the batch still commits.
+    execute() returns (or raises) only after the batch holding the command has committed.
+    """
+
+    def __init__(self, batch_max: int = DB_WRITE_BATCH_MAX):
+        self.batch_max = max(1, batch_max)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local() # the write connection, visible only on the writer thread
+        self.batches = 0
+        self.commands = 0
+        self.failed_commands = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+
+    def execute(self, db_path: str, command):
+        """Runs command(conn) on the writer and returns its result. Exceptions raised by the command are re-raised here."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # A command calling another write function: it is already inside the batch's transaction.
+            return command(conn)
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((db_path, command, future))
+        return future.result()
+
+    def _run(self):
+        conn = conn_path = None
+        carried = None
+        while True:
+            item = carried if carried is not None else self._queue.get()
+            carried = None
+            if item is _STOP:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None # execute() starts a new thread from here on
+                        break
+                continue
+            batch = [item]
+            while len(batch) < self.batch_max:
+                try:
+                    following = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if following is _STOP or following[0] != item[0]:
+                    carried = following # a stop request or a different database ends the batch
+                    break
+                batch.append(following)
+            try:
+                if conn_path != item[0]:
+                    if conn is not None:
+                        conn.close()
+                    conn = conn_path = None
+                    conn = open_write_connection(item[0])
+                    conn_path = item[0]
+            except Exception as e:
+                print(f"SQLite writer: cannot open {item[0]}: {e}")
+                self._fail(batch, e)
+                continue
+            if not self._commit_batch(conn, batch):
+                # The connection is in an unknown state; the next batch opens a fresh one.
+                conn.close()
+                conn = conn_path = None
+        if conn is not None:
+            conn.close()
+
+    def _fail(self, batch: list, error: Exception):
+        self.failed_batches += 1
+        for _, _, future in batch:
+            future.set_exception(error)
+
+    def _commit_batch(self, conn, batch: list):
+        """Runs and commits one batch, then resolves its futures. Returns False if the connection should be replaced."""
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            for _, command, _ in batch:
+                conn.execute("SAVEPOINT command")
+                try:
+                    outcomes.append((command(conn), None))
+                    conn.execute("RELEASE command")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO command")
+                    conn.execute("RELEASE command")
+                    outcomes.append((None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # BEGIN, COMMIT or a rollback failed: nothing from this batch was written.
+            print(f"SQLite writer: batch of {len(batch)} failed: {e}")
+            self._fail(batch, e)
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                return True
+            except Exception:
+                return False
+        finally:
+            self._local.conn = None
+
+        self.batches += 1
+        self.commands += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, _, future), (value, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(value)
+            else:
+                self.failed_commands += 1
+                future.set_exception(error)
+        return True
+
+    def stop(self):
+        """Commits everything already queued, then closes the connection and ends the thread. execute() starts it again."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'commands': self.commands,
+            'average_batch': round(self.commands / self.batches, 2) if self.batches else None,
+            'largest_batch': self.largest_batch,
+            'failed_commands': self.failed_commands,
+            'failed_batches': self.failed_batches,
+            'queued': self._queue.qsize(),
+        }
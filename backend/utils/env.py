@@ -0,0 +1,12 @@
+from dotenv import load_dotenv
+
+_loaded = False
+
+
+def load_env():
+    """Loads .env into os.environ once per process. Variables already set in the environment win."""
+    global _loaded
+    if _loaded:
+        return
+    load_dotenv()
+    _loaded = True
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Tools that change the database or send email. Read-only tools are always re-executed.
+WRITE_TOOLS = {"book_appointment", "cancel_appointment", "reschedule_appointment", "modify_appointment_service",
+               "join_waitlist"}
+
+
+def _normalize_value(key: str, value):
+    """Normalizes a single argument so trivially different spellings of the same request map to one key."""
+    if isinstance(value, str):
+        value = value.strip()
+        if 'email' in key:
+            return value.lower()
+        if key.endswith('_id') and value.isdigit():
+            return int(value)
+        try:
+            return datetime.fromisoformat(value).isoformat(sep=' ')
+        except ValueError:
+            return value
+    if isinstance(value, dict):
+        return normalize_args(value)
+    if isinstance(value, list):
+        return [_normalize_value(key, item) for item in value]
+    return value
+
+
+def normalize_args(args: dict):
+    """Returns a copy of the tool arguments with emails lower-cased, whitespace stripped and datetimes canonical."""
+    return {key: _normalize_value(key, args[key]) for key in sorted(args)}
+
+
+def make_idempotency_key(scope: str, name: str, payload) -> str:
+    """
+    Derives a stable key from a scope (usually the session id), an operation name and its payload.
+    Dict payloads are normalized first; anything else is hashed as canonical JSON.
+    """
+    if isinstance(payload, dict):
+        payload = normalize_args(payload)
+    raw = json.dumps([scope, name, payload], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TTLDedupStore:
+    """
+    Thread-safe, bounded store of recorded results keyed by idempotency key.
+    Entries expire after `ttl_seconds`; the oldest entries are evicted once `max_entries` is reached.
+    Keys are grouped by scope so a scope's entries can be dropped together.
+    """
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str, object]] = OrderedDict()
+        self._keys_by_scope: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            scope_keys = self._keys_by_scope.get(entry[1])
+            if scope_keys is not None:
+                scope_keys.discard(key)
+                if not scope_keys:
+                    del self._keys_by_scope[entry[1]]
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._drop(key)
+
+    def get(self, key: str, default=None):
+        """Returns the recorded result for key, or default when missing or expired."""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, value, scope: str = ""):
+        """Records a result. Entries are kept in insertion order, which is also expiry order."""
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, scope, value)
+            self._keys_by_scope.setdefault(scope, set()).add(key)
+            self._expire(time.monotonic())
+
+    def forget_scope(self, scope: str):
+        """Drops every recorded result for a scope."""
+        with self._lock:
+            for key in list(self._keys_by_scope.get(scope, ())):
+                self._drop(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
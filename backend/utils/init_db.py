@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from .db_utils import normalize_email
 
 SCRIPT_PATH = os.path.abspath(__file__)
 
@@ -13,14 +14,70 @@ DB_NAME = 'consulting.db'
 DB_PATH = os.path.join(DB_DIR, DB_NAME)
 
 
-def initialize_database():
+APPOINTMENTS_TABLE_SQL = '''
+                 CREATE TABLE IF NOT EXISTS {table}(
+                 appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 user_id INTEGER NOT NULL,
+                 appointment_datetime TEXT NOT NULL,
+                 consultant_id INTEGER NOT NULL,
+                 service_id INTEGER NOT NULL,
+                 status TEXT NOT NULL DEFAULT 'booked',
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                 confirmation_sent_at TIMESTAMP NULL,
+                 FOREIGN KEY (user_id) REFERENCES users (user_id),
+                 FOREIGN KEY (consultant_id) REFERENCES consultants (consultant_id),
+                 FOREIGN KEY (service_id) REFERENCES services (service_id)
+                 )
+                 '''
+
+
+def _migrate_appointments_to_users(conn):
+    '''
+    Moves an appointments table that still stores user_name / user_email on every row onto the users table:
+    one user per normalized email (named after their latest booking), then the table is rebuilt with user_id
+    in place of the two strings. Runs as one transaction; appointment IDs are kept.
+    '''
+    print("Migrating appointments to the users table (one-off, may take a while on large databases)...")
+    conn.commit()
+    conn.create_function('normalize_email', 1, normalize_email, deterministic=True)
+    try:
+        conn.execute("BEGIN")
+        conn.execute('''
+                 INSERT INTO users (email, name)
+                 SELECT normalize_email(user_email), user_name FROM appointments WHERE 1 ORDER BY appointment_id
+                 ON CONFLICT (email) DO UPDATE SET name = excluded.name
+                 ''')
+        conn.execute(APPOINTMENTS_TABLE_SQL.format(table='appointments_migrated'))
+        conn.execute('''
+                 INSERT INTO appointments_migrated (appointment_id, user_id, appointment_datetime, consultant_id, service_id,
+                                                    status, created_at, confirmation_sent_at)
+                 SELECT a.appointment_id, u.user_id, a.appointment_datetime, a.consultant_id, a.service_id,
+                        a.status, a.created_at, a.confirmation_sent_at
+                 FROM appointments a JOIN users u ON u.email = normalize_email(a.user_email)
+                 ''')
+        conn.execute("DROP TABLE appointments")
+        conn.execute("ALTER TABLE appointments_migrated RENAME TO appointments")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    print(f"Migrated appointments to {users} users.")
+
+
+def initialize_database(db_path: str = DB_PATH):
     '''Initializes and populates consulting database with seed data regarding the consultants'''
 
-    os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    # Lets the retention job hand freed pages back in small slices (PRAGMA incremental_vacuum). Only takes effect
+    # on a new file; an existing one is converted with a one-off VACUUM below.
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL is persistent: the app's read-only connections then never block, or are blocked by, the single writer.
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
 
-    print("Database created successfully at data/consulting.db.")
+    print(f"Database created successfully at {db_path}.")
 
 
     
@@ -58,24 +115,43 @@ def initialize_database():
                    ''')
     print("Created 'consultant_availability' table.")
 
+    # The app keeps services, consultants and availability in an in-memory snapshot (db_utils.get_reference_data).
+    # Any change to those tables bumps this version, which is how running servers notice and reload.
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS reference_data_version(
+                   id INTEGER PRIMARY KEY CHECK (id = 1),
+                   version INTEGER NOT NULL
+                   )
+                   ''')
+    cursor.execute("INSERT OR IGNORE INTO reference_data_version (id, version) VALUES (1, 1)")
+    for table in ('services', 'consultants', 'consultant_availability'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                   CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table} BEGIN
+                      UPDATE reference_data_version SET version = version + 1 WHERE id = 1;
+                   END
+                   ''')
+    print("Created 'reference_data_version' table and triggers.")
+
 
     cursor.execute('''
-                 CREATE TABLE IF NOT EXISTS appointments(
-                 appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 user_name TEXT NOT NULL,
-                 user_email TEXT NOT NULL,
-                 appointment_datetime TEXT NOT NULL,
-                 consultant_id INTEGER NOT NULL,
-                 service_id INTEGER NOT NULL,
-                 status TEXT NOT NULL DEFAULT 'booked',
-                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                 confirmation_sent_at TIMESTAMP NULL,
-                 FOREIGN KEY (consultant_id) REFERENCES consultants (consultant_id),
-                 FOREIGN KEY (service_id) REFERENCES services (service_id)
+                 CREATE TABLE IF NOT EXISTS users(
+                 user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 email TEXT NOT NULL, -- normalized: trimmed and lower-cased (db_utils.normalize_email)
+                 name TEXT NOT NULL, -- the name given with the latest booking
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                  )
                  ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email)")
+    print("Created 'users' table.")
+
+    cursor.execute(APPOINTMENTS_TABLE_SQL.format(table='appointments'))
     print("Created 'appointments' table.")
 
+    appointment_columns = {row[1] for row in cursor.execute("PRAGMA table_info(appointments)")}
+    if 'user_email' in appointment_columns:
+        _migrate_appointments_to_users(conn)
+
     cursor.execute('''
     CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_booked_appointment
     ON appointments (consultant_id, appointment_datetime)
@@ -83,6 +159,11 @@ def initialize_database():
     ''')
     print("Created 'unique booked appointments' index.")
 
+    # Serves get_user_appointments and the ownership check of every cancel / reschedule / modify.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_user ON appointments (user_id, appointment_datetime)")
+    # Date-range exports (backend/routes/export.py) walk this in order instead of sorting the whole range.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_datetime ON appointments (appointment_datetime)")
+
     
     cursor.execute('''CREATE TABLE IF NOT EXISTS conversation_history(
                    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -94,6 +175,42 @@ def initialize_database():
                    ''')
     print("Created 'conversation_history' table.")
 
+    # Serves get_conversation_history and the retention job's scan for inactive sessions.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_history_session ON conversation_history (session_id, timestamp)")
+
+    # Full-text index over message_text. It stores no copy of the text (content= points at conversation_history)
+    # and is kept in step by triggers, so every insert and delete updates it in the same transaction.
+    fts_exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'conversation_fts'").fetchone()
+    cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS conversation_fts USING fts5(
+                   message_text,
+                   content = 'conversation_history',
+                   content_rowid = 'message_id',
+                   tokenize = 'unicode61 remove_diacritics 2'
+                   )
+                   ''')
+    cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS conversation_fts_insert AFTER INSERT ON conversation_history BEGIN
+                   INSERT INTO conversation_fts (rowid, message_text) VALUES (new.message_id, new.message_text);
+                END
+                   ''')
+    cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS conversation_fts_delete AFTER DELETE ON conversation_history BEGIN
+                   INSERT INTO conversation_fts (conversation_fts, rowid, message_text) VALUES ('delete', old.message_id, old.message_text);
+                END
+                   ''')
+    cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS conversation_fts_update AFTER UPDATE OF message_text ON conversation_history BEGIN
+                   INSERT INTO conversation_fts (conversation_fts, rowid, message_text) VALUES ('delete', old.message_id, old.message_text);
+                   INSERT INTO conversation_fts (rowid, message_text) VALUES (new.message_id, new.message_text);
+                END
+                   ''')
+    if not fts_exists:
+        # Existing databases: index the messages written before the table existed.
+        cursor.execute("INSERT INTO conversation_fts (conversation_fts) VALUES ('rebuild')")
+        conn.commit()
+    print("Created 'conversation_fts' full-text index and triggers.")
+
     cursor.execute('''
                 CREATE TABLE IF NOT EXISTS session_state(
                    session_id TEXT PRIMARY KEY,
@@ -109,6 +226,168 @@ def initialize_database():
                    ''')
     print("Created 'session_state' table.")
 
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminders(
+                   reminder_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   appointment_id INTEGER NOT NULL,
+                   reminder_type TEXT NOT NULL, -- '24h' or '1h'
+                   due_at TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:SS'
+                   status TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'sending', 'sent', 'cancelled', 'skipped', 'failed'
+                   sent_at TIMESTAMP NULL,
+                   FOREIGN KEY (appointment_id) REFERENCES appointments (appointment_id)
+                   )
+                   ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_reminders_pending_due
+    ON reminders (due_at)
+    WHERE status = 'pending'
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reminders_appointment ON reminders (appointment_id)")
+    print("Created 'reminders' table and indexes.")
+
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS slot_holds(
+                   hold_token TEXT PRIMARY KEY,
+                   session_id TEXT NOT NULL,
+                   consultant_id INTEGER NOT NULL,
+                   service_id INTEGER NOT NULL,
+                   appointment_datetime TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:SS'
+                   expires_at TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:SS'
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   FOREIGN KEY (consultant_id) REFERENCES consultants (consultant_id),
+                   FOREIGN KEY (service_id) REFERENCES services (service_id)
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_datetime ON slot_holds (appointment_datetime)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_expires ON slot_holds (expires_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_session ON slot_holds (session_id, created_at)")
+    print("Created 'slot_holds' table and indexes.")
+
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS waitlist(
+                   waitlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   user_name TEXT NOT NULL,
+                   user_email TEXT NOT NULL,
+                   service_id INTEGER NOT NULL,
+                   requested_datetime TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:SS'
+                   status TEXT NOT NULL DEFAULT 'waiting', -- 'waiting', 'booked', 'cancelled'
+                   appointment_id INTEGER NULL,
+                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                   notified_at TIMESTAMP NULL,
+                   FOREIGN KEY (service_id) REFERENCES services (service_id),
+                   FOREIGN KEY (appointment_id) REFERENCES appointments (appointment_id)
+                   )
+                   ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_waitlist_slot
+    ON waitlist (service_id, requested_datetime, waitlist_id)
+    WHERE status = 'waiting'
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_waitlist_unnotified
+    ON waitlist (waitlist_id)
+    WHERE status = 'booked' AND notified_at IS NULL
+    ''')
+    print("Created 'waitlist' table and indexes.")
+
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS llm_usage_calls(
+                   call_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   session_id TEXT NOT NULL,
+                   model TEXT NOT NULL,
+                   iteration INTEGER NOT NULL, -- agent loop iteration within the turn
+                   prompt_tokens INTEGER NOT NULL,
+                   completion_tokens INTEGER NOT NULL,
+                   cost_usd REAL NOT NULL,
+                   created_at TEXT NOT NULL -- 'YYYY-MM-DD HH:MM:SS'
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_calls_session ON llm_usage_calls (session_id, call_id)")
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS llm_usage_sessions(
+                   session_id TEXT PRIMARY KEY,
+                   calls INTEGER NOT NULL DEFAULT 0,
+                   prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                   completion_tokens INTEGER NOT NULL DEFAULT 0,
+                   cost_usd REAL NOT NULL DEFAULT 0,
+                   first_call_at TEXT NOT NULL,
+                   last_call_at TEXT NOT NULL
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_sessions_last_call ON llm_usage_sessions (last_call_at)")
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS llm_usage_daily(
+                   day TEXT NOT NULL, -- 'YYYY-MM-DD'
+                   model TEXT NOT NULL,
+                   calls INTEGER NOT NULL DEFAULT 0,
+                   prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                   completion_tokens INTEGER NOT NULL DEFAULT 0,
+                   cost_usd REAL NOT NULL DEFAULT 0,
+                   PRIMARY KEY (day, model)
+                   )
+                   ''')
+    print("Created 'llm_usage_calls', 'llm_usage_sessions' and 'llm_usage_daily' tables.")
+
+    # Analytics rollups, updated by the booking write functions in the same transaction as the change itself.
+    # booking_daily_stats counts changes per day they happened (UTC); the two load tables count booked slots per
+    # day (and hour) of the appointment itself.
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS booking_daily_stats(
+                   day TEXT NOT NULL, -- 'YYYY-MM-DD'
+                   service_id INTEGER NOT NULL,
+                   booked INTEGER NOT NULL DEFAULT 0,
+                   cancelled INTEGER NOT NULL DEFAULT 0,
+                   rescheduled INTEGER NOT NULL DEFAULT 0,
+                   modified INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (day, service_id)
+                   )
+                   ''')
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS consultant_daily_load(
+                   day TEXT NOT NULL,
+                   consultant_id INTEGER NOT NULL,
+                   booked_slots INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (day, consultant_id)
+                   )
+                   ''')
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS service_hourly_load(
+                   day TEXT NOT NULL,
+                   hour INTEGER NOT NULL,
+                   service_id INTEGER NOT NULL,
+                   booked_slots INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (day, hour, service_id)
+                   )
+                   ''')
+    print("Created 'booking_daily_stats', 'consultant_daily_load' and 'service_hourly_load' rollup tables.")
+
+    # Transactional outbox: the booking write functions append one row per change in the same transaction, and the
+    # webhook dispatcher delivers them in event_id order, keeping one cursor per webhook URL.
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS appointment_events(
+                   event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   event_type TEXT NOT NULL, -- 'appointment.booked', '.cancelled', '.rescheduled', '.service_changed'
+                   appointment_id INTEGER NOT NULL,
+                   payload TEXT NOT NULL, -- JSON
+                   created_at TEXT NOT NULL -- 'YYYY-MM-DD HH:MM:SS', UTC
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointment_events_created ON appointment_events (created_at)")
+    cursor.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_cursors(
+                   url TEXT PRIMARY KEY,
+                   last_event_id INTEGER NOT NULL, -- last event acknowledged by the webhook
+                   delivered INTEGER NOT NULL DEFAULT 0,
+                   updated_at TEXT NOT NULL
+                   )
+                   ''')
+    print("Created 'appointment_events' outbox and 'webhook_cursors' tables.")
+
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("Converting existing database to incremental auto-vacuum (one-off VACUUM, may take a while on large files)...")
+        conn.commit()
+        conn.execute("VACUUM")
+
     try:
         services = [('Technology', 'Consulting on cloud, AI and software implementation.'),
                     ('Sales', 'Consulting on sales strategy, CRM and team training.'),
@@ -0,0 +1,26 @@
+import argparse
+
+from . import db_utils
+
+
+def rebuild(db_path: str | None = None):
+    '''Recomputes the analytics rollup tables of db_path (the application database by default) from its appointments.'''
+    if db_path:
+        db_utils.DB_PATH = db_path
+    print(f"Rebuilding analytics rollups in {db_utils.DB_PATH}...")
+    counts = db_utils.rebuild_analytics_rollups()
+    db_utils.writer.stop()
+    if counts is None:
+        print("Rebuild failed.")
+        return False
+    for table, rows in counts.items():
+        print(f"  {table}: {rows} rows")
+    print("Done. Reschedules and modifications from before the rollups existed cannot be recovered and stay at zero.")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or repair the analytics rollup tables from the appointments table.")
+    parser.add_argument('--db', default=None, help="Database file (defaults to the application database).")
+    args = parser.parse_args()
+    raise SystemExit(0 if rebuild(args.db) else 1)
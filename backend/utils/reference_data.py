@@ -0,0 +1,65 @@
+from types import MappingProxyType
+from datetime import datetime
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class ReferenceData:
+    """
+    Immutable snapshot of the rows that almost never change: services, consultants and their weekly availability
+    windows. Built once per reference_data_version and replaced as a whole when that version moves (see
+    db_utils.get_reference_data), so readers can hold on to one without locking.
+    """
+
+    __slots__ = ('version', 'loaded_at', 'services', 'service_ids', 'consultants', '_windows')
+
+    def __init__(self, version: int, services: list[dict], consultants: list[dict], availability: list[dict]):
+        self.version = version
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # service_id -> {'service_id', 'service_name', 'description'}, in service_id order
+        self.services = MappingProxyType({
+            row['service_id']: MappingProxyType(dict(row)) for row in sorted(services, key=lambda row: row['service_id'])
+        })
+        self.service_ids = MappingProxyType({row['service_name']: row['service_id'] for row in self.services.values()})
+        # consultant_id -> {'consultant_id', 'name', 'email', 'service_id'}
+        self.consultants = MappingProxyType({row['consultant_id']: MappingProxyType(dict(row)) for row in consultants})
+
+        # (service_id, day_of_week) -> ((consultant_id, name, start minute, end minute), ...) by consultant_id
+        windows: dict[tuple[int, int], list[tuple]] = {}
+        for row in availability:
+            consultant = self.consultants.get(row['consultant_id'])
+            if consultant is None:
+                continue
+            windows.setdefault((consultant['service_id'], row['day_of_week']), []).append(
+                (consultant['consultant_id'], consultant['name'], _minutes(row['start_time']), _minutes(row['end_time']))
+            )
+        self._windows = MappingProxyType({key: tuple(sorted(value)) for key, value in windows.items()})
+
+    def service_name(self, service_id: int):
+        service = self.services.get(service_id)
+        return service['service_name'] if service else None
+
+    def service_id(self, service_name: str):
+        return self.service_ids.get(service_name)
+
+    def candidates(self, service_name: str, slot: datetime):
+        """
+        Consultants of the service whose availability window holds the whole 60-minute slot starting at `slot`,
+        as [{'consultant_id', 'name'}] in consultant_id order. Bookings and holds are not considered.
+        """
+        service_id = self.service_ids.get(service_name)
+        if service_id is None:
+            return []
+        start = slot.hour * 60 + slot.minute
+        found = {}
+        for consultant_id, name, window_start, window_end in self._windows.get((service_id, slot.weekday()), ()):
+            if window_start <= start and start + 60 <= window_end:
+                found.setdefault(consultant_id, {'consultant_id': consultant_id, 'name': name})
+        return list(found.values())
+
+    def services_summary(self) -> str:
+        """'1=Technology, 2=Sales, ...' for prompts and tool descriptions."""
+        return ", ".join(f"{service_id}={service['service_name']}" for service_id, service in self.services.items())
@@ -0,0 +1,222 @@
+import os
+import random
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+
+from .init_db import DB_DIR, initialize_database
+
+
+LARGE_DB_PATH = os.path.join(DB_DIR, 'consulting_large.db')
+
+# Hourly start times that fit inside the standard 10-13 / 14-19 work blocks.
+SLOT_HOURS = [10, 11, 12, 14, 15, 16, 17, 18]
+
+FIRST_NAMES = ['Alex', 'Maria', 'John', 'Priya', 'Wei', 'Fatima', 'Lucas', 'Emma', 'Omar', 'Sofia', 'Kenji', 'Grace']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Patel', 'Brown', 'Khan', 'Muller', 'Rossi', 'Tanaka', 'Silva', 'Jones', 'Kim']
+
+USER_MESSAGES = [
+    "Hi, I'd like to book a {service} consultation for {when}.",
+    "Can you check if anyone is free on {when}?",
+    "My email is {email}, can you show my appointments?",
+    "Please cancel appointment {appt_id}.",
+    "Yes, please go ahead.",
+    "Could we move it to {when} instead?",
+]
+AI_MESSAGES = [
+    "Sure! Could you share your full name and email address?",
+    "A consultant is available at {when}. Shall I proceed with the booking?",
+    "Your appointment is confirmed. The appointment ID is {appt_id}.",
+    "I'm sorry, nobody is available at that time. The next open slot is {when}.",
+    "Your appointment has been cancelled.",
+]
+
+
+def _batched_insert(conn, query: str, rows, batch_size: int):
+    """Inserts rows from an iterable in fixed-size batches, committing after each batch."""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(query, batch)
+            conn.commit()
+            total += len(batch)
+            batch = []
+            print(f"  ... {total} rows")
+    if batch:
+        conn.executemany(query, batch)
+        conn.commit()
+        total += len(batch)
+    return total
+
+
+def _working_days(start: date, days: int):
+    """Returns all Monday-Friday dates in the window [start, start + days)."""
+    return [start + timedelta(days=i) for i in range(days) if (start + timedelta(days=i)).weekday() < 5]
+
+
+def seed_consultants(conn, count: int, rng: random.Random, batch_size: int):
+    """Adds `count` synthetic consultants spread across the existing services, each working Mon-Fri."""
+    service_ids = [row[0] for row in conn.execute("SELECT service_id FROM services ORDER BY service_id")]
+    start_id = conn.execute("SELECT COALESCE(MAX(consultant_id), 0) FROM consultants").fetchone()[0] + 1
+
+    consultants = (
+        (f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"consultant{start_id + i}@consult.com", rng.choice(service_ids))
+        for i in range(count)
+    )
+    print(f"Seeding {count} consultants...")
+    _batched_insert(conn, "INSERT INTO consultants (name, email, service_id) VALUES (?, ?, ?)", consultants, batch_size)
+
+    new_ids = list(range(start_id, start_id + count))
+    availability = (
+        (consultant_id, day, start_time, end_time)
+        for consultant_id in new_ids
+        for day in range(0, 5)
+        for start_time, end_time in (('10:00', '13:00'), ('14:00', '19:00'))
+    )
+    _batched_insert(
+        conn,
+        "INSERT INTO consultant_availability (consultant_id, day_of_week, start_time, end_time) VALUES (?, ?, ?, ?)",
+        availability,
+        batch_size,
+    )
+    return new_ids
+
+
+def seed_users(conn, count: int, rng: random.Random, batch_size: int):
+    """Adds `count` users (user0@example.com, user1@example.com, ...) and returns their user_ids in that order."""
+    first_id = (conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0] or 0) + 1
+    rows = ((f"user{n}@example.com", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}") for n in range(count))
+    print(f"Seeding {count} users...")
+    _batched_insert(conn, "INSERT INTO users (email, name) VALUES (?, ?)", rows, batch_size)
+    return list(range(first_id, first_id + count))
+
+
+def seed_appointments(conn, consultant_ids: list[int], count: int, user_ids: list[int], days: int, rng: random.Random, batch_size: int):
+    """
+    Adds `count` appointments on distinct (consultant, slot) pairs so the unique booked index is never violated.
+    Appointments are spread over a window centred on today, so there is a mix of past and future bookings.
+    """
+    service_by_consultant = dict(conn.execute("SELECT consultant_id, service_id FROM consultants"))
+    work_days = _working_days(date.today() - timedelta(days=days // 2), days)
+    slots_per_consultant = len(work_days) * len(SLOT_HOURS)
+    total_slots = slots_per_consultant * len(consultant_ids)
+
+    if count > total_slots:
+        print(f"Only {total_slots} distinct slots exist for this configuration; capping appointments.")
+        count = total_slots
+
+    def rows():
+        for slot in rng.sample(range(total_slots), count):
+            consultant_id = consultant_ids[slot // slots_per_consultant]
+            day_index, hour_index = divmod(slot % slots_per_consultant, len(SLOT_HOURS))
+            appt_dt = datetime.combine(work_days[day_index], datetime.min.time()).replace(hour=SLOT_HOURS[hour_index])
+            status = 'cancelled' if rng.random() < 0.1 else 'booked'
+            yield (
+                rng.choice(user_ids),
+                appt_dt.strftime('%Y-%m-%d %H:%M:%S'),
+                consultant_id,
+                service_by_consultant[consultant_id],
+                status,
+            )
+
+    print(f"Seeding {count} appointments for {len(user_ids)} users...")
+    return _batched_insert(
+        conn,
+        """
+        INSERT INTO appointments (user_id, appointment_datetime, consultant_id, service_id, status)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        rows(),
+        batch_size,
+    )
+
+
+def seed_conversations(conn, count: int, messages_per_session: int, days: int, rng: random.Random, batch_size: int):
+    """Adds `count` conversation messages grouped into sessions of alternating user/ai turns."""
+    services = [row[0] for row in conn.execute("SELECT service_name FROM services")]
+    start = datetime.now() - timedelta(days=days)
+    step_seconds = max(1, int(days * 86400 / max(count, 1)))
+
+    def rows():
+        session_id = None
+        for i in range(count):
+            if i % messages_per_session == 0:
+                session_id = f"http_session_seed_{i // messages_per_session:08d}"
+            when = (start + timedelta(days=rng.randrange(days), hours=rng.choice(SLOT_HOURS))).strftime('%Y-%m-%d %H:00')
+            values = {
+                'service': rng.choice(services),
+                'when': when,
+                'email': f"user{rng.randrange(count // messages_per_session + 1)}@example.com",
+                'appt_id': rng.randrange(1, 1_000_000),
+            }
+            role = 'user' if i % 2 == 0 else 'ai'
+            template = rng.choice(USER_MESSAGES if role == 'user' else AI_MESSAGES)
+            timestamp = (start + timedelta(seconds=i * step_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+            yield (session_id, role, template.format(**values), timestamp)
+
+    print(f"Seeding {count} conversation messages...")
+    return _batched_insert(
+        conn,
+        "INSERT INTO conversation_history (session_id, role, message_text, timestamp) VALUES (?, ?, ?, ?)",
+        rows(),
+        batch_size,
+    )
+
+
+def seed_large_database(db_path: str = LARGE_DB_PATH, consultants: int = 2000, appointments: int = 1_000_000,
+                        users: int = 200_000, messages: int = 1_000_000, messages_per_session: int = 12,
+                        days: int = 180, seed: int = 42, batch_size: int = 50_000):
+    '''Creates a fresh database at db_path and fills it with synthetic data at the requested scale.'''
+
+    if os.path.exists(db_path):
+        print(f"{db_path} already exists. Delete it first; the generator only seeds fresh databases.")
+        return
+
+    initialize_database(db_path)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Bulk load settings; the file is a disposable benchmark database.
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA journal_mode = MEMORY")
+
+        # Appointments only go to the synthetic Mon-Fri consultants so every row respects availability.
+        new_consultants = seed_consultants(conn, consultants, rng, batch_size)
+        if new_consultants:
+            seed_appointments(conn, new_consultants, appointments, seed_users(conn, users, rng, batch_size), days, rng, batch_size)
+        seed_conversations(conn, messages, messages_per_session, days, rng, batch_size)
+
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Large database ready at {db_path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large synthetic consulting database for benchmarking.")
+    parser.add_argument('--db', default=LARGE_DB_PATH, help="Path of the database file to create.")
+    parser.add_argument('--consultants', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=200_000, help="Number of distinct user emails.")
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--messages-per-session', type=int, default=12)
+    parser.add_argument('--days', type=int, default=180, help="Width of the date window the data is spread over.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    args = parser.parse_args()
+
+    seed_large_database(
+        db_path=args.db,
+        consultants=args.consultants,
+        appointments=args.appointments,
+        users=args.users,
+        messages=args.messages,
+        messages_per_session=args.messages_per_session,
+        days=args.days,
+        seed=args.seed,
+        batch_size=args.batch_size,
+    )
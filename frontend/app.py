@@ -2,10 +2,70 @@ import streamlit as st
 import requests
 import os
 import json
+import uuid
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 FASTAPI_BACKEND_URL = os.getenv("FASTAPI_BACKEND_URL", "http://127.0.0.1:8000")
 CHAT_ENDPOINT = f"{FASTAPI_BACKEND_URL}/chat_turn"
 
+# A turn can queue for an LLM slot and then run several tool iterations, so the read timeout is generous.
+CHAT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("CHAT_CONNECT_TIMEOUT_SECONDS", "3"))
+CHAT_READ_TIMEOUT_SECONDS = float(os.getenv("CHAT_READ_TIMEOUT_SECONDS", "120"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Messages shown at once; older ones are revealed a page at a time.
+CHAT_DISPLAY_WINDOW = int(os.getenv("CHAT_DISPLAY_WINDOW", "30"))
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+@st.cache_resource
+def get_http_session():
+    """
+    One keep-alive connection pool for every browser session of this Streamlit server.
+    Only failed connects are retried: the request never reached the backend, and the Idempotency-Key covers the rest.
+    """
+    session = requests.Session()
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def send_chat_turn(session_id, messages, idempotency_key, on_delta=None):
+    """
+    Posts one chat turn and returns the backend's {"session_id", "response"}. If the backend answers with
+    NDJSON, each {"delta": "..."} line is passed to on_delta as it arrives and later lines override earlier keys.
+    """
+    payload = {"session_id": session_id, "messages": messages}
+    headers = {"Idempotency-Key": idempotency_key, "Accept": f"{NDJSON_CONTENT_TYPE}, application/json"}
+    with get_http_session().post(CHAT_ENDPOINT, json=payload, headers=headers, stream=True,
+                                 timeout=(CHAT_CONNECT_TIMEOUT_SECONDS, CHAT_READ_TIMEOUT_SECONDS)) as response:
+        response.raise_for_status()
+        if not response.headers.get("Content-Type", "").startswith(NDJSON_CONTENT_TYPE):
+            return response.json()
+
+        result = {}
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if "delta" in event and on_delta:
+                on_delta(event.pop("delta"))
+            result.update(event)
+        return result
+
+
+def render_message(message):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+
+def show_earlier_messages():
+    st.session_state.display_window += CHAT_DISPLAY_WINDOW
+
+
 st.set_page_config(page_title="AI Receptionist", layout="wide")
 st.title("AI Receptionist Assistant 🤖")
 
@@ -16,45 +76,57 @@ if "messages" not in st.session_state:
 if "session_id" not in st.session_state:
     st.session_state.session_id = None
 
+if "display_window" not in st.session_state:
+    st.session_state.display_window = CHAT_DISPLAY_WINDOW
+
 st.header("Conversation")
 chat_container = st.container(height=400, border=True)
 with chat_container:
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    # Only the latest window is drawn, so each rerun costs the same however long the conversation gets.
+    hidden = max(0, len(st.session_state.messages) - st.session_state.display_window)
+    if hidden:
+        st.button(f"Show earlier messages ({hidden} hidden)", on_click=show_earlier_messages)
+    for message in st.session_state.messages[hidden:]:
+        render_message(message)
 
 if prompt := st.chat_input("Enter your message here..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    payload = {
-        "session_id": st.session_state.session_id,
-        "messages": st.session_state.messages
-    }
-
-    try:
-        with st.spinner("Assistant is thinking..."):
-            response = requests.post(CHAT_ENDPOINT, json=payload)
-            response.raise_for_status()
-
-            response_data = response.json()
-            ai_msg = response_data.get("response", "Sorry, I couldn't get a response.")
-
-            if st.session_state.session_id is None:
-                st.session_state.session_id = response_data.get("session_id")
-                print(f"[Streamlit] Received Session ID: {st.session_state.session_id}")
-
-        st.session_state.messages.append({"role": "assistant", "content": ai_msg})
-        st.rerun()
-
-    except requests.exceptions.HTTPError as http_err:
-         st.error(f"HTTP error occurred: {http_err} - {response.text}")
-         error_msg = f"Sorry, there was an error communicating ({response.status_code}). Please try again."
-         st.session_state.messages.append({"role": "assistant", "content": error_msg})
-         st.rerun()
-    except requests.exceptions.RequestException as req_err:
-        st.error(f"Connection error: {req_err}")
-        error_msg = "Sorry, I couldn't connect to the AI assistant. Please ensure the backend is running and accessible."
-        st.session_state.messages.append({"role": "assistant", "content": error_msg})
-        st.rerun()
\ No newline at end of file
+    # New messages are drawn in place below the history; there is no st.rerun() to redraw everything per turn.
+    with chat_container:
+        render_message(st.session_state.messages[-1])
+
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            streamed = []
+
+            def on_delta(text):
+                streamed.append(text)
+                placeholder.markdown("".join(streamed))
+
+            try:
+                with st.spinner("Assistant is thinking..."):
+                    response_data = send_chat_turn(st.session_state.session_id, st.session_state.messages, str(uuid.uuid4()), on_delta)
+                ai_msg = response_data.get("response") or "Sorry, I couldn't get a response."
+
+                if st.session_state.session_id is None:
+                    st.session_state.session_id = response_data.get("session_id")
+                    print(f"[Streamlit] Received Session ID: {st.session_state.session_id}")
+
+            except requests.exceptions.HTTPError as http_err:
+                response = http_err.response
+                retry_after = response.headers.get("Retry-After") if response is not None else None
+                if retry_after:
+                    ai_msg = f"The assistant is busy right now. Please try again in about {retry_after} seconds."
+                else:
+                    st.error(f"HTTP error occurred: {http_err}")
+                    ai_msg = f"Sorry, there was an error communicating ({response.status_code if response is not None else 'unknown'}). Please try again."
+            except requests.exceptions.Timeout as timeout_err:
+                st.error(f"Timed out: {timeout_err}")
+                ai_msg = "Sorry, the assistant took too long to answer. Please try again."
+            except requests.exceptions.RequestException as req_err:
+                st.error(f"Connection error: {req_err}")
+                ai_msg = "Sorry, I couldn't connect to the AI assistant. Please ensure the backend is running and accessible."
+
+            placeholder.markdown(ai_msg)
+
+    st.session_state.messages.append({"role": "assistant", "content": ai_msg})